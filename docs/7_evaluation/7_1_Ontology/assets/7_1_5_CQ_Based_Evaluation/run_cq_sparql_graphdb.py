@@ -11,24 +11,50 @@ Usage (PowerShell):
     --endpoint "http://localhost:7200/repositories/ontowebpt" ^
     --in_csv "competency_questions_interceptor_with_sparql.csv" ^
     --out_csv "cq_results.csv" ^
-    --optimize_limit1 ^
     --log_every 25
 
 Optional:
   --workers 4
+  --adaptive --target_p95 2.0   (AIMD in-flight control, --workers becomes the upper bound)
+  --retries 3                   (429/503/connection errors retried with jittered backoff)
+  --batch_size 20
   --timeout 60
   --max_queries 50
   --verbose
+  --no_optimize   (send queries verbatim instead of the pass_rule-aware ASK/LIMIT rewrite)
+
+Embedded backend (no GraphDB, pyoxigraph or rdflib; the store is persisted in the given directory):
+  --endpoint embedded:./cq_store [--ontology ontowebpt_1.0.4.rdf] [--abox dump.ttl ...]
+
+Profiling (anti-pattern lint for every CQ; CQs at/above the threshold are re-run for their
+GraphDB plan via onto:explain and a COUNT of their solutions; results in --profile_json):
+  --profile [--profile_threshold_ms 1000] [--profile_json cq_profile.json]
+
+Benchmark mode (replays the suite, writes JSON instead of the CSV):
+  --benchmark --workers 8 --duration 60 --warmup 10 [--qps 50] --bench_json bench.json --label "rdfsplus"
+  --stub_endpoint [--stub_latency_ms 5]   (local stand-in SPARQL endpoint, no GraphDB needed)
 """
 import argparse
+import bisect
 import csv
+import gzip
+import io
+import itertools
 import json
-import re
 import sys
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Dict, Tuple, Any, List
+from urllib.parse import parse_qs
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from cq_sparql_common import (  # noqa: E402
+    EMBEDDED_PREFIX, EXPLAIN_GRAPH, MISESTIMATE_FACTOR, RESULTS_ACCEPT, RETRY, EndpointPool, SparqlRequestError,
+    count_query, explain_query, lint_query, open_embedded_store, parse_plan, percentile, query_embedded,
+    send_with_retries, tokenize_sparql,
+)
 
 # ---- HTTP client: requests if available, else urllib ----
 try:
@@ -43,65 +69,431 @@ def log(msg: str):
     ts = time.strftime("%H:%M:%S")
     print(f"[{ts}] {msg}", flush=True)
 
-def optimize_query_for_passfail(sparql: str, sparql_kind: str, pass_rule: str, enabled: bool) -> str:
+# ---- Minimal SPARQL reader: enough structure to rewrite the outermost query safely ----
+# (tokens come from cq_sparql_common.tokenize_sparql, shared with the linter)
+
+_AGGREGATES = {"COUNT", "SUM", "MIN", "MAX", "AVG", "SAMPLE", "GROUP_CONCAT"}
+_MODIFIERS = {"GROUP", "HAVING", "ORDER", "LIMIT", "OFFSET", "VALUES"}
+
+def parse_query(sparql: str) -> Dict[str, Any]:
+    """
+    Split a SPARQL query into its top-level parts (nested groups and subqueries are kept opaque).
+
+    Returned keys:
+      prefixes, base, form, head, dataset, where, modifiers, limit, offset, values, body_start, where_start
+    where `head` is the projection (incl. DISTINCT/REDUCED) and `modifiers` maps
+    GROUP/HAVING/ORDER to their clause text. Raises ValueError on anything unexpected.
+    """
+    toks = tokenize_sparql(sparql)
+    i = 0
+    prefixes: Dict[str, str] = {}
+    base = None
+    while i < len(toks) and toks[i][1].upper() in ("PREFIX", "BASE"):
+        if toks[i][1].upper() == "BASE":
+            if i + 1 >= len(toks) or toks[i + 1][0] != "iri":
+                raise ValueError("malformed BASE")
+            base = toks[i + 1][1][1:-1]
+            i += 2
+            continue
+        if i + 2 >= len(toks) or not toks[i + 1][1].endswith(":") or toks[i + 2][0] != "iri":
+            raise ValueError("malformed PREFIX")
+        prefixes[toks[i + 1][1][:-1]] = toks[i + 2][1][1:-1]
+        i += 3
+
+    if i >= len(toks):
+        raise ValueError("empty query")
+    form = toks[i][1].upper()
+    if form not in ("SELECT", "ASK", "CONSTRUCT", "DESCRIBE"):
+        raise ValueError(f"unknown query form {toks[i][1]!r}")
+    body_start = toks[i][2]
+    i += 1
+
+    # head + dataset clauses: everything up to the WHERE keyword / first top-level '{'
+    head_start = toks[i][2] if i < len(toks) else len(sparql)
+    dataset: List[str] = []
+    head_end = None
+    depth = 0
+    while i < len(toks):
+        kind, text, st, en = toks[i]
+        up = text.upper()
+        if depth == 0 and (text == "{" or up == "WHERE"):
+            break
+        if depth == 0 and up == "FROM":
+            if head_end is None:
+                head_end = st
+            j = i + 1
+            if j < len(toks) and toks[j][1].upper() == "NAMED":
+                j += 1
+            if j >= len(toks) or toks[j][0] not in ("iri", "word"):
+                raise ValueError("malformed FROM clause")
+            dataset.append(sparql[st:toks[j][3]])
+            i = j + 1
+            continue
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        i += 1
+    if i >= len(toks):
+        raise ValueError("missing WHERE clause")
+    head = sparql[head_start:head_end if head_end is not None else toks[i][2]].strip()
+    if toks[i][1].upper() == "WHERE":
+        i += 1
+    if i >= len(toks) or toks[i][1] != "{":
+        raise ValueError("missing group pattern")
+
+    where_start = toks[i][2]
+    depth = 0
+    while i < len(toks):
+        if toks[i][1] == "{":
+            depth += 1
+        elif toks[i][1] == "}":
+            depth -= 1
+            if depth == 0:
+                break
+        i += 1
+    if depth != 0:
+        raise ValueError("unbalanced braces")
+    where = sparql[where_start:toks[i][3]]
+    i += 1
+
+    # solution modifiers + trailing VALUES, in whatever order they appear
+    clauses: List[Tuple[str, int]] = []
+    depth = 0
+    for j in range(i, len(toks)):
+        text = toks[j][1]
+        if depth == 0 and text.upper() in _MODIFIERS:
+            clauses.append((text.upper(), j))
+        if text in ("(", "{"):
+            depth += 1
+        elif text in (")", "}"):
+            depth -= 1
+    if clauses and clauses[0][1] != i or (not clauses and i < len(toks)):
+        raise ValueError("unexpected tokens after group pattern")
+
+    modifiers: Dict[str, str] = {}
+    limit = offset = None
+    values = ""
+    for n, (name, j) in enumerate(clauses):
+        end = toks[clauses[n + 1][1]][2] if n + 1 < len(clauses) else len(sparql)
+        text = sparql[toks[j][2]:end].strip()
+        if name in ("LIMIT", "OFFSET"):
+            if j + 1 >= len(toks) or not toks[j + 1][1].isdigit():
+                raise ValueError(f"malformed {name}")
+            if name == "LIMIT":
+                limit = int(toks[j + 1][1])
+            else:
+                offset = int(toks[j + 1][1])
+        elif name == "VALUES":
+            values = text
+        else:
+            modifiers[name] = text
+
+    return {
+        "prefixes": prefixes,
+        "base": base,
+        "form": form,
+        "head": head,
+        "dataset": dataset,
+        "where": where,
+        "modifiers": modifiers,
+        "limit": limit,
+        "offset": offset,
+        "values": values,
+        "body_start": body_start,
+        "where_start": where_start,
+    }
+
+def _render_query(sparql: str, q: Dict[str, Any], form: str, head: str = "", where: str = "",
+                  modifiers: Tuple[str, ...] = (), limit: Any = None, offset: Any = None) -> str:
+    prologue = sparql[:q["body_start"]].rstrip()
+    parts = [prologue, f"{form} {head}".rstrip()]
+    parts += q["dataset"]
+    parts.append("WHERE " + (where or q["where"]))
+    parts += [q["modifiers"][m] for m in modifiers if m in q["modifiers"]]
+    if limit is not None:
+        parts.append(f"LIMIT {limit}")
+    if offset is not None:
+        parts.append(f"OFFSET {offset}")
+    if q["values"]:
+        parts.append(q["values"])
+    # newline-joined so a trailing comment in one part can never swallow the next
+    return "\n".join(p for p in parts if p) + "\n"
+
+def _count_target(head: str) -> Any:
+    """
+    Match the projection `(COUNT([DISTINCT] ?v|*) AS ?count)`.
+    Returns "?v", "*" or None when the projection has any other shape.
     """
-    Reduce response size/time for pass/fail style checks by forcing LIMIT 1 when safe.
-    Applies to SELECT queries when we only need existence/emptiness:
-      - non_empty  -> need >= 1 row
-      - empty_ok   -> need 0 rows
+    toks = [t[1] for t in tokenize_sparql(head)]
+    if len(toks) >= 2 and toks[0].upper() in ("DISTINCT", "REDUCED"):
+        toks = toks[1:]
+    if [t.upper() for t in toks[:3]] != ["(", "COUNT", "("]:
+        return None
+    rest = toks[3:]
+    if rest and rest[0].upper() == "DISTINCT":
+        rest = rest[1:]
+    if len(rest) == 5 and rest[1] == ")" and rest[2].upper() == "AS" and rest[3][1:] == "count" and rest[4] == ")":
+        if rest[0] == "*" or rest[0][:1] in "?$":
+            return rest[0]
+    return None
+
+def optimize_query_for_passfail(sparql: str, sparql_kind: str, pass_rule: str, enabled: bool) -> Tuple[str, str]:
+    """
+    Rewrite a CQ so GraphDB does only the work its pass_rule needs.
+    Returns (query, exec_kind), where exec_kind is the form actually sent
+    ("ASK" or "SELECT"); see `ask_as_select` for mapping answers back.
+
+      - non_empty / empty_ok  -> ASK over the same pattern (or LIMIT 1 on the
+                                 outermost SELECT when grouping/OFFSET prevent it),
+                                 ORDER BY and projection dropped
+      - count>=1              -> ASK { pattern FILTER(BOUND(?v)) } for
+                                 SELECT (COUNT([DISTINCT] ?v) AS ?count)
+
+    Only the outermost query is touched; subqueries keep their own LIMITs.
+    Anything the reader does not understand is sent unchanged.
     """
-    if not enabled:
-        return sparql
     kind = (sparql_kind or "SELECT").strip().upper()
+    if not enabled or kind != "SELECT":
+        return sparql, kind
     rule = (pass_rule or "").strip().lower()
+    if rule not in ("non_empty", "empty_ok", "count>=1"):
+        return sparql, kind
+
+    try:
+        q = parse_query(sparql)
+    except ValueError:
+        return sparql, kind
+    if q["form"] != "SELECT":
+        return sparql, kind
 
-    if kind != "SELECT":
-        return sparql
-    if rule not in ("non_empty", "empty_ok"):
-        return sparql
+    grouped = "GROUP" in q["modifiers"] or "HAVING" in q["modifiers"]
+    head_words = {t[1].upper() for t in tokenize_sparql(q["head"])}
+    aggregated = grouped or bool(head_words & _AGGREGATES)
+
+    if rule == "count>=1":
+        target = _count_target(q["head"])
+        if target is None or grouped or q["offset"] or q["limit"] == 0:
+            return sparql, kind
+        where = q["where"]
+        if target != "*":
+            where = "{\n" + where + f"\nFILTER(BOUND({target}))\n}}"
+        return _render_query(sparql, q, "ASK", where=where), "ASK"
 
-    s = sparql.strip()
-    m = re.search(r"\bLIMIT\b\s+\d+", s, flags=re.IGNORECASE)
-    if m:
-        return re.sub(r"\bLIMIT\b\s+\d+", "LIMIT 1", s, flags=re.IGNORECASE)
+    if q["limit"] == 0:
+        return sparql, kind
+    if not aggregated and not q["offset"]:
+        return _render_query(sparql, q, "ASK"), "ASK"
 
-    return s + "\nLIMIT 1\n"
+    # Grouped / aggregated / offset queries: keep SELECT, cap the outermost result.
+    limit = 1 if q["limit"] is None else min(q["limit"], 1)
+    return _render_query(sparql, q, "SELECT", head=q["head"], modifiers=("GROUP", "HAVING"),
+                         limit=limit, offset=q["offset"]), "SELECT"
 
-def _post_sparql_requests(endpoint: str, sparql: str, timeout: int) -> Dict[str, Any]:
+def _trim_bindings(data: Dict[str, Any], keep: Any, stop_after: Any) -> Dict[str, Any]:
+    bindings = (data.get("results") or {}).get("bindings")
+    if bindings is None:
+        return data
+    row_count = len(bindings)
+    if stop_after and row_count > stop_after:
+        row_count = stop_after
+        data["truncated"] = True
+    data["row_count"] = row_count
+    if keep is not None:
+        data["results"]["bindings"] = bindings[:keep]
+    return data
+
+def read_results(raw: Any, content_type: str, keep: Any = None, stop_after: Any = None) -> Dict[str, Any]:
+    """
+    Decode a SPARQL result stream into the JSON shape plus a `row_count`.
+
+    CSV results are consumed row by row: only the first `keep` bindings are
+    retained (all if None) and reading stops after `stop_after` rows, leaving
+    the rest of the payload unread (`truncated` is then set). CSV carries no
+    term types, so every value comes back as a plain literal binding.
+    """
+    if not content_type.startswith("text/csv"):
+        return _trim_bindings(json.load(raw), keep, stop_after)
+    reader = csv.reader(io.TextIOWrapper(raw, encoding="utf-8", newline=""))
+    header = next(reader, [])
+    bindings: List[Dict[str, Any]] = []
+    row_count = 0
+    truncated = False
+    for record in reader:
+        row_count += 1
+        if keep is None or len(bindings) < keep:
+            bindings.append({h: {"type": "literal", "value": v} for h, v in zip(header, record) if v != ""})
+        if stop_after and row_count >= stop_after:
+            truncated = True
+            break
+    data = {"head": {"vars": header}, "results": {"bindings": bindings}, "row_count": row_count}
+    if truncated:
+        data["truncated"] = True
+    return data
+
+_HTTP = threading.local()
+
+def _session() -> Any:
+    """Per-thread requests.Session, so connections are kept alive instead of re-opened per query."""
+    session = getattr(_HTTP, "session", None)
+    if session is None:
+        session = _HTTP.session = requests.Session()
+    return session
+
+def _post_sparql_requests(endpoint: str, sparql: str, timeout: int, stats: Dict[str, Any],
+                          keep: Any = None, stop_after: Any = None) -> Dict[str, Any]:
     headers = {
-        "Accept": "application/sparql-results+json",
+        "Accept": RESULTS_ACCEPT,
+        "Accept-Encoding": "gzip",
         "Content-Type": "application/sparql-query; charset=utf-8",
     }
-    r = requests.post(endpoint, data=sparql.encode("utf-8"), headers=headers, timeout=timeout)
-    r.raise_for_status()
-    return r.json()
+    t0 = time.perf_counter()
+    with _session().post(endpoint, data=sparql.encode("utf-8"), headers=headers, timeout=timeout, stream=True) as r:
+        # r.elapsed: request sent -> response headers parsed (server time + one RTT)
+        stats["server_s"] = r.elapsed.total_seconds()
+        r.raise_for_status()
+        r.raw.decode_content = True
+        r.raw.auto_close = False  # let io.TextIOWrapper hit EOF instead of a closed file
+        data = read_results(r.raw, r.headers.get("Content-Type", ""), keep, stop_after)
+        stats["network_s"] = max(0.0, time.perf_counter() - t0 - stats["server_s"])
+        # bytes read off the wire (compressed if the server used gzip)
+        stats["response_bytes"] = r.raw.tell()
+    return data
 
-def _post_sparql_urllib(endpoint: str, sparql: str, timeout: int) -> Dict[str, Any]:
+class _CountingReader(io.RawIOBase):
+    """Readable wrapper counting the bytes pulled from the underlying response."""
+    def __init__(self, fp: Any):
+        self.fp = fp
+        self.count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b: Any) -> int:
+        chunk = self.fp.read(len(b))
+        n = len(chunk)
+        b[:n] = chunk
+        self.count += n
+        return n
+
+def _post_sparql_urllib(endpoint: str, sparql: str, timeout: int, stats: Dict[str, Any],
+                        keep: Any = None, stop_after: Any = None) -> Dict[str, Any]:
     data = sparql.encode("utf-8")
     req = Request(endpoint, data=data, method="POST")
-    req.add_header("Accept", "application/sparql-results+json")
+    req.add_header("Accept", RESULTS_ACCEPT)
+    req.add_header("Accept-Encoding", "gzip")
     req.add_header("Content-Type", "application/sparql-query; charset=utf-8")
     try:
+        t0 = time.perf_counter()
         with urlopen(req, timeout=timeout) as resp:
-            payload = resp.read().decode("utf-8", errors="replace")
-            return json.loads(payload)
+            t1 = time.perf_counter()
+            counter = _CountingReader(resp)
+            raw: Any = io.BufferedReader(counter)
+            if (resp.headers.get("Content-Encoding") or "").lower() == "gzip":
+                raw = gzip.GzipFile(fileobj=raw)
+            result = read_results(raw, resp.headers.get("Content-Type") or "", keep, stop_after)
+            stats["server_s"] = t1 - t0
+            stats["network_s"] = time.perf_counter() - t1
+            stats["response_bytes"] = counter.count
+            return result
     except HTTPError as e:
         body = e.read().decode("utf-8", errors="replace") if hasattr(e, "read") else ""
-        raise RuntimeError(f"HTTPError {e.code}: {e.reason}. Body: {body[:500]}")
+        retry_after = e.headers.get("Retry-After") if e.headers else None
+        raise SparqlRequestError(f"HTTPError {e.code}: {e.reason}. Body: {body[:500]}", e.code, retry_after)
     except URLError as e:
-        raise RuntimeError(f"URLError: {e.reason}")
+        raise SparqlRequestError(f"URLError: {e.reason}")
+
+# ---- Embedded backend: evaluate in-process instead of POSTing to GraphDB (see cq_sparql_common) ----
+DEFAULT_ONTOLOGY = Path(__file__).resolve().parent.parent / "7_1_9_CQ_TBox_Coverage_Evaluation" / "ontologies" / "ontowebpt_1.0.4.rdf"
 
-def post_sparql(endpoint: str, sparql: str, timeout: int) -> Dict[str, Any]:
+def _post_once(endpoint: str, sparql: str, timeout: int, stats: Dict[str, Any],
+               keep: Any = None, stop_after: Any = None) -> Dict[str, Any]:
     if _HAS_REQUESTS:
-        return _post_sparql_requests(endpoint, sparql, timeout)
-    return _post_sparql_urllib(endpoint, sparql, timeout)
+        return _post_sparql_requests(endpoint, sparql, timeout, stats, keep, stop_after)
+    return _post_sparql_urllib(endpoint, sparql, timeout, stats, keep, stop_after)
+
+def post_sparql(endpoint: Any, sparql: str, timeout: int, stats: Any = None,
+                keep: Any = None, stop_after: Any = None) -> Dict[str, Any]:
+    """
+    POST a query and return the result in SPARQL JSON shape plus `row_count`.
+    SELECT results are negotiated as CSV (gzip) and streamed, see read_results
+    for `keep` / `stop_after`.
+    If `stats` is a dict it receives server_s (time to response headers),
+    network_s (body transfer), response_bytes, the replica that answered,
+    attempts of the last try and `throttled` (an attempt was retried after a
+    429/5xx or a connection failure, i.e. the server pushed back).
+    `embedded:<store_dir>` endpoints are evaluated in-process (see open_embedded_store).
+    Retries and replica failover follow cq_sparql_common.send_with_retries
+    (RETRY is configured from the CLI in main()).
+    """
+    stats = {} if stats is None else stats
+    if isinstance(endpoint, str) and endpoint.startswith(EMBEDDED_PREFIX):
+        stats["attempts"] = 1
+        stats["replica"] = endpoint
+        return _trim_bindings(query_embedded(endpoint, sparql, stats), keep, stop_after)
+    return send_with_retries(endpoint, lambda url: _post_once(url, sparql, timeout, stats, keep, stop_after), stats)
+
+class AdaptiveLimiter:
+    """
+    AIMD controller for the number of in-flight requests.
+
+    Every `window` completions it looks at the p95 latency and at congestion
+    signals (errors, timeouts, throttled requests that succeeded after a
+    retry): on congestion or p95 > target the limit is
+    halved, otherwise it grows by one, within [min_limit, max_limit].
+    """
+    def __init__(self, min_limit: int, max_limit: int, target_p95: float, window: int = 10):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.target_p95 = target_p95
+        self.window = window
+        self.limit = float(self.min_limit)
+        self._inflight = 0
+        self._latencies: List[float] = []
+        self._congested = False
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._inflight >= int(self.limit):
+                self._cond.wait()
+            self._inflight += 1
+
+    def release(self, latency: float, congested: bool):
+        with self._cond:
+            self._inflight -= 1
+            self._latencies.append(latency)
+            self._congested = self._congested or congested
+            if len(self._latencies) >= max(self.window, int(self.limit)):
+                self._adjust()
+            self._cond.notify_all()
+
+    def _adjust(self):
+        p95 = percentile(self._latencies, 95)
+        old = int(self.limit)
+        if self._congested or p95 > self.target_p95:
+            self.limit = max(float(self.min_limit), self.limit / 2)
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1)
+        if int(self.limit) != old:
+            reason = "congestion" if self._congested else f"p95={p95:.2f}s"
+            log(f"Adaptive concurrency: {old} -> {int(self.limit)} in flight ({reason})")
+        self._latencies = []
+        self._congested = False
 
 def normalize_result(data: Dict[str, Any], kind: str) -> Dict[str, Any]:
     kind_u = (kind or "SELECT").strip().upper()
     if kind_u == "ASK":
         return {"kind": "ASK", "boolean": bool(data.get("boolean", False))}
     bindings = data.get("results", {}).get("bindings", [])
-    return {"kind": "SELECT", "row_count": len(bindings), "bindings": bindings}
+    return {"kind": "SELECT", "row_count": data.get("row_count", len(bindings)), "bindings": bindings}
+
+def ask_as_select(normalized: Dict[str, Any], pass_rule: str) -> Dict[str, Any]:
+    """Map the answer of a rewritten ASK back onto the SELECT shape the pass_rule expects."""
+    hit = normalized.get("boolean") is True
+    if (pass_rule or "").strip().lower() == "count>=1":
+        return {"kind": "SELECT", "row_count": 1, "bindings": [{"count": {"type": "literal", "value": str(int(hit))}}]}
+    return {"kind": "SELECT", "row_count": int(hit), "bindings": []}
 
 def eval_pass(pass_rule: str, normalized: Dict[str, Any]) -> bool:
     rule = (pass_rule or "").strip().lower()
@@ -135,29 +527,306 @@ def eval_pass(pass_rule: str, normalized: Dict[str, Any]) -> bool:
 
     return True
 
+# ---- Batched execution: pack several existence checks into one SPARQL request ----
+
+_BATCHABLE = {("ASK", "ask=true"), ("SELECT", "non_empty"), ("SELECT", "empty_ok")}
+
+def batch_branch(row: Dict[str, str], tag: str) -> Tuple[Dict[str, str], str]:
+    """
+    Turn one CQ into a UNION branch that yields a single ?cq_id row (bound to `tag`)
+    iff the original query has at least one solution (SELECT) or is true (ASK).
+    Raises ValueError when the CQ cannot be safely merged into a batch.
+    """
+    kind = (row.get("sparql_kind") or "SELECT").strip().upper()
+    rule = (row.get("pass_rule") or "").strip().lower()
+    if (kind, rule) not in _BATCHABLE:
+        raise ValueError(f"pass_rule {rule!r} / kind {kind!r} is not batchable")
+
+    sparql = row.get("sparql") or ""
+    q = parse_query(sparql)
+    if q["form"] != kind:
+        raise ValueError("query form does not match sparql_kind")
+    if q["base"] is not None or q["dataset"]:
+        raise ValueError("BASE / dataset clauses cannot be used inside a subquery")
+    if any(t[0] == "var" and t[1][1:] == "cq_id" for t in tokenize_sparql(sparql)):
+        raise ValueError("query already uses ?cq_id")
+
+    if kind == "ASK":
+        pattern = q["where"] + ("\n" + q["values"] if q["values"] else "")
+    else:
+        pattern = "{\n" + sparql[q["body_start"]:] + "\n}"
+    branch = (
+        "{ SELECT ?cq_id WHERE {\n"
+        f"{pattern}\n"
+        f'BIND("{tag}" AS ?cq_id)\n'
+        "} LIMIT 1 }"
+    )
+    return q["prefixes"], branch
+
+def plan_batches(rows: List[Dict[str, str]], batch_size: int) -> List[List[Dict[str, str]]]:
+    """
+    Group rows into execution units, preserving input order.
+    Batchable CQs are packed (up to batch_size) as long as their PREFIX
+    declarations agree; every other CQ becomes a unit of its own.
+    """
+    units: List[List[Dict[str, str]]] = []
+    current: List[Dict[str, str]] = []
+    current_prefixes: Dict[str, str] = {}
+
+    def flush():
+        nonlocal current, current_prefixes
+        if current:
+            units.append(current)
+        current, current_prefixes = [], {}
+
+    for row in rows:
+        try:
+            prefixes, _ = batch_branch(row, "0")
+        except ValueError:
+            units.append([row])
+            continue
+        clash = any(current_prefixes.get(p, iri) != iri for p, iri in prefixes.items())
+        if clash or len(current) >= batch_size:
+            flush()
+        current.append(row)
+        current_prefixes.update(prefixes)
+    flush()
+    return units
+
+def build_batch_query(rows: List[Dict[str, str]]) -> str:
+    prefixes: Dict[str, str] = {}
+    branches: List[str] = []
+    for i, row in enumerate(rows):
+        p, branch = batch_branch(row, str(i))
+        prefixes.update(p)
+        branches.append(branch)
+    prologue = "".join(f"PREFIX {p}: <{iri}>\n" for p, iri in prefixes.items())
+    return prologue + "SELECT ?cq_id WHERE {\n" + "\nUNION\n".join(branches) + "\n}\n"
+
+def run_batch(rows: List[Dict[str, str]], endpoint: Any, timeout: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Execute a batch of existence checks with one request and split the
+    ?cq_id bindings back per CQ. Any exception propagates to the caller,
+    which is expected to fall back to per-CQ execution.
+    """
+    stats: Dict[str, Any] = {}
+    t0 = time.perf_counter()
+    data = post_sparql(endpoint, build_batch_query(rows), timeout=timeout, stats=stats)
+    timing = make_timing(time.perf_counter() - t0, stats, batch=len(rows))
+    bindings = data.get("results", {}).get("bindings", [])
+    hits = {b["cq_id"]["value"] for b in bindings if "cq_id" in b}
+
+    out: List[Tuple[str, Dict[str, Any]]] = []
+    for i, row in enumerate(rows):
+        cq_id = (row.get("cq_id") or "").strip()
+        kind = (row.get("sparql_kind") or "SELECT").strip().upper()
+        hit = str(i) in hits
+        if kind == "ASK":
+            normalized = {"kind": "ASK", "boolean": hit}
+            row_count = ""
+        else:
+            # Each branch is capped at LIMIT 1, so the row count is 0 or 1.
+            normalized = {"kind": "SELECT", "row_count": int(hit), "bindings": []}
+            row_count = int(hit)
+        passed = eval_pass(row.get("pass_rule") or "query_ok", normalized)
+        out.append((cq_id, {"passed": passed, "error": "", "row_count": row_count, "timing": dict(timing)}))
+    return out
+
+def make_timing(latency_s: float, stats: Dict[str, Any], batch: int = 1) -> Dict[str, Any]:
+    return {
+        "latency_s": latency_s,
+        "queue_s": 0.0,
+        "server_s": stats.get("server_s"),
+        "network_s": stats.get("network_s"),
+        "response_bytes": stats.get("response_bytes"),
+        "batch": batch,
+        "replica": stats.get("replica"),
+        "throttled": bool(stats.get("throttled")),
+    }
+
 def summarize_row(row: Dict[str, str], maxlen: int = 90) -> str:
     q = (row.get("question") or "").strip().replace("\n", " ")
     if len(q) > maxlen:
         q = q[:maxlen - 3] + "..."
     return q
 
-def run_one(row: Dict[str, str], endpoint: str, timeout: int, optimize_limit1: bool) -> Tuple[str, Dict[str, Any]]:
+def run_one(row: Dict[str, str], endpoint: Any, timeout: int, optimize: bool) -> Tuple[str, Dict[str, Any]]:
     cq_id = (row.get("cq_id") or "").strip()
     sparql = row.get("sparql") or ""
     sparql_kind = (row.get("sparql_kind") or "SELECT").strip()
     pass_rule = row.get("pass_rule") or "query_ok"
 
-    sparql_exec = optimize_query_for_passfail(sparql, sparql_kind, pass_rule, enabled=optimize_limit1)
+    sparql_exec, exec_kind = optimize_query_for_passfail(sparql, sparql_kind, pass_rule, enabled=optimize)
+
+    # Only count>=1 reads a binding (the first); existence checks only need to see one row.
+    rule = pass_rule.strip().lower()
+    keep = 1 if rule == "count>=1" else 0
+    stop_after = 1 if optimize and rule in ("non_empty", "empty_ok") else None
 
-    data = post_sparql(endpoint, sparql_exec, timeout=timeout)
-    normalized = normalize_result(data, sparql_kind)
+    stats: Dict[str, Any] = {}
+    t0 = time.perf_counter()
+    data = post_sparql(endpoint, sparql_exec, timeout=timeout, stats=stats, keep=keep, stop_after=stop_after)
+    latency = time.perf_counter() - t0
+    normalized = normalize_result(data, exec_kind)
+    if exec_kind != sparql_kind.upper():
+        normalized = ask_as_select(normalized, pass_rule)
 
     passed = eval_pass(pass_rule, normalized)
     row_count = normalized.get("row_count", "")
     if normalized.get("kind") == "ASK":
         row_count = ""
 
-    return cq_id, {"passed": passed, "error": "", "row_count": row_count}
+    return cq_id, {"passed": passed, "error": "", "row_count": row_count, "timing": make_timing(latency, stats)}
+
+def run_unit(unit: List[Dict[str, str]], endpoint: Any, timeout: int, optimize: bool) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Run one execution unit (a single CQ or a batch) and return per-CQ results.
+    Failed batches are re-run one CQ at a time so a single bad query cannot
+    sink its neighbours; per-CQ errors are reported in the result dict.
+    """
+    if len(unit) > 1:
+        try:
+            return run_batch(unit, endpoint, timeout)
+        except Exception as e:
+            log(f"Batch of {len(unit)} failed ({e}); falling back to individual execution.")
+
+    out: List[Tuple[str, Dict[str, Any]]] = []
+    for row in unit:
+        cq_id = (row.get("cq_id") or "").strip()
+        t0 = time.perf_counter()
+        try:
+            out.append(run_one(row, endpoint, timeout, optimize))
+        except Exception as e:
+            timing = make_timing(time.perf_counter() - t0, {})
+            out.append((cq_id, {"passed": False, "error": str(e), "row_count": "", "timing": timing}))
+    return out
+
+def format_ms(seconds: Any) -> str:
+    return "" if seconds is None else f"{seconds * 1000:.1f}"
+
+def latency_report(rows: List[Dict[str, str]], results_by_id: Dict[str, Dict[str, Any]], slowest: int):
+    """Log p50/p95/p99, the slowest CQs and a per-dimension / per-use-case breakdown."""
+    samples = []
+    for row in rows:
+        cq_id = (row.get("cq_id") or "").strip()
+        timing = results_by_id.get(cq_id, {}).get("timing")
+        if timing:
+            samples.append((timing["latency_s"], cq_id, row, timing))
+    if not samples:
+        return
+
+    lat = [x[0] for x in samples]
+    log(f"Latency: p50={format_ms(percentile(lat, 50))}ms p95={format_ms(percentile(lat, 95))}ms "
+        f"p99={format_ms(percentile(lat, 99))}ms max={format_ms(max(lat))}ms | n={len(lat)}")
+    queue = [x[3]["queue_s"] for x in samples]
+    server = [x[3]["server_s"] for x in samples if x[3]["server_s"] is not None]
+    log(f"  queue p95={format_ms(percentile(queue, 95))}ms | server p95={format_ms(percentile(server, 95))}ms | "
+        f"bytes total={sum(x[3]['response_bytes'] or 0 for x in samples)}")
+
+    if slowest > 0:
+        log(f"Slowest {min(slowest, len(samples))} CQs:")
+        for latency, cq_id, row, timing in sorted(samples, key=lambda x: x[0], reverse=True)[:slowest]:
+            batch = f" (batch of {timing['batch']})" if timing["batch"] > 1 else ""
+            log(f"  {cq_id}: {format_ms(latency)}ms{batch} | {row.get('dimension', '')} | {summarize_row(row, 70)}")
+
+    for column in ("dimension", "use_case"):
+        groups: Dict[str, List[float]] = {}
+        for latency, _, row, _ in samples:
+            groups.setdefault(row.get(column, "") or "-", []).append(latency)
+        log(f"By {column}:")
+        for name, values in sorted(groups.items(), key=lambda kv: percentile(kv[1], 95), reverse=True):
+            log(f"  {name}: n={len(values)} p50={format_ms(percentile(values, 50))}ms "
+                f"p95={format_ms(percentile(values, 95))}ms max={format_ms(max(values))}ms")
+
+# ---- Profiling: anti-pattern lint and GraphDB query plans of slow CQs ----
+# lint_query, explain_query, count_query and parse_plan live in cq_sparql_common.
+
+def profile_cq(row: Dict[str, str], endpoint: Any, timeout: int, optimize: bool,
+               explain_graph: str, lint: List[Dict[str, str]]) -> Dict[str, Any]:
+    """
+    Plan and cardinalities of one (slow) CQ, as sent by run_one: the plan from
+    the explain pseudo-graph, the estimated solutions read from it and the
+    actual number of solutions of the same pattern (COUNT re-run).
+    """
+    sparql_exec, exec_kind = optimize_query_for_passfail(
+        row.get("sparql") or "", row.get("sparql_kind") or "SELECT", row.get("pass_rule") or "query_ok", enabled=optimize)
+    profile: Dict[str, Any] = {"query": sparql_exec, "exec_kind": exec_kind, "plan": None,
+                               "estimated_rows": None, "actual_rows": None, "antipatterns": list(lint)}
+    if isinstance(endpoint, str) and endpoint.startswith(EMBEDDED_PREFIX):
+        profile["plan_error"] = "query plans need GraphDB (embedded backend)"
+    else:
+        try:
+            data = post_sparql(endpoint, explain_query(sparql_exec, explain_graph), timeout=timeout)
+            bindings = (data.get("results") or {}).get("bindings") or []
+            values = [b[k]["value"] for b in bindings for k in b]
+            if not values:
+                raise RuntimeError("endpoint returned no plan")
+            profile["plan"] = "\n".join(values)
+            parsed = parse_plan(profile["plan"])
+            profile["estimated_rows"] = parsed["estimated_rows"]
+            profile["plan_groups"] = parsed["groups"]
+        except Exception as e:
+            profile["plan_error"] = str(e)[:500]
+
+    stats: Dict[str, Any] = {}
+    t0 = time.perf_counter()
+    try:
+        data = post_sparql(endpoint, count_query(sparql_exec), timeout=timeout, stats=stats, keep=1)
+        bindings = (data.get("results") or {}).get("bindings") or []
+        count = (bindings[0] if bindings else {}).get("actual_rows")
+        if count is None:
+            raise RuntimeError("endpoint returned no count")
+        profile["actual_rows"] = int(float(count["value"]))
+    except Exception as e:
+        profile["actual_error"] = str(e)[:500]
+    profile["actual_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    est, act = profile["estimated_rows"], profile["actual_rows"]
+    if est is not None and act is not None and max(est, act) >= 100:
+        ratio = max(est, act) / max(min(est, act), 1.0)
+        if ratio >= MISESTIMATE_FACTOR:
+            profile["antipatterns"].append({
+                "rule": "cardinality_misestimate", "severity": "warning",
+                "detail": f"estimated {est:g} vs actual {act} solutions ({ratio:.0f}x)",
+            })
+    return profile
+
+def antipattern_names(issues: List[Dict[str, str]]) -> str:
+    return ",".join(sorted({x["rule"] for x in issues}))
+
+def profile_slow_cqs(rows: List[Dict[str, str]], results_by_id: Dict[str, Dict[str, Any]], endpoint: Any,
+                     timeout: int, optimize: bool, threshold_ms: float, explain_graph: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Lint every CQ, then re-run those at or above `threshold_ms` (timeouts included)
+    one at a time for their plan. Results carry `antipatterns` for every CQ and
+    `profile` for the slow ones.
+    """
+    slow = []
+    for row in rows:
+        cq_id = (row.get("cq_id") or "").strip()
+        res = results_by_id.get(cq_id)
+        if res is None:
+            continue
+        res["antipatterns"] = lint_query(row.get("sparql") or "")
+        latency_ms = (res.get("timing") or {}).get("latency_s", 0.0) * 1000
+        if latency_ms >= threshold_ms:
+            slow.append((latency_ms, cq_id, row, res))
+
+    profiles: Dict[str, Dict[str, Any]] = {}
+    if not slow:
+        log(f"Profiling: no CQ at or above {threshold_ms:g}ms")
+        return profiles
+    log(f"Profiling {len(slow)} CQ(s) at or above {threshold_ms:g}ms (plan + actual solutions)")
+    for latency_ms, cq_id, row, res in sorted(slow, key=lambda x: x[0], reverse=True):
+        profile = profile_cq(row, endpoint, timeout, optimize, explain_graph, res["antipatterns"])
+        profile.update({"cq_id": cq_id, "latency_ms": round(latency_ms, 1), "error": res.get("error", "")})
+        res["profile"] = profile
+        profiles[cq_id] = profile
+        est = "-" if profile["estimated_rows"] is None else f"{profile['estimated_rows']:g}"
+        act = "-" if profile["actual_rows"] is None else profile["actual_rows"]
+        log(f"  {cq_id}: {latency_ms:.1f}ms | est={est} actual={act} | "
+            f"{antipattern_names(profile['antipatterns']) or 'no anti-pattern found'}")
+    return profiles
 
 def eta_str(done: int, total: int, elapsed: float) -> str:
     if done == 0:
@@ -166,19 +835,250 @@ def eta_str(done: int, total: int, elapsed: float) -> str:
     remaining = (total - done) / rate if rate > 0 else 0
     return f"ETA: {int(remaining)}s"
 
+# ---- Benchmark / load-test mode ----
+
+HISTOGRAM_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000]
+
+def start_stub_endpoint(latency_ms: float = 0.0) -> Tuple[str, Any]:
+    """
+    Start a local stand-in SPARQL endpoint on 127.0.0.1 (random port) in a daemon thread.
+    ASK queries answer true, anything else one empty solution, after `latency_ms`.
+    Returns (endpoint_url, server); server.shutdown() stops it.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like GraphDB
+        disable_nagle_algorithm = True  # headers and body are separate writes
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            query = self.rfile.read(length).decode("utf-8", errors="replace")
+            if (self.headers.get("Content-Type") or "").startswith("application/x-www-form-urlencoded"):
+                query = (parse_qs(query).get("query") or [""])[0]
+            if latency_ms > 0:
+                time.sleep(latency_ms / 1000.0)
+            try:
+                form = parse_query(query)["form"]
+            except ValueError:
+                form = "SELECT"
+            if form == "ASK":
+                content_type = "application/sparql-results+json"
+                payload = json.dumps({"head": {}, "boolean": True}).encode("utf-8")
+            elif "text/csv" in (self.headers.get("Accept") or ""):
+                content_type = "text/csv"
+                payload = b"\r\n\r\n"
+            else:
+                content_type = "application/sparql-results+json"
+                payload = json.dumps({"head": {"vars": []}, "results": {"bindings": [{}]}}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            if "gzip" in (self.headers.get("Accept-Encoding") or ""):
+                payload = gzip.compress(payload)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    class StubServer(ThreadingHTTPServer):
+        # the default backlog (5) drops/delays connects under a few dozen clients
+        request_queue_size = 1024
+        daemon_threads = True
+
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/repositories/stub", server
+
+def drive_load(units: List[List[Dict[str, str]]], endpoint: Any, timeout: int, optimize: bool,
+               concurrency: int, qps: float, max_sends: int, deadline: Any) -> List[Dict[str, Any]]:
+    """
+    Replay `units` in a loop until `max_sends` requests were sent or `deadline`
+    (perf_counter value) passed, whichever is set.
+
+    - qps <= 0: closed loop, `concurrency` clients send back to back.
+    - qps > 0 : open loop, requests are scheduled every 1/qps seconds and
+                latency is measured from the scheduled time, so a saturated
+                server shows up as queueing instead of being hidden.
+    """
+    samples: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+    t0 = time.perf_counter()
+
+    def execute(unit: List[Dict[str, str]], scheduled: float):
+        start = time.perf_counter()
+        results = run_unit(unit, endpoint, timeout, optimize)
+        end = time.perf_counter()
+        sample = {
+            "t": end - t0,
+            "latency_s": end - scheduled,
+            "service_s": end - start,
+            "cqs": len(unit),
+            "error": any(res.get("error") for _, res in results),
+        }
+        with lock:
+            samples.append(sample)
+
+    def exhausted(i: int, when: float) -> bool:
+        return (max_sends and i >= max_sends) or (deadline is not None and when >= deadline)
+
+    if qps > 0:
+        with ThreadPoolExecutor(max_workers=concurrency) as ex:
+            for i in itertools.count():
+                scheduled = t0 + i / qps
+                if exhausted(i, scheduled):
+                    break
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                ex.submit(execute, units[i % len(units)], scheduled)
+        return samples
+
+    counter = itertools.count()
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter)
+            now = time.perf_counter()
+            if exhausted(i, now):
+                return
+            execute(units[i % len(units)], now)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples
+
+def summarize_benchmark(samples: List[Dict[str, Any]], wall_s: float) -> Dict[str, Any]:
+    def stats_ms(values: List[float]) -> Dict[str, float]:
+        if not values:
+            return {}
+        return {
+            "mean": round(sum(values) / len(values) * 1000, 3),
+            **{f"p{p}": round(percentile(values, p) * 1000, 3) for p in (50, 90, 95, 99)},
+            "max": round(max(values) * 1000, 3),
+        }
+
+    latencies = [x["latency_s"] for x in samples]
+    ordered = sorted(x * 1000 for x in latencies)
+    histogram, below = [], 0
+    for bound in HISTOGRAM_BOUNDS_MS:
+        upto = bisect.bisect_right(ordered, bound)
+        histogram.append({"le_ms": bound, "count": upto - below})
+        below = upto
+    histogram.append({"le_ms": "+Inf", "count": len(ordered) - below})
+
+    timeline: Dict[int, Dict[str, int]] = {}
+    for x in samples:
+        bucket = timeline.setdefault(int(x["t"]), {"requests": 0, "errors": 0})
+        bucket["requests"] += 1
+        bucket["errors"] += int(x["error"])
+
+    cqs = sum(x["cqs"] for x in samples)
+    return {
+        "requests": len(samples),
+        "cqs": cqs,
+        "errors": sum(1 for x in samples if x["error"]),
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(samples) / wall_s, 3) if wall_s > 0 else 0.0,
+        "throughput_cqs_per_s": round(cqs / wall_s, 3) if wall_s > 0 else 0.0,
+        "latency_ms": stats_ms(latencies),
+        "service_ms": stats_ms([x["service_s"] for x in samples]),
+        "histogram": histogram,
+        "timeline": [{"second": k, **v} for k, v in sorted(timeline.items())],
+    }
+
+def run_benchmark(args, units: List[List[Dict[str, str]]], endpoint: Any, optimize: bool) -> Dict[str, Any]:
+    concurrency = max(1, args.workers)
+    if args.warmup > 0:
+        log(f"Warm-up: {args.warmup}s")
+        drive_load(units, endpoint, args.timeout, optimize, concurrency, args.qps,
+                   0, time.perf_counter() + args.warmup)
+
+    if args.duration > 0:
+        max_sends, deadline = 0, time.perf_counter() + args.duration
+        log(f"Measuring: {args.duration}s | concurrency={concurrency} | qps={args.qps or 'closed-loop'}")
+    else:
+        max_sends, deadline = len(units) * max(1, args.iterations), None
+        log(f"Measuring: {max(1, args.iterations)} iteration(s) x {len(units)} requests | concurrency={concurrency} | qps={args.qps or 'closed-loop'}")
+
+    t0 = time.perf_counter()
+    samples = drive_load(units, endpoint, args.timeout, optimize, concurrency, args.qps, max_sends, deadline)
+    summary = summarize_benchmark(samples, time.perf_counter() - t0)
+    summary = {
+        "label": args.label,
+        "endpoint": str(endpoint),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "in_csv": args.in_csv,
+            "suite_cqs": sum(len(u) for u in units),
+            "suite_requests": len(units),
+            "concurrency": concurrency,
+            "qps": args.qps,
+            "duration_s": args.duration,
+            "iterations": args.iterations if args.duration <= 0 else None,
+            "warmup_s": args.warmup,
+            "batch_size": args.batch_size,
+            "optimize": optimize,
+            "timeout_s": args.timeout,
+        },
+        **summary,
+    }
+
+    lat = summary["latency_ms"]
+    log(f"Benchmark: {summary['requests']} requests ({summary['cqs']} CQs) in {summary['wall_s']}s | "
+        f"{summary['throughput_rps']} req/s | errors={summary['errors']}")
+    if lat:
+        log(f"Latency ms: p50={lat['p50']} p95={lat['p95']} p99={lat['p99']} max={lat['max']}")
+    return summary
+
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--endpoint", required=True)
+    ap.add_argument("--endpoint", default="", help="SPARQL endpoint URL, or embedded:<store_dir> for the in-process backend. "
+                    "Several comma-separated URLs are treated as equivalent replicas and load-balanced.")
     ap.add_argument("--in_csv", required=True)
     ap.add_argument("--out_csv", default="cq_results.csv")
     ap.add_argument("--timeout", type=int, default=60)
-    ap.add_argument("--workers", type=int, default=1, help="Default 1 to avoid overloading GraphDB.")
-    ap.add_argument("--optimize_limit1", action="store_true", help="Force LIMIT 1 for non_empty/empty_ok checks.")
+    ap.add_argument("--workers", type=int, default=1, help="Default 1 to avoid overloading GraphDB. With --adaptive: upper bound (default 16).")
+    ap.add_argument("--adaptive", action="store_true", help="Grow/shrink in-flight queries (AIMD) to hold --target_p95.")
+    ap.add_argument("--target_p95", type=float, default=2.0, help="Adaptive mode: target p95 latency in seconds.")
+    ap.add_argument("--min_workers", type=int, default=1, help="Adaptive mode: lower bound for in-flight queries.")
+    ap.add_argument("--retries", type=int, default=3, help="Retries for 429/502/503/504 and connection errors (jittered backoff).")
+    ap.add_argument("--retry_backoff", type=float, default=0.5, help="Base backoff in seconds for retries.")
+    ap.add_argument("--no_optimize", action="store_true", help="Send queries verbatim (disable the pass_rule-aware rewrite).")
+    ap.add_argument("--optimize_limit1", action="store_true", help="Deprecated: the rewrite is now on by default.")
+    ap.add_argument("--batch_size", type=int, default=0, help="If >1, pack up to N ask=true/non_empty/empty_ok checks into one request.")
     ap.add_argument("--max_queries", type=int, default=0, help="If >0, run only first N queries.")
     ap.add_argument("--log_every", type=int, default=25, help="Print progress every N queries.")
     ap.add_argument("--verbose", action="store_true", help="Print one log line per query.")
+    ap.add_argument("--slowest", type=int, default=10, help="Number of slowest CQs listed in the final latency report.")
+    ap.add_argument("--profile", action="store_true", help="Lint CQs for anti-patterns and re-run slow ones for their query plan.")
+    ap.add_argument("--profile_threshold_ms", type=float, default=1000, help="Profile: latency from which a CQ is explained.")
+    ap.add_argument("--profile_json", default="cq_profile.json", help="Profile: output JSON (plans, estimated/actual solutions, findings).")
+    ap.add_argument("--explain_graph", default=EXPLAIN_GRAPH, help="Profile: pseudo-graph returning the plan (GraphDB onto:explain).")
+    ap.add_argument("--benchmark", action="store_true", help="Load-test mode: replay the suite and write --bench_json instead of --out_csv.")
+    ap.add_argument("--qps", type=float, default=0, help="Benchmark: target request rate (open loop). 0 = closed loop with --workers clients.")
+    ap.add_argument("--duration", type=float, default=0, help="Benchmark: measured phase length in seconds (overrides --iterations).")
+    ap.add_argument("--iterations", type=int, default=1, help="Benchmark: passes over the suite when --duration is not set.")
+    ap.add_argument("--warmup", type=float, default=0, help="Benchmark: warm-up seconds, not measured.")
+    ap.add_argument("--bench_json", default="cq_benchmark.json", help="Benchmark: output JSON (throughput, latency percentiles, histogram, timeline).")
+    ap.add_argument("--label", default="", help="Benchmark: free-form label (GraphDB config, ontology version, ruleset...).")
+    ap.add_argument("--stub_endpoint", action="store_true", help="Run against a local stand-in SPARQL endpoint (offline testing).")
+    ap.add_argument("--stub_latency_ms", type=float, default=0, help="Artificial latency of the stand-in endpoint.")
+    ap.add_argument("--ontology", default=str(DEFAULT_ONTOLOGY), help="Embedded backend: ontology file loaded into the store.")
+    ap.add_argument("--abox", action="append", default=[], help="Embedded backend: extra RDF dump (ABox) to load; repeatable.")
     args = ap.parse_args()
+    if not args.endpoint and not args.stub_endpoint:
+        ap.error("--endpoint is required (or use --stub_endpoint)")
 
+    optimize = not args.no_optimize
+    RETRY["retries"] = max(0, args.retries)
+    RETRY["backoff_s"] = args.retry_backoff
     in_path = Path(args.in_csv)
     if not in_path.exists():
         raise FileNotFoundError(f"Input CSV not found: {in_path}")
@@ -196,7 +1096,36 @@ def main():
         log("No rows found in input CSV.")
         sys.exit(0)
 
-    log(f"Starting run: {total} queries | workers={args.workers} | timeout={args.timeout}s | optimize_limit1={args.optimize_limit1}")
+    if args.endpoint.startswith(EMBEDDED_PREFIX):
+        sources = [Path(args.ontology)] + [Path(x) for x in args.abox]
+        open_embedded_store(args.endpoint[len(EMBEDDED_PREFIX):], sources, log=log)
+
+    if args.stub_endpoint:
+        args.endpoint, _ = start_stub_endpoint(args.stub_latency_ms)
+        log(f"Using local stand-in SPARQL endpoint ({args.stub_latency_ms}ms latency)")
+
+    urls = [u.strip() for u in args.endpoint.split(",") if u.strip()]
+    target: Any = urls[0]
+    pool = None
+    if len(urls) > 1:
+        if any(u.startswith(EMBEDDED_PREFIX) for u in urls):
+            raise SystemExit("embedded: endpoints cannot be load-balanced")
+        pool = EndpointPool(urls, probe=lambda url: _post_once(url, "ASK {}", 5, {}), log=log)
+        for replica in pool.replicas:
+            log(f"Replica {replica['url']}: {'up' if pool.check(replica) else 'DOWN'}")
+        target = pool
+
+    if args.benchmark:
+        units = plan_batches(rows, args.batch_size) if args.batch_size > 1 else [[row] for row in rows]
+        summary = run_benchmark(args, units, target, optimize)
+        if pool is not None:
+            summary["replicas"] = pool.snapshot()
+        bench_path = Path(args.bench_json)
+        bench_path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        log(f"Benchmark written to: {bench_path.resolve()}")
+        return
+
+    log(f"Starting run: {total} queries | workers={'adaptive' if args.adaptive else args.workers} | timeout={args.timeout}s | optimize={optimize} | batch_size={args.batch_size}")
     log(f"Endpoint: {args.endpoint}")
     if not _HAS_REQUESTS:
         log("requests not installed: using urllib (stdlib).")
@@ -205,8 +1134,9 @@ def main():
     ok = fail = err = 0
     t0 = time.time()
 
-    def on_result(cq_id: str, row: Dict[str, str], res: Dict[str, Any], dt: float):
+    def on_result(cq_id: str, row: Dict[str, str], res: Dict[str, Any]):
         nonlocal ok, fail, err
+        dt = res.get("timing", {}).get("latency_s", 0.0)
         passed = bool(res.get("passed", False))
         error = (res.get("error") or "").strip()
         if error:
@@ -227,47 +1157,71 @@ def main():
                 elapsed = time.time() - t0
                 log(f"Progress {done}/{total} | PASS={ok} FAIL={fail} ERR={err} | elapsed={int(elapsed)}s | {eta_str(done,total,elapsed)}")
 
-    if args.workers and args.workers > 1:
-        with ThreadPoolExecutor(max_workers=args.workers) as ex:
+    units = plan_batches(rows, args.batch_size) if args.batch_size > 1 else [[row] for row in rows]
+    if args.batch_size > 1:
+        batched = sum(len(u) for u in units if len(u) > 1)
+        log(f"Batching: {batched}/{total} queries packed into {sum(1 for u in units if len(u) > 1)} batches (batch_size={args.batch_size})")
+
+    def on_unit_done(unit: List[Dict[str, str]], results: List[Tuple[str, Dict[str, Any]]]):
+        for row, (cid, res) in zip(unit, results):
+            results_by_id[cid] = res
+            on_result(cid, row, res)
+
+    limiter = None
+    if args.adaptive:
+        max_workers = args.workers if args.workers > 1 else 16
+        limiter = AdaptiveLimiter(args.min_workers, max_workers, args.target_p95)
+
+    def run_task(unit: List[Dict[str, str]], submitted: float) -> List[Tuple[str, Dict[str, Any]]]:
+        # Queue wait covers both the executor queue and the adaptive limiter.
+        if limiter is not None:
+            limiter.acquire()
+        queue_s = time.perf_counter() - submitted
+        start = time.perf_counter()
+        congested = True
+        try:
+            results = run_unit(unit, target, args.timeout, optimize)
+            # retries absorbed by post_sparql (429/503, failovers) are congestion too
+            congested = any(res.get("error") or res["timing"].get("throttled") for _, res in results)
+        finally:
+            if limiter is not None:
+                limiter.release(time.perf_counter() - start, congested)
+        for _, res in results:
+            res["timing"]["queue_s"] = queue_s
+        return results
+
+    if limiter is not None or (args.workers and args.workers > 1):
+        with ThreadPoolExecutor(max_workers=limiter.max_limit if limiter else args.workers) as ex:
             fut_map = {}
-            for row in rows:
-                cq_id = (row.get("cq_id") or "").strip()
-                fut = ex.submit(run_one, row, args.endpoint, args.timeout, args.optimize_limit1)
-                fut_map[fut] = row
+            for unit in units:
+                fut = ex.submit(run_task, unit, time.perf_counter())
+                fut_map[fut] = unit
 
             for fut in as_completed(fut_map):
-                row = fut_map[fut]
-                cq_id = (row.get("cq_id") or "").strip()
-                t1 = time.time()
-                try:
-                    cid, res = fut.result()
-                    results_by_id[cid] = res
-                    dt = time.time() - t1  # note: measures post-completion window, not exact call duration
-                    on_result(cid, row, res, dt)
-                except Exception as e:
-                    res = {"passed": False, "error": str(e), "row_count": ""}
-                    results_by_id[cq_id] = res
-                    dt = time.time() - t1
-                    on_result(cq_id, row, res, dt)
+                on_unit_done(fut_map[fut], fut.result())
     else:
-        for idx, row in enumerate(rows, start=1):
-            cq_id = (row.get("cq_id") or "").strip()
+        done_rows = 0
+        for unit in units:
             if args.verbose:
-                log(f"Running {idx}/{total}: {cq_id} | pass_rule={row.get('pass_rule','')} | kind={row.get('sparql_kind','')}")
-            start = time.time()
-            try:
-                cid, res = run_one(row, args.endpoint, args.timeout, args.optimize_limit1)
-                results_by_id[cid] = res
-                dt = time.time() - start
-                on_result(cid, row, res, dt)
-            except Exception as e:
-                res = {"passed": False, "error": str(e), "row_count": ""}
-                results_by_id[cq_id] = res
-                dt = time.time() - start
-                on_result(cq_id, row, res, dt)
+                row = unit[0]
+                if len(unit) == 1:
+                    log(f"Running {done_rows + 1}/{total}: {row.get('cq_id', '').strip()} | pass_rule={row.get('pass_rule','')} | kind={row.get('sparql_kind','')}")
+                else:
+                    log(f"Running {done_rows + 1}-{done_rows + len(unit)}/{total}: batch of {len(unit)}")
+            on_unit_done(unit, run_task(unit, time.perf_counter()))
+            done_rows += len(unit)
+
+    profiles: Dict[str, Dict[str, Any]] = {}
+    if args.profile:
+        # sequentially, after the run: plans and counts must not skew the measured latencies
+        profiles = profile_slow_cqs(rows, results_by_id, target, args.timeout, optimize,
+                                    args.profile_threshold_ms, args.explain_graph)
 
     # Write final CSV
-    out_fields = ["cq_id","use_case","scenario_step","dimension","question","sparql","pass_rule","notes","result","error"]
+    out_fields = ["cq_id","use_case","scenario_step","dimension","question","sparql","pass_rule","notes","result","error",
+                  "latency_ms","queue_ms","server_ms","network_ms","response_bytes","batch","replica"]
+    if args.profile:
+        out_fields += ["antipatterns", "plan_estimated_rows", "plan_actual_rows"]
     out_path = Path(args.out_csv)
     with out_path.open("w", encoding="utf-8", newline="") as f:
         w = csv.DictWriter(f, fieldnames=out_fields, delimiter=";")
@@ -275,7 +1229,8 @@ def main():
         for row in rows:
             cq_id = (row.get("cq_id") or "").strip()
             res = results_by_id.get(cq_id, {"passed": False, "error": "missing_result", "row_count": ""})
-            w.writerow({
+            timing = res.get("timing") or {}
+            out = {
                 "cq_id": cq_id,
                 "use_case": row.get("use_case", ""),
                 "scenario_step": row.get("scenario_step", ""),
@@ -286,11 +1241,44 @@ def main():
                 "notes": row.get("notes", ""),
                 "result": "PASS" if res.get("passed") else "FAIL",
                 "error": res.get("error", ""),
-            })
+                "latency_ms": format_ms(timing.get("latency_s")),
+                "queue_ms": format_ms(timing.get("queue_s")),
+                "server_ms": format_ms(timing.get("server_s")),
+                "network_ms": format_ms(timing.get("network_s")),
+                "response_bytes": timing.get("response_bytes", ""),
+                "batch": timing.get("batch", ""),
+                "replica": timing.get("replica") or "",
+            }
+            if args.profile:
+                profile = res.get("profile") or {}
+                out["antipatterns"] = antipattern_names((profile or res).get("antipatterns") or [])
+                out["plan_estimated_rows"] = "" if profile.get("estimated_rows") is None else f"{profile['estimated_rows']:g}"
+                out["plan_actual_rows"] = "" if profile.get("actual_rows") is None else profile["actual_rows"]
+            w.writerow(out)
 
     elapsed = time.time() - t0
     log(f"Finished. PASS={ok} FAIL={fail} ERR={err} | total={total} | elapsed={int(elapsed)}s")
     log(f"Output written to: {out_path.resolve()}")
+    if args.profile:
+        flagged: Dict[str, int] = {}
+        for res in results_by_id.values():
+            for name in {x["rule"] for x in (res.get("profile") or res).get("antipatterns") or []}:
+                flagged[name] = flagged.get(name, 0) + 1
+        flagged = dict(sorted(flagged.items()))
+        profile_path = Path(args.profile_json)
+        profile_path.write_text(json.dumps({
+            "endpoint": args.endpoint,
+            "threshold_ms": args.profile_threshold_ms,
+            "explain_graph": args.explain_graph,
+            "flagged_cqs": flagged,
+            "profiles": list(profiles.values()),
+        }, indent=2), encoding="utf-8")
+        log(f"Anti-patterns: {', '.join(f'{k}={v}' for k, v in flagged.items()) or 'none'}")
+        log(f"Profile written to: {profile_path.resolve()}")
+    if pool is not None:
+        for r in pool.snapshot():
+            log(f"Replica {r['url']}: served={r['served']} errors={r['errors']} healthy={r['healthy']}")
+    latency_report(rows, results_by_id, args.slowest)
 
 if __name__ == "__main__":
     main()
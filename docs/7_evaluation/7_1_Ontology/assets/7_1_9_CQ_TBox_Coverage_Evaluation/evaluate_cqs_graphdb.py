@@ -25,17 +25,74 @@ Each result cell is:
 - PASS
 - FAIL (missing: ... )
 - FAIL (error: ... )
+
+With --backend embedded the three repositories are replaced by in-process stores
+(pyoxigraph, persisted under --store-dir; rdflib in-memory as a fallback) built from
+the files in ontologies/ plus optional --abox dumps. No GraphDB or HTTP is involved,
+which makes it usable as a quick CI check. Note that no reasoning is applied.
+
+With --incremental the script keeps a state file next to the output (dependency
+index CQ -> referenced IRIs, plus a fingerprint of the triples around each IRI per
+repository) and only re-runs the (CQ, repository) pairs whose IRIs changed since
+the previous run; the other result cells are copied from the previous output.
+CQs using `*` / `+` property paths are re-run whenever anything in the repository
+changed (statement count + checksum), since their answer reaches past those triples.
+
+--graphdb accepts several comma-separated base URLs of replicas holding the same
+repositories: queries go to the replica with the fewest outstanding requests and
+fail over on connection errors; throttling (429/502/503/504) is retried with backoff
+(--retries). The pool, the SPARQL linter / plan helpers and the embedded store are
+shared with run_cq_sparql_graphdb.py (../cq_sparql_common.py); use --workers to
+evaluate CQs concurrently.
+
+For every repository the output also carries timing columns
+(<repo>_latency_ms, <repo>_server_ms, <repo>_network_ms, <repo>_bytes),
+and a latency summary (p50/p95/p99, slowest CQs, per dimension/use case)
+is printed to stderr at the end of the run.
+
+With --profile every CQ is linted for query anti-patterns (unbounded property
+paths, cartesian products, unconstrained ?s ?p ?o, REGEX filters; `antipatterns`
+column) and each (CQ, repository) pair slower than --profile-threshold-ms is
+profiled: its plan is read from GraphDB's explain pseudo-graph and the estimated
+solutions are compared with the actual ones, counted by re-running the WHERE
+pattern (<repo>_plan_estimated_rows, <repo>_plan_actual_rows). Plans and findings
+go to <output>.profile.json.
 """
 
 from __future__ import annotations
 
 import argparse
+import csv
+import hashlib
+import io
+import json
+import re
 import sys
 import time
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
 import pandas as pd
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from cq_sparql_common import (  # noqa: E402
+    EMBEDDED_PREFIX,
+    EXPLAIN_GRAPH,
+    MISESTIMATE_FACTOR,
+    RESULTS_ACCEPT,
+    RETRY,
+    EndpointPool,
+    count_query,
+    explain_query,
+    lint_query,
+    open_embedded_store,
+    parse_plan,
+    percentile,
+    query_embedded,
+    send_with_retries,
+)
+
 try:
     import requests  # type: ignore
 except ImportError:
@@ -47,28 +104,90 @@ def sparql_endpoint(base_url: str, repo_id: str) -> str:
     return f"{base_url}/repositories/{repo_id}"
 
 
+ONTOLOGIES_DIR = Path(__file__).resolve().parent / "ontologies"
+# result column -> ontology file loaded into the embedded store standing in for that repository
+EMBEDDED_ONTOLOGIES = {
+    "w3c_result": "w3c.rdf",
+    "http_onto_result": "http-onto.rdf",
+    "ontowebpt_result": "ontowebpt_1.0.4.rdf",
+}
+
+
+def read_select_results(raw: Any, content_type: str) -> dict:
+    """
+    Decode a SPARQL result stream into the JSON result shape.
+
+    CSV results are consumed row by row and duplicate rows are dropped while
+    reading, so a query returning the same missing feature many times only
+    keeps one binding for it. CSV carries no term types: values come back as
+    plain literal bindings, which is all extract_missing_features needs.
+    """
+    if not content_type.startswith("text/csv"):
+        return json.load(raw)
+    reader = csv.reader(io.TextIOWrapper(raw, encoding="utf-8", newline=""))
+    header = next(reader, [])
+    seen: Dict[Tuple[str, ...], None] = {}
+    for record in reader:
+        seen.setdefault(tuple(record), None)
+    bindings = [
+        {h: {"type": "literal", "value": v} for h, v in zip(header, record) if v != ""} for record in seen
+    ]
+    return {"head": {"vars": header}, "results": {"bindings": bindings}}
+
+
 def post_sparql_select(
-    endpoint: str,
+    endpoint: Any,
     query: str,
     timeout_s: int = 30,
     auth: Optional[Tuple[str, str]] = None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> dict:
+    """
+    POST a query to `endpoint` (URL, embedded:<store_dir> or EndpointPool).
+    If `stats` is given it receives server_s, network_s, response_bytes, replica and
+    attempts. Retries and replica failover follow cq_sparql_common.send_with_retries.
+    """
+    stats = {} if stats is None else stats
+    if isinstance(endpoint, str) and endpoint.startswith(EMBEDDED_PREFIX):
+        stats["replica"] = endpoint
+        return query_embedded(endpoint, query, stats)
+    return send_with_retries(endpoint, lambda url: _post_select_once(url, query, timeout_s, auth, stats), stats)
+
+
+def _post_select_once(
+    endpoint: str,
+    query: str,
+    timeout_s: int,
+    auth: Optional[Tuple[str, str]],
+    stats: Dict[str, Any],
 ) -> dict:
     if requests is None:
         raise RuntimeError("Missing dependency: requests. Install it with `pip install requests`.")
 
     headers = {
-        "Accept": "application/sparql-results+json",
+        "Accept": RESULTS_ACCEPT,
+        "Accept-Encoding": "gzip",
         "Content-Type": "application/x-www-form-urlencoded; charset=utf-8",
     }
-    resp = requests.post(
+    t0 = time.perf_counter()
+    with requests.post(
         endpoint,
         data={"query": query},
         headers=headers,
         timeout=timeout_s,
         auth=auth,
-    )
-    resp.raise_for_status()
-    return resp.json()
+        stream=True,
+    ) as resp:
+        resp.raise_for_status()
+        resp.raw.decode_content = True
+        resp.raw.auto_close = False  # let io.TextIOWrapper hit EOF instead of a closed file
+        result = read_select_results(resp.raw, resp.headers.get("Content-Type", ""))
+        # resp.elapsed: request sent -> response headers parsed (server time + one RTT)
+        stats["server_s"] = resp.elapsed.total_seconds()
+        stats["network_s"] = max(0.0, time.perf_counter() - t0 - stats["server_s"])
+        # bytes read off the wire (compressed if the server used gzip)
+        stats["response_bytes"] = resp.raw.tell()
+    return result
 
 
 def extract_missing_features(result_json: dict) -> List[str]:
@@ -76,27 +195,18 @@ def extract_missing_features(result_json: dict) -> List[str]:
     if "boolean" in result_json:
         return [] if bool(result_json["boolean"]) else ["ASK returned false"]
 
-    # SELECT response
+    # SELECT response: unique features, in order of first appearance
     bindings = (((result_json.get("results") or {}).get("bindings")) or [])
-    missing: List[str] = []
+    missing: Dict[str, None] = {}
     for b in bindings:
         if "feature" in b:
-            missing.append(b["feature"]["value"])
-        else:
+            missing.setdefault(b["feature"]["value"], None)
+        elif b:
             # fallback: take the first variable in this binding
-            if b:
-                first_key = next(iter(b.keys()))
-                missing.append(b[first_key]["value"])
-            else:
-                missing.append("unknown")
-    # unique, preserve order
-    seen = set()
-    out = []
-    for x in missing:
-        if x not in seen:
-            out.append(x)
-            seen.add(x)
-    return out
+            missing.setdefault(next(iter(b.values()))["value"], None)
+        else:
+            missing.setdefault("unknown", None)
+    return list(missing)
 
 
 def evaluate_query(
@@ -104,9 +214,17 @@ def evaluate_query(
     query: str,
     timeout_s: int,
     auth: Optional[Tuple[str, str]],
+    stats: Optional[Dict[str, Any]] = None,
 ) -> str:
+    """
+    Evaluate one CQ against one repository and return the result cell.
+    If `stats` is given it receives latency_s, server_s, network_s and response_bytes.
+    """
+    stats = {} if stats is None else stats
+    t0 = time.perf_counter()
     try:
-        res = post_sparql_select(endpoint, query, timeout_s=timeout_s, auth=auth)
+        res = post_sparql_select(endpoint, query, timeout_s=timeout_s, auth=auth, stats=stats)
+        stats["latency_s"] = time.perf_counter() - t0
         missing = extract_missing_features(res)
 
         # Convention: empty => PASS; otherwise FAIL + missing list
@@ -114,12 +232,306 @@ def evaluate_query(
             return "PASS"
         return "FAIL (missing: " + ", ".join(missing) + ")"
     except Exception as e:
+        stats["latency_s"] = time.perf_counter() - t0
         msg = str(e).replace("\n", " ").strip()
         if len(msg) > 250:
             msg = msg[:247] + "..."
         return f"FAIL (error: {msg})"
 
 
+def timing_columns(result_col: str) -> Dict[str, str]:
+    prefix = result_col[: -len("_result")] if result_col.endswith("_result") else result_col
+    return {
+        "latency_s": f"{prefix}_latency_ms",
+        "server_s": f"{prefix}_server_ms",
+        "network_s": f"{prefix}_network_ms",
+        "response_bytes": f"{prefix}_bytes",
+        "replica": f"{prefix}_replica",
+    }
+
+
+def print_latency_report(out_df: pd.DataFrame, result_cols: List[str], slowest: int) -> None:
+    """Print p50/p95/p99 per repository, the slowest (CQ, repository) pairs and a per-dimension/use-case breakdown."""
+    samples = []
+    for col in result_cols:
+        lat_col = timing_columns(col)["latency_s"]
+        if lat_col not in out_df.columns:
+            continue
+        for _, row in out_df.iterrows():
+            value = pd.to_numeric(row.get(lat_col), errors="coerce")
+            if pd.notna(value):
+                samples.append((float(value), col, row))
+    if not samples:
+        return
+
+    print("Latency summary (ms):", file=sys.stderr)
+    for col in result_cols:
+        values = [x[0] for x in samples if x[1] == col]
+        if values:
+            print(
+                f"  {col}: n={len(values)} p50={percentile(values, 50):.1f} "
+                f"p95={percentile(values, 95):.1f} p99={percentile(values, 99):.1f} max={max(values):.1f}",
+                file=sys.stderr,
+            )
+
+    if slowest > 0:
+        print(f"Slowest {min(slowest, len(samples))} queries:", file=sys.stderr)
+        for value, col, row in sorted(samples, key=lambda x: x[0], reverse=True)[:slowest]:
+            print(f"  {row.get('cq_id', '')} @ {col}: {value:.1f} ms | {row.get('dimension', '')}", file=sys.stderr)
+
+    for group_col in ("dimension", "use_case"):
+        if group_col not in out_df.columns:
+            continue
+        groups: Dict[str, List[float]] = {}
+        for value, _, row in samples:
+            groups.setdefault(str(row.get(group_col) or "-"), []).append(value)
+        print(f"By {group_col}:", file=sys.stderr)
+        for name, values in sorted(groups.items(), key=lambda kv: percentile(kv[1], 95), reverse=True):
+            print(
+                f"  {name}: n={len(values)} p50={percentile(values, 50):.1f} "
+                f"p95={percentile(values, 95):.1f} max={max(values):.1f}",
+                file=sys.stderr,
+            )
+
+
+def profile_query(
+    endpoint: Any,
+    query: str,
+    timeout_s: int,
+    auth: Optional[Tuple[str, str]],
+    explain_graph: str,
+) -> Dict[str, Any]:
+    """Plan (explain pseudo-graph), estimated solutions read from it and actual solutions (COUNT re-run)."""
+    profile: Dict[str, Any] = {"plan": None, "estimated_rows": None, "actual_rows": None, "antipatterns": []}
+    if isinstance(endpoint, str) and endpoint.startswith(EMBEDDED_PREFIX):
+        profile["plan_error"] = "query plans need GraphDB (embedded backend)"
+    else:
+        try:
+            res = post_sparql_select(endpoint, explain_query(query, explain_graph), timeout_s=timeout_s, auth=auth)
+            values = [b[k]["value"] for b in ((res.get("results") or {}).get("bindings") or []) for k in b]
+            if not values:
+                raise RuntimeError("endpoint returned no plan")
+            profile["plan"] = "\n".join(values)
+            parsed = parse_plan(profile["plan"])
+            profile["estimated_rows"] = parsed["estimated_rows"]
+            profile["plan_groups"] = parsed["groups"]
+        except Exception as e:
+            profile["plan_error"] = str(e)[:500]
+
+    t0 = time.perf_counter()
+    try:
+        res = post_sparql_select(endpoint, count_query(query), timeout_s=timeout_s, auth=auth)
+        bindings = (res.get("results") or {}).get("bindings") or []
+        count = (bindings[0] if bindings else {}).get("actual_rows")
+        if count is None:
+            raise RuntimeError("endpoint returned no count")
+        profile["actual_rows"] = int(float(count["value"]))
+    except Exception as e:
+        profile["actual_error"] = str(e)[:500]
+    profile["actual_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    est, act = profile["estimated_rows"], profile["actual_rows"]
+    if est is not None and act is not None and max(est, act) >= 100:
+        ratio = max(est, act) / max(min(est, act), 1.0)
+        if ratio >= MISESTIMATE_FACTOR:
+            profile["antipatterns"].append(
+                {
+                    "rule": "cardinality_misestimate",
+                    "severity": "warning",
+                    "detail": f"estimated {est:g} vs actual {act} solutions ({ratio:.0f}x)",
+                }
+            )
+    return profile
+
+
+def plan_columns(result_col: str) -> Dict[str, str]:
+    prefix = result_col[: -len("_result")] if result_col.endswith("_result") else result_col
+    return {"estimated_rows": f"{prefix}_plan_estimated_rows", "actual_rows": f"{prefix}_plan_actual_rows"}
+
+
+def antipattern_names(issues: List[Dict[str, str]]) -> str:
+    return ",".join(sorted({x["rule"] for x in issues}))
+
+
+def profile_slow_queries(
+    out_rows: List[pd.Series],
+    endpoints: Dict[str, Any],
+    threshold_ms: float,
+    timeout_s: int,
+    auth: Optional[Tuple[str, str]],
+    explain_graph: str,
+) -> List[Dict[str, Any]]:
+    """
+    Lint every CQ (`antipatterns` column), then explain the (CQ, repository) pairs
+    measured at or above `threshold_ms`, one at a time, filling the
+    <repo>_plan_estimated_rows / <repo>_plan_actual_rows columns.
+    Reused (incremental) results carry no latency and are not profiled.
+    """
+    profiles: List[Dict[str, Any]] = []
+    for row in out_rows:
+        query = row.get("sparql", "")
+        lint = lint_query(query) if query.strip() else []
+        flagged = list(lint)
+        for col, ep in endpoints.items():
+            latency = pd.to_numeric(row.get(timing_columns(col)["latency_s"]), errors="coerce")
+            if pd.isna(latency) or float(latency) < threshold_ms or not query.strip():
+                continue
+            profile = profile_query(ep, query, timeout_s, auth, explain_graph)
+            for key, out_col in plan_columns(col).items():
+                row[out_col] = profile[key]
+            flagged += profile["antipatterns"]
+            profile["antipatterns"] = lint + profile["antipatterns"]
+            profile = {"cq_id": row.get("cq_id", ""), "repository": col, "latency_ms": float(latency),
+                       "result": row.get(col, ""), "query": query, **profile}
+            profiles.append(profile)
+            est = "-" if profile["estimated_rows"] is None else f"{profile['estimated_rows']:g}"
+            act = "-" if profile["actual_rows"] is None else profile["actual_rows"]
+            print(
+                f"  {profile['cq_id']} @ {col}: {float(latency):.1f} ms | est={est} actual={act} | "
+                f"{antipattern_names(profile['antipatterns']) or 'no anti-pattern found'}",
+                file=sys.stderr,
+            )
+        row["antipatterns"] = antipattern_names(flagged)
+    return profiles
+
+
+# Namespaces used by the query templates themselves, never tracked as CQ dependencies.
+VOCABULARY_NAMESPACES = (
+    "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+    "http://www.w3.org/2000/01/rdf-schema#",
+    "http://www.w3.org/2002/07/owl#",
+    "http://www.w3.org/2001/XMLSchema#",
+)
+_PREFIX_DECL_RE = re.compile(r"PREFIX\s+([\w-]*):\s*<([^>]*)>", re.IGNORECASE)
+_VALUES_ROW_RE = re.compile(r'\(\s*"([^"]*)"\s+"[^"]*"\s+<([^>]+)>\s*\)')
+_STRIP_RE = re.compile(r'<[^>]*>|"[^"]*"|#[^\n]*')
+_PNAME_RE = re.compile(r"(?<![\w?$])([\w-]*):([\w][\w.-]*)")
+STATE_VERSION = 2
+
+
+def cq_dependencies(sparql: str, required_features: str) -> Dict[str, Any]:
+    """
+    Index the IRIs a CQ depends on.
+
+    IRIs come from full <...> references and declared prefixed names in the
+    query; the (feature, kind, iri) VALUES rows map them back to the features
+    listed in `required_features`. `complete` is False when a required feature
+    has no IRI in the query, in which case the CQ is always re-evaluated.
+    `paths` is True when the query uses `*` / `+` property paths: their answer
+    depends on triples more than one hop away from the indexed IRIs.
+    """
+    prefixes = dict(_PREFIX_DECL_RE.findall(sparql))
+    body = _PREFIX_DECL_RE.sub(" ", sparql)
+    iris = set(re.findall(r"<([^<>\s]+)>", body))
+    for prefix, local in _PNAME_RE.findall(_STRIP_RE.sub(" ", body)):
+        if prefix in prefixes:
+            iris.add(prefixes[prefix] + local)
+    iris = {x for x in iris if not x.startswith(VOCABULARY_NAMESPACES)}
+
+    features: Dict[str, List[str]] = {}
+    for feature, iri in _VALUES_ROW_RE.findall(sparql):
+        features.setdefault(feature, []).append(iri)
+    required = [x.strip() for x in (required_features or "").split(",") if x.strip()]
+    return {
+        "sparql_sha1": hashlib.sha1(sparql.encode("utf-8")).hexdigest(),
+        "iris": sorted(iris),
+        "features": features,
+        "complete": bool(iris) and all(f in features for f in required),
+        "paths": any(x["rule"] == "unbounded_property_path" for x in lint_query(sparql)),
+    }
+
+
+def fingerprint_iris(
+    endpoint: str,
+    iris: List[str],
+    timeout_s: int,
+    auth: Optional[Tuple[str, str]],
+    chunk: int = 200,
+) -> Dict[str, str]:
+    """
+    Hash, per IRI, every triple in which it appears as subject or object.
+    Blank node labels are not stable across loads, so they are hashed as `_:`.
+    IRIs absent from the repository get the hash of the empty set.
+    """
+    lines: Dict[str, List[str]] = {iri: [] for iri in iris}
+    for start in range(0, len(iris), chunk):
+        values = " ".join(f"<{x}>" for x in iris[start:start + chunk])
+        query = (
+            "SELECT ?iri ?dir ?p ?x WHERE {\n"
+            f"  VALUES ?iri {{ {values} }}\n"
+            '  { ?iri ?p ?x BIND("out" AS ?dir) } UNION { ?x ?p ?iri BIND("in" AS ?dir) }\n'
+            "}"
+        )
+        res = post_sparql_select(endpoint, query, timeout_s=timeout_s, auth=auth)
+        for b in ((res.get("results") or {}).get("bindings") or []):
+            lines[b["iri"]["value"]].append(f"{b['dir']['value']} {b['p']['value']} {_stable_term(b.get('x', {}))}")
+    return {
+        iri: hashlib.sha1("\n".join(sorted(set(rows))).encode("utf-8")).hexdigest()
+        for iri, rows in lines.items()
+    }
+
+
+def _stable_term(term: Dict[str, str]) -> str:
+    value = term.get("value", "")
+    return "_:" if term.get("type") == "bnode" or value.startswith("_:") else value
+
+
+def repository_marker(endpoint: str, timeout_s: int, auth: Optional[Tuple[str, str]]) -> Dict[str, Any]:
+    """
+    Statement count and an order-independent checksum of every statement the
+    repository returns (inferred ones included), to detect changes the per-IRI
+    fingerprints cannot see (closures through property paths, axioms further away).
+    """
+    res = post_sparql_select(endpoint, "SELECT ?s ?p ?o WHERE { ?s ?p ?o }", timeout_s=timeout_s, auth=auth)
+    total = count = 0
+    for b in ((res.get("results") or {}).get("bindings") or []):
+        line = " ".join(_stable_term(b.get(v, {})) for v in ("s", "p", "o"))
+        total = (total + int(hashlib.sha1(line.encode("utf-8")).hexdigest(), 16)) % (1 << 160)
+        count += 1
+    return {"statements": count, "checksum": f"{total:040x}"}
+
+
+def load_state(path: Path) -> Optional[dict]:
+    if not path.exists():
+        return None
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable state file {path}: {e}", file=sys.stderr)
+        return None
+    return state if state.get("version") == STATE_VERSION else None
+
+
+def reusable(
+    cq_id: str,
+    col: str,
+    dep: Dict[str, Any],
+    state: Optional[dict],
+    previous: Dict[str, Dict[str, str]],
+    fingerprints: Dict[str, Optional[Dict[str, str]]],
+    markers: Dict[str, Optional[Dict[str, Any]]],
+) -> bool:
+    """
+    True when the previous result of (cq_id, col) is still valid for the current ontology:
+    same query, unchanged fingerprints of its IRIs and, for CQs using property paths,
+    an unchanged repository.
+    """
+    if state is None or not dep["complete"] or fingerprints.get(col) is None:
+        return False
+    prev_dep = (state.get("cqs") or {}).get(cq_id)
+    prev_repo = (state.get("repositories") or {}).get(col) or {}
+    prev_fp = prev_repo.get("fingerprints") or {}
+    if dep["paths"] and (markers.get(col) is None or prev_repo.get("marker") != markers[col]):
+        return False
+    prev_cell = (previous.get(cq_id) or {}).get(col, "")
+    if not prev_dep or prev_dep.get("sparql_sha1") != dep["sparql_sha1"]:
+        return False
+    if not prev_cell or prev_cell.startswith("FAIL (error:"):
+        return False
+    current = fingerprints[col] or {}
+    return all(iri in prev_fp and prev_fp[iri] == current.get(iri) for iri in dep["iris"])
+
+
 def main() -> int:
     ap = argparse.ArgumentParser()
     ap.add_argument(
@@ -135,7 +547,8 @@ def main() -> int:
     ap.add_argument(
         "--graphdb",
         default="http://localhost:7200",
-        help="GraphDB base URL (default: http://localhost:7200).",
+        help="GraphDB base URL (default: http://localhost:7200). Several comma-separated URLs are treated as "
+        "replicas holding the same repositories: queries are load-balanced with failover.",
     )
     ap.add_argument(
         "--repo-w3c",
@@ -152,12 +565,63 @@ def main() -> int:
         default="ontowebpt",
         help="Repository id for OntoWeb-PT ontology (default: ontowebpt).",
     )
+    ap.add_argument(
+        "--backend",
+        choices=["graphdb", "embedded"],
+        default="graphdb",
+        help="graphdb: query the repositories over HTTP; embedded: evaluate in-process on "
+        "stores built from --ontologies-dir (pyoxigraph or rdflib).",
+    )
+    ap.add_argument(
+        "--store-dir",
+        default="cq_embedded_store",
+        help="Embedded backend: directory of the persisted stores, one per repository (default: cq_embedded_store).",
+    )
+    ap.add_argument(
+        "--ontologies-dir",
+        default=str(ONTOLOGIES_DIR),
+        help="Embedded backend: directory with w3c.rdf, http-onto.rdf and ontowebpt_1.0.4.rdf.",
+    )
+    ap.add_argument(
+        "--abox",
+        action="append",
+        default=[],
+        help="Embedded backend: optional RDF dump loaded into every store, repeatable.",
+    )
+    ap.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Re-evaluate only the (CQ, repository) pairs whose referenced IRIs changed since the previous run; "
+        "the other results are copied from --previous.",
+    )
+    ap.add_argument(
+        "--previous",
+        default=None,
+        help="Incremental mode: results CSV of the previous run (default: --output).",
+    )
+    ap.add_argument(
+        "--state",
+        default=None,
+        help="Incremental mode: dependency index + IRI fingerprints of the previous run (default: <output>.state.json).",
+    )
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="CQs evaluated concurrently (default: 1). Output order always follows the input.",
+    )
     ap.add_argument(
         "--timeout",
         type=int,
         default=30,
         help="HTTP timeout per SPARQL query in seconds (default: 30).",
     )
+    ap.add_argument(
+        "--retries",
+        type=int,
+        default=RETRY["retries"],
+        help="Retries for 429/502/503/504 and connection errors, with jittered backoff (default: 3).",
+    )
     ap.add_argument(
         "--username",
         default=None,
@@ -174,7 +638,35 @@ def main() -> int:
         default=None,
         help="Optional limit: evaluate only the first N CQs (useful for quick tests).",
     )
+    ap.add_argument(
+        "--slowest",
+        type=int,
+        default=10,
+        help="Number of slowest queries listed in the final latency summary (default: 10).",
+    )
+    ap.add_argument(
+        "--profile",
+        action="store_true",
+        help="Lint every CQ for query anti-patterns and fetch the GraphDB plan of the slow ones.",
+    )
+    ap.add_argument(
+        "--profile-threshold-ms",
+        type=float,
+        default=1000.0,
+        help="With --profile, explain the (CQ, repository) pairs at least this slow (default: 1000).",
+    )
+    ap.add_argument(
+        "--profile-output",
+        default=None,
+        help="With --profile, JSON report with plans and findings (default: <output>.profile.json).",
+    )
+    ap.add_argument(
+        "--explain-graph",
+        default=EXPLAIN_GRAPH,
+        help=f"Pseudo-graph returning the query plan (default: {EXPLAIN_GRAPH}).",
+    )
     args = ap.parse_args()
+    RETRY["retries"] = max(0, args.retries)
 
     auth: Optional[Tuple[str, str]] = None
     if args.username is not None or args.password is not None:
@@ -192,39 +684,147 @@ def main() -> int:
         print("Input CSV is missing the 'sparql' column.", file=sys.stderr)
         return 2
 
-    endpoints = {
-        "w3c_result": sparql_endpoint(args.graphdb, args.repo_w3c),
-        "http_onto_result": sparql_endpoint(args.graphdb, args.repo_http_onto),
-        "ontowebpt_result": sparql_endpoint(args.graphdb, args.repo_ontowebpt),
+    repos = {
+        "w3c_result": args.repo_w3c,
+        "http_onto_result": args.repo_http_onto,
+        "ontowebpt_result": args.repo_ontowebpt,
     }
-
-    total = len(df)
-    out_rows = []
-    t0 = time.time()
-    for i, row in df.iterrows():
+    base_urls = [u.strip() for u in args.graphdb.split(",") if u.strip()]
+    endpoints: Dict[str, Any] = {}
+    for col, repo_id in repos.items():
+        urls = [sparql_endpoint(base, repo_id) for base in base_urls]
+        if len(urls) > 1:
+            endpoints[col] = EndpointPool(
+                urls, probe=lambda url: _post_select_once(url, "ASK {}", 5, auth, {})
+            )
+        else:
+            endpoints[col] = urls[0]
+    if args.backend == "embedded":
+        for col, filename in EMBEDDED_ONTOLOGIES.items():
+            store_dir = str(Path(args.store_dir) / col[: -len("_result")])
+            sources = [Path(args.ontologies_dir) / filename] + [Path(x) for x in args.abox]
+            try:
+                open_embedded_store(store_dir, sources)
+            except (OSError, RuntimeError, ValueError) as e:
+                print(f"Cannot open embedded store for {col}: {e}", file=sys.stderr)
+                return 2
+            endpoints[col] = EMBEDDED_PREFIX + store_dir
+
+    dependencies: Dict[str, Dict[str, Any]] = {}
+    fingerprints: Dict[str, Optional[Dict[str, str]]] = {}
+    markers: Dict[str, Optional[Dict[str, Any]]] = {}
+    previous: Dict[str, Dict[str, str]] = {}
+    state: Optional[dict] = None
+    state_path = Path(args.state or f"{args.output}.state.json")
+    if args.incremental:
+        for _, row in df.iterrows():
+            dependencies[row.get("cq_id", "")] = cq_dependencies(row.get("sparql", ""), row.get("required_features", ""))
+        tracked = sorted({iri for dep in dependencies.values() for iri in dep["iris"]})
+        for col, ep in endpoints.items():
+            try:
+                fingerprints[col] = fingerprint_iris(ep, tracked, timeout_s=args.timeout, auth=auth)
+            except Exception as e:
+                print(f"Fingerprinting {col} failed, re-evaluating all its CQs: {e}", file=sys.stderr)
+                fingerprints[col] = None
+            if any(dep["paths"] for dep in dependencies.values()):
+                try:
+                    markers[col] = repository_marker(ep, timeout_s=args.timeout, auth=auth)
+                except Exception as e:
+                    print(f"Checksumming {col} failed, re-evaluating its property-path CQs: {e}", file=sys.stderr)
+                    markers[col] = None
+        state = load_state(state_path)
+        previous_path = Path(args.previous or args.output)
+        if state is not None and previous_path.exists():
+            prev_df = pd.read_csv(previous_path, sep=";", dtype=str).fillna("")
+            previous = {r.get("cq_id", ""): dict(r) for _, r in prev_df.iterrows()}
+
+    def evaluate_row(row: pd.Series) -> Tuple[pd.Series, int]:
         query = row.get("sparql", "")
         if not query.strip():
             # If query is empty, treat as FAIL with reason
             row["w3c_result"] = "FAIL (error: empty SPARQL)"
             row["http_onto_result"] = "FAIL (error: empty SPARQL)"
             row["ontowebpt_result"] = "FAIL (error: empty SPARQL)"
-            out_rows.append(row)
-            continue
+            return row, 0
 
+        row_reused = 0
         for col, ep in endpoints.items():
-            row[col] = evaluate_query(ep, query, timeout_s=args.timeout, auth=auth)
+            cq_id = row.get("cq_id", "")
+            if args.incremental and reusable(cq_id, col, dependencies[cq_id], state, previous, fingerprints, markers):
+                row[col] = previous[cq_id][col]
+                for out_col in timing_columns(col).values():
+                    row[out_col] = None
+                row_reused += 1
+                continue
+            stats: Dict[str, Any] = {}
+            row[col] = evaluate_query(ep, query, timeout_s=args.timeout, auth=auth, stats=stats)
+            for key, out_col in timing_columns(col).items():
+                value = stats.get(key)
+                if value is not None and key.endswith("_s"):
+                    value = round(value * 1000, 1)
+                row[out_col] = value
+        return row, row_reused
+
+    total = len(df)
+    out_rows = []
+    reused = 0
+    t0 = time.time()
+    rows_in = (row for _, row in df.iterrows())
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
+        # map() yields in input order, whichever replica/worker finished first
+        for row, row_reused in ex.map(evaluate_row, rows_in):
+            out_rows.append(row)
+            reused += row_reused
 
-        out_rows.append(row)
+            # lightweight progress
+            if (len(out_rows) % 25) == 0 or len(out_rows) == total:
+                elapsed = time.time() - t0
+                print(f"[{len(out_rows)}/{total}] done in {elapsed:.1f}s", file=sys.stderr)
 
-        # lightweight progress
-        if (len(out_rows) % 25) == 0 or len(out_rows) == total:
-            elapsed = time.time() - t0
-            print(f"[{len(out_rows)}/{total}] done in {elapsed:.1f}s", file=sys.stderr)
+    profiles: List[Dict[str, Any]] = []
+    if args.profile:
+        print(f"Profiling queries slower than {args.profile_threshold_ms:g} ms:", file=sys.stderr)
+        profiles = profile_slow_queries(
+            out_rows, endpoints, args.profile_threshold_ms, args.timeout, auth, args.explain_graph
+        )
 
     out_df = pd.DataFrame(out_rows)
     out_df.to_csv(args.output, sep=";", index=False)
 
     print(f"Saved results to: {args.output}")
+    for col, ep in endpoints.items():
+        if isinstance(ep, EndpointPool):
+            served = ", ".join(f"{r['url']}={r['served']} ({r['errors']} errors)" for r in ep.replicas)
+            print(f"{col} replicas: {served}", file=sys.stderr)
+    if args.incremental:
+        pairs = total * len(endpoints)
+        print(f"Incremental: reused {reused}/{pairs} results, re-evaluated {pairs - reused}", file=sys.stderr)
+        new_state = {
+            "version": STATE_VERSION,
+            "cqs": dependencies,
+            "repositories": {
+                col: {"endpoint": str(ep), "fingerprints": fingerprints.get(col), "marker": markers.get(col)}
+                for col, ep in endpoints.items()
+            },
+        }
+        state_path.write_text(json.dumps(new_state, indent=2), encoding="utf-8")
+    print_latency_report(out_df, list(endpoints.keys()), args.slowest)
+    if args.profile:
+        flagged: Dict[str, int] = {}
+        for names in out_df["antipatterns"]:
+            for name in filter(None, str(names).split(",")):
+                flagged[name] = flagged.get(name, 0) + 1
+        profile_path = Path(args.profile_output or f"{args.output}.profile.json")
+        report = {
+            "threshold_ms": args.profile_threshold_ms,
+            "explain_graph": args.explain_graph,
+            "flagged_cqs": flagged,
+            "profiles": profiles,
+        }
+        profile_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        summary = ", ".join(f"{k}={v}" for k, v in sorted(flagged.items())) or "none"
+        print(f"Anti-patterns (CQs flagged): {summary}", file=sys.stderr)
+        print(f"Profile written to: {profile_path}", file=sys.stderr)
     return 0
 
 
@@ -0,0 +1,691 @@
+"""
+SPARQL tooling shared by the CQ runners:
+
+- 7_1_5_CQ_Based_Evaluation/run_cq_sparql_graphdb.py
+- 7_1_9_CQ_TBox_Coverage_Evaluation/evaluate_cqs_graphdb.py
+
+Retry policy and replica pool, the SPARQL tokenizer, the anti-pattern linter
+and the GraphDB plan helpers used when profiling, and the embedded
+(pyoxigraph / rdflib) store. Both scripts import this module by adding the
+parent directory to sys.path, so they keep working as standalone scripts.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import requests  # type: ignore
+    from urllib3.exceptions import ReadTimeoutError  # type: ignore
+except ImportError:
+    requests = None  # pragma: no cover
+    ReadTimeoutError = None  # pragma: no cover
+
+try:
+    import pyoxigraph  # type: ignore
+except ImportError:
+    pyoxigraph = None  # pragma: no cover
+
+try:
+    import rdflib  # type: ignore
+except ImportError:
+    rdflib = None  # pragma: no cover
+
+
+def _stderr(msg: str) -> None:
+    print(msg, file=sys.stderr, flush=True)
+
+
+# ---- Retry policy ----
+
+# Mutable on purpose: runners overwrite the values from their CLI options.
+RETRY = {"retries": 3, "backoff_s": 0.5, "backoff_cap_s": 15.0}
+# Throttling / overloaded gateway: retried with backoff, counted against the replica.
+THROTTLING_STATUS = {429, 502, 503, 504}
+
+
+class SparqlRequestError(RuntimeError):
+    """HTTP/transport failure from a urllib client; `status` is None for network errors."""
+
+    def __init__(self, message: str, status: Any = None, retry_after: Any = None, timeout: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.timeout = timeout
+
+
+def classify_failure(exc: Exception) -> Tuple[str, Any]:
+    """
+    Return (kind, retry_after_header) for a failed request, kind being:
+      - "throttled":  429/502/503/504, retried after a backoff (Retry-After honoured);
+      - "connection": the replica could not be reached, retried (on another replica at once);
+      - "timeout":    the query ran past the read timeout, not retried (re-sending a slow
+                      query only adds load) but held against the replica;
+      - "query":      anything else (4xx, 500 on a bad query, decoding errors), not retried.
+    """
+    status = getattr(exc, "status", None)
+    retry_after = getattr(exc, "retry_after", None)
+    response = getattr(exc, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+        retry_after = response.headers.get("Retry-After")
+    if status is not None:
+        return ("throttled" if status in THROTTLING_STATUS else "query"), retry_after
+    if getattr(exc, "timeout", False):
+        return "timeout", None
+    if requests is not None:
+        if isinstance(exc, requests.exceptions.ConnectTimeout):
+            return "connection", None
+        if isinstance(exc, (requests.exceptions.Timeout, ReadTimeoutError)):
+            return "timeout", None
+        if isinstance(exc, requests.exceptions.ConnectionError):
+            if isinstance(exc.args[0] if exc.args else None, ReadTimeoutError):
+                return "timeout", None
+            return "connection", None
+    if isinstance(exc, (socket.timeout, TimeoutError)):
+        return "timeout", None
+    if isinstance(exc, (SparqlRequestError, ConnectionError)):
+        return "connection", None
+    return "query", None
+
+
+def backoff_delay(attempt: int, retry_after: Any = None) -> float:
+    """Full-jitter exponential backoff, honouring a numeric Retry-After when present."""
+    cap = RETRY["backoff_cap_s"]
+    try:
+        if retry_after is not None:
+            return min(cap, float(retry_after))
+    except ValueError:
+        pass
+    return random.uniform(0, min(cap, RETRY["backoff_s"] * (2 ** attempt)))
+
+
+# ---- Replica pool: least-outstanding-requests balancing over equivalent endpoints ----
+
+
+class EndpointPool:
+    """
+    Equivalent SPARQL endpoints (read replicas) used as one target.
+
+    Each attempt goes to the healthy replica with the fewest outstanding
+    requests (ties: fewest served, then list order). A replica failing
+    `max_failures` times in a row (connection error, throttling status or
+    read timeout) is taken out for `cooldown_s`; when `probe` is given, a
+    background thread calls it every `probe_s` on the replicas that are down
+    and puts them back as soon as it succeeds. If every replica is down, the
+    one whose cooldown ends first is tried anyway.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        probe: Optional[Callable[[str], Any]] = None,
+        max_failures: int = 2,
+        cooldown_s: float = 30.0,
+        probe_s: float = 5.0,
+        log: Callable[[str], None] = _stderr,
+    ):
+        self.replicas = [
+            {"url": u, "outstanding": 0, "served": 0, "errors": 0, "failures": 0, "down_until": 0.0}
+            for u in urls
+        ]
+        self.probe = probe
+        self.max_failures = max(1, max_failures)
+        self.cooldown_s = cooldown_s
+        self.probe_s = probe_s
+        self.log = log
+        self._lock = threading.Lock()
+        if probe is not None:
+            threading.Thread(target=self._probe_loop, daemon=True).start()
+
+    def __str__(self) -> str:
+        return ", ".join(r["url"] for r in self.replicas)
+
+    def acquire(self, exclude: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            up = [r for r in self.replicas if r["down_until"] <= now]
+            candidates = [r for r in up if r["url"] != exclude] or up
+            if not candidates:
+                candidates = [min(self.replicas, key=lambda r: r["down_until"])]
+            replica = min(candidates, key=lambda r: (r["outstanding"], r["served"]))
+            replica["outstanding"] += 1
+            return replica
+
+    def release(self, replica: Dict[str, Any], failed: bool) -> None:
+        with self._lock:
+            replica["outstanding"] -= 1
+            if not failed:
+                if replica["down_until"] > 0:
+                    self.log(f"Replica back up: {replica['url']}")
+                replica["served"] += 1
+                replica["failures"] = 0
+                replica["down_until"] = 0.0
+                return
+            replica["errors"] += 1
+            replica["failures"] += 1
+            now = time.monotonic()
+            if replica["failures"] >= self.max_failures and replica["down_until"] <= now:
+                replica["down_until"] = now + self.cooldown_s
+                self.log(f"Replica marked down: {replica['url']} ({replica['failures']} consecutive failures)")
+
+    def has_alternative(self, url: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            return any(r["url"] != url and r["down_until"] <= now for r in self.replicas)
+
+    def check(self, replica: Dict[str, Any]) -> bool:
+        """Probe one replica and update its state; True if it answered."""
+        if self.probe is None:
+            return True
+        try:
+            self.probe(replica["url"])
+        except Exception:
+            with self._lock:
+                replica["failures"] = max(replica["failures"], self.max_failures)
+                replica["down_until"] = time.monotonic() + self.cooldown_s
+            return False
+        with self._lock:
+            if replica["down_until"] > 0:
+                self.log(f"Replica back up: {replica['url']}")
+            replica["failures"] = 0
+            replica["down_until"] = 0.0
+        return True
+
+    def _probe_loop(self) -> None:
+        while True:
+            time.sleep(self.probe_s)
+            for replica in self.replicas:
+                if replica["down_until"] > 0:
+                    self.check(replica)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {"url": r["url"], "served": r["served"], "errors": r["errors"], "healthy": r["down_until"] <= now}
+                for r in self.replicas
+            ]
+
+
+def send_with_retries(endpoint: Any, send: Callable[[str], Any], stats: Dict[str, Any]) -> Any:
+    """
+    Call `send(url)` on `endpoint` (a URL or an EndpointPool) with the RETRY policy.
+
+    Throttling statuses back off (Retry-After honoured) even when another
+    replica is available, since the whole pool is usually under the same load;
+    connection failures fail over to another healthy replica right away.
+    Read timeouts are not retried but count as replica failures.
+    `stats` receives attempts, the replica that answered and `throttled`
+    (an attempt was retried, i.e. the server pushed back).
+    """
+    pool = endpoint if isinstance(endpoint, EndpointPool) else None
+    attempt = 0
+    last_url = None
+    while True:
+        stats["attempts"] = attempt + 1
+        replica = pool.acquire(exclude=last_url) if pool else None
+        url = replica["url"] if replica else endpoint
+        try:
+            result = send(url)
+        except Exception as e:
+            kind, retry_after = classify_failure(e)
+            if replica:
+                pool.release(replica, failed=kind != "query")
+            if kind not in ("throttled", "connection") or attempt >= RETRY["retries"]:
+                raise
+            stats["throttled"] = True
+            if kind == "throttled" or not (pool and pool.has_alternative(url)):
+                time.sleep(backoff_delay(attempt, retry_after))
+            last_url = url
+            attempt += 1
+            continue
+        if replica:
+            pool.release(replica, failed=False)
+        stats["replica"] = url
+        return result
+
+
+# ---- Results and latency ----
+
+# SPARQL CSV for SELECT (compact, streamable); JSON stays acceptable for ASK.
+RESULTS_ACCEPT = "text/csv, application/sparql-results+json;q=0.9"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+# ---- SPARQL reader: tokens and the position of the WHERE group ----
+
+_TOKEN_RE = re.compile(
+    "|".join(
+        [
+            r"(?P<ws>\s+)",
+            r"(?P<comment>#[^\n]*)",
+            r"(?P<string>'''(?:[^'\\]|\\.|'(?!''))*'''"
+            r'|"""(?:[^"\\]|\\.|"(?!""))*"""'
+            r"|'(?:[^'\\\n]|\\.)*'"
+            r'|"(?:[^"\\\n]|\\.)*")',
+            r'(?P<iri><[^<>"{}|^`\\\x00-\x20]*>)',
+            r"(?P<var>[?$]\w+)",
+            r"(?P<word>[\w:%-]+(?:\.[\w:%-]+)*)",
+            r"(?P<punct>.)",
+        ]
+    ),
+    flags=re.DOTALL,
+)
+_GROUP_KEYWORDS = {"OPTIONAL", "MINUS", "GRAPH", "SERVICE", "FILTER", "BIND", "VALUES"}
+_QUERY_FORMS = {"SELECT", "ASK", "CONSTRUCT", "DESCRIBE"}
+
+
+def tokenize_sparql(sparql: str) -> List[Tuple[str, str, int, int]]:
+    """Significant tokens as (kind, text, start, end); a triple-ending "." is always its own token."""
+    return [
+        (m.lastgroup, m.group(0), m.start(), m.end())
+        for m in _TOKEN_RE.finditer(sparql)
+        if m.lastgroup not in ("ws", "comment")
+    ]
+
+
+def _matching(toks: List[Tuple[str, str, int, int]], i: int) -> int:
+    """Index of the bracket closing the one at toks[i] (len(toks) if unbalanced)."""
+    opening = toks[i][1]
+    closing = {"{": "}", "(": ")", "[": "]"}[opening]
+    depth = 0
+    for j in range(i, len(toks)):
+        if toks[j][1] == opening:
+            depth += 1
+        elif toks[j][1] == closing:
+            depth -= 1
+            if depth == 0:
+                return j
+    return len(toks)
+
+
+def query_parts(sparql: str) -> Dict[str, int]:
+    """
+    Token indexes of the query form, of the WHERE keyword (the group itself when
+    omitted), of the WHERE group braces and of a trailing VALUES clause (-1 if absent).
+    Raises ValueError when there is no balanced WHERE group.
+    """
+    toks = tokenize_sparql(sparql)
+    form = next((i for i, t in enumerate(toks) if t[1].upper() in _QUERY_FORMS), None)
+    if form is None:
+        raise ValueError("no query form")
+    where = next((i for i in range(form, len(toks)) if toks[i][1].upper() == "WHERE"), None)
+    start = next((i for i in range(where if where is not None else form, len(toks)) if toks[i][1] == "{"), None)
+    if start is None:
+        raise ValueError("missing WHERE group")
+    close = _matching(toks, start)
+    if close >= len(toks):
+        raise ValueError("unbalanced braces")
+    values, depth = -1, 0
+    for i in range(close + 1, len(toks)):
+        if toks[i][1] in ("(", "{"):
+            depth += 1
+        elif toks[i][1] in (")", "}"):
+            depth -= 1
+        elif depth == 0 and toks[i][1].upper() == "VALUES":
+            values = i
+            break
+    return {"form": form, "where": where if where is not None else start, "start": start, "close": close,
+            "values": values, "toks": toks}
+
+
+# ---- Profiling: anti-pattern lint and GraphDB query plans ----
+
+# GraphDB pseudo-graph returning the query plan instead of the results (full IRI, so that
+# it does not depend on the prefixes declared by the query).
+EXPLAIN_GRAPH = "http://www.ontotext.com/explain"
+# Estimated vs actual solutions this many times apart flags stale/misleading statistics.
+MISESTIMATE_FACTOR = 10.0
+_PLAN_VALUE_RE = re.compile(r"#\s*([A-Za-z][A-Za-z ()/_-]*?)\s*:\s*([-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)")
+
+
+class QueryLinter:
+    """
+    Syntax-only anti-pattern hints over the group graph patterns of a query:
+      - unbounded_property_path: `*` / `+` path operators (a closure over the whole
+        graph when both ends are variables);
+      - cartesian_product: a group whose joined patterns (triples, subgroups, OPTIONAL,
+        GRAPH, BIND, multi-row VALUES) split into sets sharing no variable;
+      - unconstrained_pattern: `?s ?p ?o` whose subject and object appear nowhere else;
+      - regex_filter: REGEX evaluated solution by solution, without an index.
+    """
+
+    def __init__(self, sparql: str):
+        self.toks = tokenize_sparql(sparql)
+        self.var_uses: Dict[str, int] = {}
+        for kind, text, _, _ in self.toks:
+            if kind == "var":
+                self.var_uses[text[1:]] = self.var_uses.get(text[1:], 0) + 1
+        self.issues: List[Dict[str, str]] = []
+
+    def run(self, start: int) -> List[Dict[str, str]]:
+        self.group(start + 1, _matching(self.toks, start))
+        return self.issues
+
+    def add(self, rule: str, severity: str, detail: str) -> None:
+        issue = {"rule": rule, "severity": severity, "detail": detail}
+        if issue not in self.issues:
+            self.issues.append(issue)
+
+    def expression(self, i: int, end: int) -> Tuple[set, int]:
+        """Consume a FILTER/BIND expression starting at toks[i]; EXISTS groups are linted on their own."""
+        found: set = set()
+        depth = 0
+        while i < end:
+            kind, text = self.toks[i][0], self.toks[i][1]
+            if text == "{":
+                close = _matching(self.toks, i)
+                self.group(i + 1, close)
+                i = close + 1
+                if depth == 0:
+                    return found, i
+                continue
+            if kind == "var":
+                found.add(text[1:])
+            elif text.upper() == "REGEX":
+                self.add("regex_filter", "info", "REGEX is evaluated per solution; prefer STRSTARTS/CONTAINS or a literal index")
+            elif text == "(":
+                depth += 1
+            elif text == ")":
+                depth -= 1
+                if depth == 0:
+                    return found, i + 1
+            i += 1
+        return found, i
+
+    def triples(self, block: List[Tuple[str, str, int, int]]) -> set:
+        if len(block) == 3 and all(t[0] == "var" for t in block):
+            s, o = block[0][1][1:], block[2][1][1:]
+            if self.var_uses.get(s, 0) == 1 and self.var_uses.get(o, 0) == 1:
+                self.add("unconstrained_pattern", "warning", f"{block[0][1]} {block[1][1]} {block[2][1]} scans every triple")
+        for n, (_, text, _, _) in enumerate(block):
+            if text not in ("*", "+") or n == 0:
+                continue
+            prev = block[n - 1]
+            if prev[0] == "iri" or prev[1] == ")" or (prev[0] == "word" and (":" in prev[1] or prev[1] == "a")):
+                ends = (block[0], block[n + 1] if n + 1 < len(block) else block[0])
+                both_free = all(t[0] == "var" for t in ends)
+                self.add(
+                    "unbounded_property_path",
+                    "warning" if both_free else "info",
+                    f"{prev[1]}{text}" + (" with both ends unbound" if both_free else ""),
+                )
+        return {t[1][1:] for t in block if t[0] == "var"}
+
+    def group(self, i: int, end: int) -> set:
+        """Lint the group toks[i:end] (braces excluded); returns the variables it mentions."""
+        if i < end and self.toks[i][1].upper() == "SELECT":
+            # subquery: its projection is what joins with the enclosing group
+            j = i
+            while j < end and self.toks[j][1] != "{":
+                j += 1
+            if j >= end:
+                return set()
+            inner = self.group(j + 1, _matching(self.toks, j))
+            head = {t[1][1:] for t in self.toks[i:j] if t[0] == "var"}
+            return head or inner
+
+        units: List[set] = []
+        filter_vars: List[set] = []
+        block: List[Tuple[str, str, int, int]] = []
+
+        def flush() -> None:
+            if block:
+                units.append(self.triples(block))
+                block.clear()
+
+        while i < end:
+            kind, text = self.toks[i][0], self.toks[i][1]
+            up = text.upper()
+            if text == "{":
+                flush()
+                close = _matching(self.toks, i)
+                found = self.group(i + 1, close)
+                i = close + 1
+                while i + 1 < end and self.toks[i][1].upper() == "UNION" and self.toks[i + 1][1] == "{":
+                    close = _matching(self.toks, i + 1)
+                    found |= self.group(i + 2, close)
+                    i = close + 1
+                units.append(found)
+                continue
+            if kind == "word" and up in _GROUP_KEYWORDS:
+                flush()
+                j = i + 1
+                if up in ("FILTER", "BIND"):
+                    found, i = self.expression(j, end)
+                    if up == "FILTER":
+                        filter_vars.append(found)
+                    elif len(found) > 1:  # BIND(<constant> AS ?v) joins like a one-row VALUES
+                        units.append(found)
+                    continue
+                while j < end and self.toks[j][1] != "{":
+                    j += 1
+                close = _matching(self.toks, j) if j < end else end
+                names = {t[1][1:] for t in self.toks[i + 1:j] if t[0] == "var"}
+                if up == "VALUES":
+                    data = self.toks[j + 1:close]
+                    rows = sum(1 for t in data if t[1] == "(") if self.toks[i + 1][1] == "(" else len(data)
+                    if rows > 1:  # a single row only binds constants
+                        units.append(names)
+                else:
+                    found = self.group(j + 1, close) if j < end else set()
+                    if up != "MINUS":
+                        units.append(found | names)
+                i = close + 1
+                continue
+            if text == ".":
+                flush()
+            else:
+                block.append(self.toks[i])
+            i += 1
+        flush()
+
+        # connected components over shared variables
+        components: List[set] = []
+        for unit in units:
+            if unit:
+                joined = [c for c in components if c & unit]
+                components = [c for c in components if not c & unit] + [set(unit).union(*joined)]
+        if len(components) > 1:
+            sets = " x ".join("{" + ", ".join("?" + v for v in sorted(c)) + "}" for c in components)
+            bridged = any(sum(1 for c in components if c & f) > 1 for f in filter_vars)
+            self.add("cartesian_product", "warning", sets + (" (only joined by a FILTER)" if bridged else ""))
+        return set().union(*units, *filter_vars)
+
+
+def lint_query(sparql: str) -> List[Dict[str, str]]:
+    """Anti-pattern findings for one query (see QueryLinter); [] if the query cannot be read."""
+    try:
+        return QueryLinter(sparql).run(query_parts(sparql)["start"])
+    except (ValueError, IndexError, KeyError):
+        return []
+
+
+def explain_query(sparql: str, graph: str = EXPLAIN_GRAPH) -> str:
+    """The query reading GraphDB's explain pseudo-graph (an ASK is asked as SELECT *)."""
+    parts = query_parts(sparql)
+    toks = parts["toks"]
+    form, where = toks[parts["form"]], toks[parts["where"]]
+    head = sparql[form[2]:where[2]] if form[1].upper() == "SELECT" else "SELECT *\n"
+    return sparql[:form[2]] + head.rstrip() + f"\nFROM <{graph}>\n" + sparql[where[2]:]
+
+
+def count_query(sparql: str) -> str:
+    """Count the solutions of the WHERE group (what the plan estimates); solution modifiers are dropped."""
+    parts = query_parts(sparql)
+    toks = parts["toks"]
+    out = sparql[:toks[parts["form"]][2]] + "SELECT (COUNT(*) AS ?actual_rows) WHERE "
+    out += sparql[toks[parts["start"]][2]:toks[parts["close"]][3]]
+    if parts["values"] >= 0:
+        out += "\n" + sparql[toks[parts["values"]][2]:]
+    return out + "\n"
+
+
+def parse_plan(plan: str) -> Dict[str, Any]:
+    """
+    Numeric annotations of a GraphDB plan: one dict per optimization group
+    ("Collection size", "Current complexity", ...) and the overall estimate
+    (ESTIMATED NUMBER OF ITERATIONS, else the largest complexity).
+    """
+    groups: List[Dict[str, float]] = []
+    overall: Dict[str, float] = {}
+    current: Optional[Dict[str, float]] = None
+    for line in plan.splitlines():
+        if "Begin optimization group" in line:
+            current = {}
+            groups.append(current)
+            continue
+        if "End optimization group" in line:
+            current = None
+            continue
+        for key, value in _PLAN_VALUE_RE.findall(line):
+            (overall if current is None else current)[key.strip()] = float(value)
+    estimated = next((v for k, v in overall.items() if k.upper() == "ESTIMATED NUMBER OF ITERATIONS"), None)
+    if estimated is None:
+        complexities = [g["Current complexity"] for g in groups if "Current complexity" in g]
+        estimated = max(complexities) if complexities else None
+    return {"estimated_rows": estimated, "groups": groups, "annotations": overall}
+
+
+# ---- Embedded store: pyoxigraph (persisted) or rdflib (in-memory) instead of GraphDB ----
+
+EMBEDDED_PREFIX = "embedded:"
+_RDF_EXTENSIONS = {
+    ".rdf": "xml",
+    ".owl": "xml",
+    ".xml": "xml",
+    ".ttl": "turtle",
+    ".nt": "nt",
+    ".nq": "nquads",
+    ".trig": "trig",
+}
+_OXI_EXTENSIONS = {"xml": "rdf", "turtle": "ttl", "nt": "nt", "nquads": "nq", "trig": "trig"}
+_EMBEDDED_STORES: Dict[str, Any] = {}
+_XSD_STRING = "http://www.w3.org/2001/XMLSchema#string"
+
+
+def _source_manifest(sources: List[Path]) -> List[Dict[str, Any]]:
+    out = []
+    for p in sources:
+        st = p.stat()
+        out.append({"path": str(p.resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+    return out
+
+
+def open_embedded_store(store_dir: str, sources: List[Path], log: Callable[[str], None] = _stderr) -> Any:
+    """
+    Open the store behind `embedded:<store_dir>` and register it for query_embedded.
+
+    With pyoxigraph the store is persisted (and indexed) in store_dir; the sources
+    are only re-loaded when their path/size/mtime differ from the manifest saved
+    next to it, so later runs start immediately. rdflib is an in-memory fallback
+    that parses the sources on every run.
+    """
+    for p in sources:
+        if p.suffix.lower() not in _RDF_EXTENSIONS:
+            raise ValueError(f"Unsupported RDF file extension: {p}")
+    manifest = _source_manifest(sources)
+
+    if pyoxigraph is not None:
+        root = Path(store_dir)
+        root.mkdir(parents=True, exist_ok=True)
+        manifest_path = root / "sources.json"
+        store = pyoxigraph.Store(str(root / "oxigraph"))
+        previous = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else None
+        if previous != manifest:
+            t0 = time.perf_counter()
+            store.clear()
+            for p in sources:
+                ext = _OXI_EXTENSIONS[_RDF_EXTENSIONS[p.suffix.lower()]]
+                store.bulk_load(path=str(p), format=pyoxigraph.RdfFormat.from_extension(ext))
+            store.flush()
+            manifest_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+            log(
+                f"Embedded store built: {len(store)} quads from {len(sources)} file(s) "
+                f"in {time.perf_counter() - t0:.1f}s"
+            )
+        else:
+            log(f"Embedded store reused: {root.resolve()} ({len(store)} quads)")
+    elif rdflib is not None:
+        store = rdflib.Dataset(default_union=True)
+        for p in sources:
+            store.parse(str(p), format=_RDF_EXTENSIONS[p.suffix.lower()])
+        log(f"Embedded store (rdflib, in-memory): {len(store)} quads from {len(sources)} file(s)")
+    else:
+        raise RuntimeError(
+            "Embedded backend needs pyoxigraph (`pip install pyoxigraph`) or rdflib (`pip install rdflib`)."
+        )
+
+    _EMBEDDED_STORES[store_dir] = store
+    return store
+
+
+def _lexical(term: Any) -> str:
+    # rdflib terms are str subclasses, pyoxigraph terms expose .value
+    return str(term) if isinstance(term, str) else term.value
+
+
+def _term_json(term: Any) -> Dict[str, str]:
+    kind = type(term).__name__
+    if kind in ("NamedNode", "URIRef"):
+        return {"type": "uri", "value": _lexical(term)}
+    if kind in ("BlankNode", "BNode"):
+        return {"type": "bnode", "value": _lexical(term)}
+    out = {"type": "literal", "value": _lexical(term)}
+    lang = getattr(term, "language", None)
+    datatype = getattr(term, "datatype", None)
+    if lang:
+        out["xml:lang"] = str(lang)
+    elif datatype is not None and _lexical(datatype) != _XSD_STRING:
+        out["datatype"] = _lexical(datatype)
+    return out
+
+
+def query_embedded(endpoint: str, sparql: str, stats: Dict[str, Any]) -> dict:
+    """Evaluate `sparql` on a registered embedded store and return SPARQL JSON results."""
+    store = _EMBEDDED_STORES.get(endpoint[len(EMBEDDED_PREFIX):])
+    if store is None:
+        raise RuntimeError(f"Embedded store not opened: {endpoint}")
+    t0 = time.perf_counter()
+    if pyoxigraph is not None and isinstance(store, pyoxigraph.Store):
+        res = store.query(sparql, use_default_graph_as_union=True)
+        if isinstance(res, bool) or type(res).__name__ == "QueryBoolean":
+            data = {"head": {}, "boolean": bool(res)}
+        else:
+            names = [v.value for v in res.variables]
+            bindings = []
+            for sol in res:
+                bindings.append({n: _term_json(sol[n]) for n in names if sol[n] is not None})
+            data = {"head": {"vars": names}, "results": {"bindings": bindings}}
+    else:
+        res = store.query(sparql)
+        if res.type == "ASK":
+            data = {"head": {}, "boolean": bool(res.askAnswer)}
+        else:
+            names = [str(v) for v in res.vars]
+            bindings = []
+            for sol in res:
+                bindings.append({n: _term_json(sol[n]) for n in names if sol[n] is not None})
+            data = {"head": {"vars": names}, "results": {"bindings": bindings}}
+    stats["server_s"] = time.perf_counter() - t0
+    stats["network_s"] = 0.0
+    stats["response_bytes"] = 0
+    return data
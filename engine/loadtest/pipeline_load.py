@@ -0,0 +1,493 @@
+#!/usr/bin/env python
+# pipeline_load.py
+#
+# End-to-end load generator for the PCAP -> ingest -> graph pipeline.
+#
+#  1. Synthetic captures are generated up front (synth_capture.py), so the
+#     measurement does not include producing them.
+#  2. An embedded SPARQL stub (sparql_stub.py) stands in for GraphDB: the API
+#     and the worker must run with GRAPHDB_BASE pointing at it, against a
+#     local Redis.
+#  3. Captures are submitted open-loop at --rate per second (at most
+#     --concurrency in flight): POST /pcap/pcap-http-requests (polling
+#     /pcap/jobs/:jobId when the conversion is queued), then the requests are
+#     posted to /http-requests/ingest-http in batches, as the dashboard does.
+#  4. A capture is done when every ex:id it ingested has reached the stub.
+#     Run the API with PCAP_ID_MODE=content: in "run" mode ids are
+#     pcap-<proto>-<process start ms>-<frame> and repeat across captures, so
+#     arrivals are counted per id occurrence (see ArrivalTracker).
+#
+# Per-capture stages (milliseconds):
+#   scheduleLag  scheduled start -> actual start (client saturated)
+#   convert      upload start -> HttpRequest[] received
+#   ingestAck    first ingest POST -> last 202
+#   graphWrite   last 202 -> last of its requests written to the stub
+#   endToEnd     scheduled start -> last request written (no coordinated omission)
+#
+# The report (stdout, or --report FILE) holds p50 / p90 / p99 / max per stage,
+# captures / requests / triples per second and, with --redis, the peak depth
+# of the BullMQ queues (needs the optional `redis` package).
+#
+# Example:
+#   export GRAPHDB_BASE=http://127.0.0.1:7299 PCAP_ID_MODE=content
+#   node src/server.js & node src/worker.js &
+#   python pipeline_load.py --api http://localhost:8081 --captures 200 --rate 5 \
+#       --concurrency 8 --streams 20 --http2-ratio 0.5 --redis
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from synth_capture import add_spec_arguments, spec_from_args, synthesize
+from sparql_stub import SparqlStub
+
+STAGES = ("scheduleLag", "convert", "ingestAck", "graphWrite", "endToEnd")
+
+# Same cap as the dashboard (makeBatchPayloads); express.json accepts 15mb.
+DEFAULT_INGEST_BATCH_BYTES = 10 * 1024 * 1024
+
+QUEUE_ENV_NAMES = {
+    "QUEUE_NAME_PCAP_CONVERT": "pcap-convert",
+    "QUEUE_NAME_HTTP_REQUESTS_WRITES": "http-requests-writes",
+}
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def stage_summary(values):
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 1),
+        "p50": round(percentile(values, 50), 1),
+        "p90": round(percentile(values, 90), 1),
+        "p99": round(percentile(values, 99), 1),
+        "max": round(values[-1], 1),
+    }
+
+
+# ---------------------------------------------------------------------------
+# API client
+# ---------------------------------------------------------------------------
+
+
+def http_call(method, url, body=None, headers=None, timeout=300):
+    """Returns (status, parsed JSON or None); HTTP errors are returned, not raised."""
+    req = urllib.request.Request(url, data=body, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as res:
+            status, raw = res.status, res.read()
+    except urllib.error.HTTPError as e:
+        status, raw = e.code, e.read()
+    try:
+        return status, json.loads(raw) if raw else None
+    except ValueError:
+        return status, None
+
+
+def multipart_body(parts):
+    """parts: [(field, filename, bytes)] in order -> (body, content type)."""
+    boundary = f"----pipeline-load-{uuid.uuid4().hex}"
+    chunks = []
+    for field, filename, data in parts:
+        chunks.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n".encode()
+        )
+        chunks.append(data)
+        chunks.append(b"\r\n")
+    chunks.append(f"--{boundary}--\r\n".encode())
+    return b"".join(chunks), f"multipart/form-data; boundary={boundary}"
+
+
+def convert_capture(api, pcap_path, keylog_path, poll_interval, timeout):
+    """Upload a capture and return its HttpRequest[] (following a queued job to its result)."""
+    with open(keylog_path, "rb") as f:
+        keylog = f.read()
+    with open(pcap_path, "rb") as f:
+        pcap = f.read()
+    # sslkeys first: lets the inline path stream the capture into tshark
+    body, ctype = multipart_body([("sslkeys", "sslkeys.log", keylog), ("pcap", os.path.basename(pcap_path), pcap)])
+    status, data = http_call(
+        "POST", f"{api}/pcap/pcap-http-requests", body, {"Content-Type": ctype}, timeout=timeout
+    )
+    if status == 200:
+        return data
+    if status != 202 or not data or not data.get("jobId"):
+        raise RuntimeError(f"upload failed with HTTP {status}: {data}")
+
+    job_id = data["jobId"]
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status, data = http_call("GET", f"{api}/pcap/jobs/{job_id}/result", timeout=timeout)
+        if status == 200:
+            return data
+        if status != 409:
+            raise RuntimeError(f"job {job_id}: result HTTP {status}: {data}")
+        if (data or {}).get("status") == "failed":
+            raise RuntimeError(f"job {job_id} failed: {data.get('detail')}")
+        time.sleep(poll_interval)
+    raise RuntimeError(f"job {job_id} did not complete within {timeout}s")
+
+
+def ingest_item(req, graph):
+    """Converter HttpRequest -> /http-requests/ingest-http item (dashboard mapping)."""
+    item = {"id": req["id"], "method": req["method"], "uri": req["uri"], "graph": graph}
+    for key in ("httpVersion", "requestHeaders", "connection"):
+        if req.get(key):
+            item[key] = req[key]
+    resp = req.get("response") or {}
+    if resp:
+        out = {
+            "httpVersion": resp.get("httpVersion"),
+            "status": resp.get("statusCode"),
+            "reason": resp.get("reasonPhrase"),
+            "headers": resp.get("responseHeaders"),
+            "bodyBase64": resp.get("body"),
+            "contentEncoding": resp.get("contentEncoding"),
+        }
+        item["response"] = {k: v for k, v in out.items() if v not in (None, "", [])}
+    return item
+
+
+def ingest_batches(items, max_bytes):
+    """Split items into JSON bodies below max_bytes (an oversized single item gets its own batch)."""
+    batch, size = [], 0
+    for item in items:
+        encoded = json.dumps(item, separators=(",", ":")).encode()
+        if batch and size + len(encoded) + 1 > max_bytes:
+            yield batch
+            batch, size = [], 0
+        batch.append(encoded)
+        size += len(encoded) + 1
+    if batch:
+        yield batch
+
+
+def post_ingest(api, encoded_items, timeout):
+    body = b'{"items":[' + b",".join(encoded_items) + b"]}"
+    status, data = http_call(
+        "POST", f"{api}/http-requests/ingest-http", body, {"Content-Type": "application/json"}, timeout=timeout
+    )
+    if status != 202:
+        raise RuntimeError(f"ingest failed with HTTP {status}: {data}")
+    return (data or {}).get("resRequest", {}).get("jobId")
+
+
+# ---------------------------------------------------------------------------
+# Graph arrival tracking
+# ---------------------------------------------------------------------------
+
+
+class ArrivalTracker:
+    """
+    Maps ex:id literals seen by the stub back to the capture that ingested them.
+
+    The same id may be expected by several captures (ids are not content
+    derived unless the API runs with PCAP_ID_MODE=content): each expectation is
+    queued and every arrival satisfies the oldest one, so a collision delays
+    attribution by one capture instead of leaving a capture waiting forever.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.owners = {}  # request id -> deque of capture indexes still expecting it
+        self.pending = {}  # capture index -> outstanding ids
+        self.last_seen = {}  # capture index -> wall time of the last arrival
+        self.done = {}  # capture index -> threading.Event
+        self.unknown = 0
+        self.shared = 0  # ids expected while another capture still waited for them
+
+    def expect(self, index, ids):
+        with self.lock:
+            self.done[index] = threading.Event()
+            self.pending[index] = len(ids)
+            for rid in ids:
+                owners = self.owners.setdefault(rid, deque())
+                if owners:
+                    self.shared += 1
+                owners.append(index)
+            if not ids:
+                self.done[index].set()
+
+    def on_update(self, event):
+        with self.lock:
+            for rid in event.ids:
+                owners = self.owners.get(rid)
+                if not owners:
+                    self.unknown += 1
+                    continue
+                index = owners.popleft()
+                if not owners:
+                    del self.owners[rid]
+                self.last_seen[index] = event.t
+                self.pending[index] -= 1
+                if self.pending[index] == 0:
+                    self.done[index].set()
+
+    def wait(self, index, timeout):
+        if not self.done[index].wait(timeout):
+            with self.lock:
+                missing = self.pending[index]
+            raise RuntimeError(f"{missing} request(s) not written to the graph within {timeout}s")
+        return self.last_seen.get(index)
+
+
+# ---------------------------------------------------------------------------
+# Queue depth sampling (optional)
+# ---------------------------------------------------------------------------
+
+
+class QueueSampler(threading.Thread):
+    """Samples BullMQ backlog (wait + prioritized + delayed) and active jobs once per interval."""
+
+    def __init__(self, host, port, queues, interval=1.0):
+        super().__init__(name="queue-sampler", daemon=True)
+        import redis  # optional dependency, only needed with --redis
+
+        self.client = redis.Redis(host=host, port=port)
+        self.queues = queues
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.peak = {q: {"backlog": 0, "active": 0} for q in queues}
+        self.samples = 0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                pipe = self.client.pipeline(transaction=False)
+                for q in self.queues:
+                    pipe.llen(f"bull:{q}:wait")
+                    pipe.zcard(f"bull:{q}:prioritized")
+                    pipe.zcard(f"bull:{q}:delayed")
+                    pipe.llen(f"bull:{q}:active")
+                values = pipe.execute()
+            except Exception as e:
+                print(f"[ERROR] Redis sampling failed: {e}", file=sys.stderr)
+                return
+            for i, q in enumerate(self.queues):
+                wait, prioritized, delayed, active = values[4 * i : 4 * i + 4]
+                peak = self.peak[q]
+                peak["backlog"] = max(peak["backlog"], wait + prioritized + delayed)
+                peak["active"] = max(peak["active"], active)
+            self.samples += 1
+            self.stop_event.wait(self.interval)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+        return {"samples": self.samples, "peak": self.peak}
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+
+def run_capture(index, pcap_path, keylog_path, scheduled, args, tracker):
+    """One capture through the whole pipeline; returns its record (stage times in ms)."""
+    t_start = time.time()
+    record = {"capture": os.path.basename(pcap_path), "scheduleLag": (t_start - scheduled) * 1000}
+    try:
+        requests = convert_capture(args.api, pcap_path, keylog_path, args.poll_interval, args.timeout)
+        t_converted = time.time()
+        record["convert"] = (t_converted - t_start) * 1000
+        record["requests"] = len(requests)
+
+        items = [ingest_item(r, args.graph) for r in requests]
+        if tracker is not None:
+            tracker.expect(index, [it["id"] for it in items])
+        jobs = [post_ingest(args.api, batch, args.timeout) for batch in ingest_batches(items, args.ingest_batch_bytes)]
+        t_acked = time.time()
+        record["ingestAck"] = (t_acked - t_converted) * 1000
+        record["ingestJobs"] = len(jobs)
+
+        if tracker is not None:
+            t_written = tracker.wait(index, args.timeout) or t_acked
+            record["graphWrite"] = max(0.0, t_written - t_acked) * 1000
+            record["endToEnd"] = (t_written - scheduled) * 1000
+        else:
+            record["endToEnd"] = (t_acked - scheduled) * 1000
+    except Exception as e:
+        record["error"] = str(e)
+        print(f"[ERROR] {record['capture']}: {e}", file=sys.stderr)
+    return record
+
+
+def build_report(records, wall_s, spec, args, stub, tracker, queues):
+    ok = [r for r in records if "error" not in r]
+    total_requests = sum(r.get("requests", 0) for r in ok)
+    report = {
+        "config": {
+            "api": args.api,
+            "captures": args.captures,
+            "rate": args.rate,
+            "concurrency": args.concurrency,
+            "ingestBatchBytes": args.ingest_batch_bytes,
+            "stub": None
+            if stub is None
+            else {"url": stub.url, "latencyMs": args.stub_latency_ms, "msPer1kTriples": args.stub_ms_per_1k_triples},
+            "traffic": spec.as_dict(),
+        },
+        "totals": {
+            "captures": len(records),
+            "completed": len(ok),
+            "failed": len(records) - len(ok),
+            "requests": total_requests,
+            "wallSeconds": round(wall_s, 3),
+        },
+        "throughput": {
+            "capturesPerSec": round(len(ok) / wall_s, 3) if wall_s else None,
+            "requestsPerSec": round(total_requests / wall_s, 1) if wall_s else None,
+        },
+        "stagesMs": {stage: stage_summary([r[stage] for r in ok if stage in r]) for stage in STAGES},
+    }
+    if stub is not None:
+        store = stub.snapshot()
+        store["unknownIds"] = tracker.unknown
+        store["sharedIds"] = tracker.shared
+        report["graph"] = store
+        report["throughput"]["triplesPerSec"] = round(store["triples"] / wall_s, 1) if wall_s else None
+    if queues is not None:
+        report["queues"] = queues
+    errors = [{"capture": r["capture"], "error": r["error"]} for r in records if "error" in r]
+    if errors:
+        report["errors"] = errors[:50]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Drive synthetic captures through PCAP conversion, ingest and the graph write path."
+    )
+    parser.add_argument("--api", default=os.getenv("LOADTEST_API", "http://localhost:8081"), help="API base URL")
+    parser.add_argument("--captures", type=int, default=20, help="captures to submit (default 20)")
+    parser.add_argument("--rate", type=float, default=1.0, help="capture arrivals per second, 0 = back to back")
+    parser.add_argument("--concurrency", type=int, default=4, help="captures in flight at most (default 4)")
+    parser.add_argument(
+        "--ingest-batch-bytes",
+        type=int,
+        default=DEFAULT_INGEST_BATCH_BYTES,
+        help="max JSON size of one ingest-http call (default 10 MiB)",
+    )
+    parser.add_argument(
+        "--graph",
+        default=os.getenv("HTTP_REQUESTS_NAME_GRAPH", "http://localhost/graphs/http-requests"),
+        help="named graph of the ingested requests",
+    )
+    parser.add_argument("--timeout", type=float, default=600.0, help="per-stage timeout in seconds")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="seconds between job result polls")
+    parser.add_argument("--work-dir", help="where captures are written (default: a temporary directory)")
+    parser.add_argument("--report", help="write the JSON report here instead of stdout")
+
+    stub_group = parser.add_argument_group("SPARQL stub")
+    stub_group.add_argument("--stub-host", default="127.0.0.1")
+    stub_group.add_argument("--stub-port", type=int, default=7299)
+    stub_group.add_argument("--stub-latency-ms", type=float, default=0.0, help="simulated latency per update")
+    stub_group.add_argument("--stub-ms-per-1k-triples", type=float, default=0.0, help="simulated cost per 1000 triples")
+    stub_group.add_argument(
+        "--no-stub",
+        action="store_true",
+        help="do not start the stub (real GraphDB): the graphWrite stage is not measured",
+    )
+
+    redis_group = parser.add_argument_group("queue sampling")
+    redis_group.add_argument("--redis", action="store_true", help="sample BullMQ queue depths (needs `redis`)")
+    redis_group.add_argument("--redis-host", default=os.getenv("REDIS_HOST", "127.0.0.1"))
+    redis_group.add_argument("--redis-port", type=int, default=int(os.getenv("REDIS_PORT", "6379")))
+
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+    spec = spec_from_args(parser, args)
+    if args.captures < 1 or args.concurrency < 1 or args.rate < 0:
+        parser.error("--captures and --concurrency must be >= 1, --rate >= 0")
+    args.api = args.api.rstrip("/")
+
+    tmp = None
+    if not args.work_dir:
+        tmp = tempfile.TemporaryDirectory(prefix="pipeline-load-")
+        args.work_dir = tmp.name
+
+    t0 = time.perf_counter()
+    keylog_path, captures = synthesize(args.work_dir, spec, args.captures)
+    print(
+        f"[DEBUG] Synthesized {len(captures)} capture(s), "
+        f"{sum(s['requests'] for _, s in captures)} requests, "
+        f"{sum(s['bytes'] for _, s in captures)} bytes in {time.perf_counter() - t0:.3f}s",
+        file=sys.stderr,
+    )
+
+    stub = tracker = sampler = None
+    if not args.no_stub:
+        tracker = ArrivalTracker()
+        stub = SparqlStub(
+            args.stub_host, args.stub_port, args.stub_latency_ms, args.stub_ms_per_1k_triples, tracker.on_update
+        ).start()
+        print(f"[DEBUG] SPARQL stub on {stub.url}: run the API and worker with GRAPHDB_BASE={stub.url}", file=sys.stderr)
+    if args.redis:
+        queues = [os.getenv(env, default) for env, default in QUEUE_ENV_NAMES.items()]
+        try:
+            sampler = QueueSampler(args.redis_host, args.redis_port, queues)
+            sampler.start()
+        except ImportError:
+            print("[ERROR] --redis needs the `redis` package (pip install redis); not sampling", file=sys.stderr)
+
+    interval = 1.0 / args.rate if args.rate else 0.0
+    t_begin = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = []
+            for index, (pcap_path, _) in enumerate(captures):
+                # open loop: arrivals follow the schedule even when the pipeline falls behind
+                scheduled = t_begin + index * interval
+                delay = scheduled - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(
+                    pool.submit(run_capture, index, pcap_path, keylog_path, scheduled, args, tracker)
+                )
+            records = [f.result() for f in futures]
+        wall_s = time.time() - t_begin
+    finally:
+        queue_stats = sampler.stop() if sampler is not None else None
+        if stub is not None:
+            stub.stop()
+        if tmp is not None:
+            tmp.cleanup()
+
+    report = build_report(records, wall_s, spec, args, stub, tracker, queue_stats)
+    if tracker is not None and tracker.shared:
+        print(
+            f"[WARN] {tracker.shared} request id(s) repeated across captures: run the API and worker with "
+            "PCAP_ID_MODE=content, graphWrite may be attributed to the wrong capture",
+            file=sys.stderr,
+        )
+    out = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+        print(f"[DEBUG] Report written to {args.report}", file=sys.stderr)
+    else:
+        print(out)
+    return 0 if not report["totals"]["failed"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
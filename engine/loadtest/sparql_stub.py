@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# sparql_stub.py
+#
+# Stand-in for GraphDB while load-testing the pipeline: speaks just enough of
+# the RDF4J REST protocol used by utils/graphdb/client.js.
+#
+#  - POST /repositories/<repo>/statements (SPARQL UPDATE): recorded, answered
+#    204 after an optional simulated store latency (fixed + per 1000 triples);
+#  - POST|GET /repositories/<repo> (SELECT / ASK): ASK -> true, SELECT -> no
+#    bindings, so health probes and reads succeed without data.
+#
+# Every update is reported with its arrival time, size, number of triples and
+# the ex:id literals it inserts, which is how pipeline_load.py knows when a
+# request has reached the "triple store".
+#
+# Standalone use (point GRAPHDB_BASE of the API and the worker at it):
+#   python sparql_stub.py --port 7299 --latency-ms 20 --ms-per-1k-triples 5
+
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ID_LITERAL_RE = re.compile(rb'#id> "((?:[^"\\]|\\.)*)"')
+TRIPLE_END_RE = re.compile(rb"\s\.\s*$", re.MULTILINE)
+
+
+class UpdateEvent:
+    __slots__ = ("t", "bytes", "triples", "ids")
+
+    def __init__(self, t, size, triples, ids):
+        self.t = t
+        self.bytes = size
+        self.triples = triples
+        self.ids = ids
+
+
+class SparqlStub:
+    """Threaded stub server; `on_update(event)` is called for every SPARQL UPDATE."""
+
+    def __init__(self, host="127.0.0.1", port=7299, latency_ms=0.0, ms_per_1k_triples=0.0, on_update=None):
+        self.latency_ms = latency_ms
+        self.ms_per_1k_triples = ms_per_1k_triples
+        self.on_update = on_update
+        self.lock = threading.Lock()
+        self.totals = {"updates": 0, "queries": 0, "triples": 0, "bytes": 0}
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):
+                pass
+
+            def _reply(self, code, body=b"", ctype="application/json"):
+                self.send_response(code)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_body(self):
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            def do_POST(self):
+                path = urlparse(self.path).path.rstrip("/")
+                body = self._read_body()
+                if path.startswith("/repositories/") and path.endswith("/statements"):
+                    stub._update(body)
+                    return self._reply(204)
+                if path.startswith("/repositories/"):
+                    query = parse_qs(body.decode("utf-8", errors="replace")).get("query", [""])[0]
+                    return self._reply(200, stub._query(query), "application/sparql-results+json")
+                self._reply(404, b'{"message":"not found"}')
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path.startswith("/repositories/"):
+                    query = parse_qs(url.query).get("query", [""])[0]
+                    return self._reply(200, stub._query(query), "application/sparql-results+json")
+                self._reply(404, b'{"message":"not found"}')
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _update(self, body):
+        triples = len(TRIPLE_END_RE.findall(body))
+        delay = self.latency_ms + self.ms_per_1k_triples * triples / 1000
+        if delay > 0:
+            time.sleep(delay / 1000)
+        event = UpdateEvent(
+            time.time(),
+            len(body),
+            triples,
+            [m.decode("utf-8", errors="replace") for m in ID_LITERAL_RE.findall(body)],
+        )
+        with self.lock:
+            self.totals["updates"] += 1
+            self.totals["triples"] += triples
+            self.totals["bytes"] += len(body)
+        if self.on_update is not None:
+            self.on_update(event)
+
+    def _query(self, query):
+        with self.lock:
+            self.totals["queries"] += 1
+        if re.search(r"\bASK\b", query, re.IGNORECASE):
+            return b'{"head":{},"boolean":true}'
+        return b'{"head":{"vars":[]},"results":{"bindings":[]}}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="sparql-stub", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub SPARQL endpoint (GraphDB stand-in) for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7299)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fixed latency per update")
+    parser.add_argument("--ms-per-1k-triples", type=float, default=0.0, help="extra latency per 1000 triples")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between stats lines")
+    args = parser.parse_args()
+
+    stub = SparqlStub(args.host, args.port, args.latency_ms, args.ms_per_1k_triples).start()
+    print(f"[DEBUG] SPARQL stub on {stub.url} (GRAPHDB_BASE={stub.url})", file=sys.stderr)
+    prev, t_prev = stub.snapshot(), time.monotonic()
+    try:
+        while True:
+            time.sleep(args.interval)
+            cur, now = stub.snapshot(), time.monotonic()
+            rate = (cur["triples"] - prev["triples"]) / (now - t_prev)
+            print(json.dumps({**cur, "triplesPerSec": round(rate, 1)}), flush=True)
+            prev, t_prev = cur, now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
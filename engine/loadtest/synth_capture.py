@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# synth_capture.py
+#
+# Deterministic synthetic captures for load-testing the PCAP pipeline.
+#
+# A capture is a classic pcap (Ethernet / IPv4 / TCP) with complete TCP
+# connections (handshake, data segmented at the MSS, FIN), each carrying
+# several request / response exchanges:
+#  - HTTP/1.1 keep-alive on port 80;
+#  - HTTP/2 with prior knowledge (h2c) on port H2C_PORT: connection preface,
+#    SETTINGS, then one stream per request; headers are HPACK literals without
+#    indexing or Huffman coding, response bodies are split in DATA frames.
+#
+# Traffic is plaintext (tshark dissects it without secrets); the companion
+# keylog file is written empty so the converter's arguments stay the same as
+# for a real upload. Same seed and index -> byte-identical capture.
+#
+# Standalone use:
+#   python synth_capture.py OUT_DIR --captures 10 --streams 20 --http2-ratio 0.3
+
+import os
+import sys
+import json
+import random
+import struct
+import argparse
+
+H1_PORT = 80
+# Not a port tshark maps to HTTP: the HTTP/2 heuristic dissector picks the
+# stream up from the connection preface.
+H2C_PORT = 18080
+MSS = 1460
+H2_MAX_FRAME = 16384
+
+H2_PREFACE = b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n"
+H2_DATA, H2_HEADERS, H2_SETTINGS = 0x0, 0x1, 0x4
+H2_END_STREAM, H2_END_HEADERS, H2_ACK = 0x1, 0x4, 0x1
+
+TCP_FIN, TCP_SYN, TCP_PSH, TCP_ACK = 0x01, 0x02, 0x08, 0x10
+
+WORDS = ("alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet")
+
+
+class CaptureSpec:
+    """Shape of the synthesized traffic (all captures of a run share it)."""
+
+    def __init__(
+        self,
+        streams=10,
+        requests_per_stream=5,
+        http2_ratio=0.25,
+        body_min=256,
+        body_max=4096,
+        hosts=4,
+        seed="ontowebpt",
+    ):
+        self.streams = streams
+        self.requests_per_stream = requests_per_stream
+        self.http2_ratio = http2_ratio
+        self.body_min = body_min
+        self.body_max = body_max
+        self.hosts = hosts
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def _checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    s = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    s = (s >> 16) + (s & 0xFFFF)
+    s += s >> 16
+    return ~s & 0xFFFF
+
+
+class PcapWriter:
+    """Minimal classic-pcap writer (LINKTYPE_ETHERNET, microsecond timestamps)."""
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.ts = 1_700_000_000.0
+        self.packets = 0
+        fh.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+
+    def tcp(self, src, dst, sport, dport, seq, ack, flags, payload=b""):
+        tcp_hdr = struct.pack("!HHIIBBHHH", sport, dport, seq, ack, 5 << 4, flags, 65535, 0, 0)
+        pseudo = struct.pack("!4s4sBBH", src, dst, 0, 6, len(tcp_hdr) + len(payload))
+        csum = _checksum(pseudo + tcp_hdr + payload)
+        tcp_hdr = tcp_hdr[:16] + struct.pack("!H", csum) + tcp_hdr[18:]
+
+        total = 20 + len(tcp_hdr) + len(payload)
+        ip_hdr = struct.pack("!BBHHHBBH4s4s", 0x45, 0, total, self.packets & 0xFFFF, 0x4000, 64, 6, 0, src, dst)
+        ip_hdr = ip_hdr[:10] + struct.pack("!H", _checksum(ip_hdr)) + ip_hdr[12:]
+
+        eth = b"\x02\x00\x00\x00\x00\x02\x02\x00\x00\x00\x00\x01\x08\x00"
+        frame = eth + ip_hdr + tcp_hdr + payload
+
+        self.ts += 0.0001
+        sec = int(self.ts)
+        self.fh.write(struct.pack("<IIII", sec, int((self.ts - sec) * 1e6), len(frame), len(frame)))
+        self.fh.write(frame)
+        self.packets += 1
+
+
+class TcpConnection:
+    """One TCP connection written to a PcapWriter; send() segments at the MSS."""
+
+    def __init__(self, pcap, client_ip, server_ip, client_port, server_port, isn_rng):
+        self.pcap = pcap
+        self.ends = {
+            "c": [client_ip, client_port, isn_rng.getrandbits(32)],
+            "s": [server_ip, server_port, isn_rng.getrandbits(32)],
+        }
+        c, s = self.ends["c"], self.ends["s"]
+        pcap.tcp(c[0], s[0], c[1], s[1], c[2], 0, TCP_SYN)
+        c[2] = (c[2] + 1) & 0xFFFFFFFF
+        pcap.tcp(s[0], c[0], s[1], c[1], s[2], c[2], TCP_SYN | TCP_ACK)
+        s[2] = (s[2] + 1) & 0xFFFFFFFF
+        pcap.tcp(c[0], s[0], c[1], s[1], c[2], s[2], TCP_ACK)
+
+    def send(self, side, data):
+        me = self.ends[side]
+        peer = self.ends["s" if side == "c" else "c"]
+        for off in range(0, len(data), MSS):
+            chunk = data[off:off + MSS]
+            self.pcap.tcp(me[0], peer[0], me[1], peer[1], me[2], peer[2], TCP_PSH | TCP_ACK, chunk)
+            me[2] = (me[2] + len(chunk)) & 0xFFFFFFFF
+
+    def close(self):
+        c, s = self.ends["c"], self.ends["s"]
+        self.pcap.tcp(c[0], s[0], c[1], s[1], c[2], s[2], TCP_FIN | TCP_ACK)
+        c[2] = (c[2] + 1) & 0xFFFFFFFF
+        self.pcap.tcp(s[0], c[0], s[1], c[1], s[2], c[2], TCP_FIN | TCP_ACK)
+        s[2] = (s[2] + 1) & 0xFFFFFFFF
+        self.pcap.tcp(c[0], s[0], c[1], s[1], c[2], s[2], TCP_ACK)
+
+
+def _hpack_int(value, prefix_bits, first_byte=0):
+    limit = (1 << prefix_bits) - 1
+    if value < limit:
+        return bytes([first_byte | value])
+    out = [first_byte | limit]
+    value -= limit
+    while value >= 128:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def hpack_literal_block(headers):
+    """HPACK header block: literal without indexing, new name, no Huffman (RFC 7541 6.2.2)."""
+    out = bytearray()
+    for name, value in headers:
+        name, value = name.encode("utf-8"), value.encode("utf-8")
+        out += b"\x00" + _hpack_int(len(name), 7) + name + _hpack_int(len(value), 7) + value
+    return bytes(out)
+
+
+def h2_frame(ftype, flags, stream_id, payload=b""):
+    return struct.pack("!I", len(payload))[1:] + struct.pack("!BBI", ftype, flags, stream_id) + payload
+
+
+def _body(rng, spec):
+    """Pseudo-random JSON body of about a size drawn from [body_min, body_max]."""
+    size = rng.randint(spec.body_min, spec.body_max)
+    items, length = [], 2
+    while length < size:
+        word = f"{rng.choice(WORDS)}-{rng.randrange(100000)}"
+        items.append(word)
+        length += len(word) + 3
+    return json.dumps({"items": items}).encode("ascii")
+
+
+def _exchange(rng, spec, host_idx, n):
+    """(method, path, request_body, status, response_body) of one synthetic exchange."""
+    kind = rng.random()
+    if kind < 0.6:
+        return "GET", f"/api/v1/items/{rng.randrange(10**6)}?page={n}&q={rng.choice(WORDS)}", b"", 200, _body(rng, spec)
+    if kind < 0.85:
+        payload = json.dumps({"name": rng.choice(WORDS), "n": n}).encode("ascii")
+        return "POST", f"/api/v1/items?src=h{host_idx}", payload, 201, _body(rng, spec)
+    return "GET", f"/static/{rng.choice(WORDS)}/{n}.js", b"", rng.choice((304, 404, 500)), b""
+
+
+def _http1_connection(conn, rng, spec, host, host_idx):
+    for n in range(spec.requests_per_stream):
+        method, path, req_body, status, resp_body = _exchange(rng, spec, host_idx, n)
+        head = [f"{method} {path} HTTP/1.1", f"Host: {host}", "User-Agent: ontowebpt-loadtest/1.0",
+                f"Cookie: sid=s{host_idx}-{rng.randrange(10**9)}"]
+        if req_body:
+            head += ["Content-Type: application/json", f"Content-Length: {len(req_body)}"]
+        conn.send("c", ("\r\n".join(head) + "\r\n\r\n").encode("ascii") + req_body)
+
+        reason = {200: "OK", 201: "Created", 304: "Not Modified", 404: "Not Found", 500: "Internal Server Error"}[status]
+        head = [f"HTTP/1.1 {status} {reason}", "Server: loadtest", f"Content-Length: {len(resp_body)}"]
+        if resp_body:
+            head.append("Content-Type: application/json")
+        if n == 0:
+            head.append(f"Set-Cookie: sid=s{host_idx}; Path=/; HttpOnly")
+        conn.send("s", ("\r\n".join(head) + "\r\n\r\n").encode("ascii") + resp_body)
+
+
+def _http2_connection(conn, rng, spec, host, host_idx):
+    conn.send("c", H2_PREFACE + h2_frame(H2_SETTINGS, 0, 0))
+    conn.send("s", h2_frame(H2_SETTINGS, 0, 0) + h2_frame(H2_SETTINGS, H2_ACK, 0))
+    conn.send("c", h2_frame(H2_SETTINGS, H2_ACK, 0))
+
+    for n in range(spec.requests_per_stream):
+        sid = 2 * n + 1
+        method, path, req_body, status, resp_body = _exchange(rng, spec, host_idx, n)
+        headers = [(":method", method), (":scheme", "http"), (":authority", host), (":path", path),
+                   ("user-agent", "ontowebpt-loadtest/1.0")]
+        flags = H2_END_HEADERS | (0 if req_body else H2_END_STREAM)
+        data = h2_frame(H2_HEADERS, flags, sid, hpack_literal_block(headers))
+        if req_body:
+            data += h2_frame(H2_DATA, H2_END_STREAM, sid, req_body)
+        conn.send("c", data)
+
+        headers = [(":status", str(status)), ("server", "loadtest"), ("content-length", str(len(resp_body)))]
+        if resp_body:
+            headers.append(("content-type", "application/json"))
+        flags = H2_END_HEADERS | (0 if resp_body else H2_END_STREAM)
+        data = h2_frame(H2_HEADERS, flags, sid, hpack_literal_block(headers))
+        for off in range(0, len(resp_body), H2_MAX_FRAME):
+            last = off + H2_MAX_FRAME >= len(resp_body)
+            data += h2_frame(H2_DATA, H2_END_STREAM if last else 0, sid, resp_body[off:off + H2_MAX_FRAME])
+        conn.send("s", data)
+
+
+def write_capture(path, spec, index):
+    """
+    Write capture number `index` of a run to `path`.
+    Returns { packets, bytes, connections, http1, http2, requests }.
+    """
+    rng = random.Random(f"{spec.seed}/{index}")
+    stats = {"connections": spec.streams, "http1": 0, "http2": 0, "requests": 0}
+    server_ips = [bytes([10, 20, 0, 10 + h]) for h in range(spec.hosts)]
+
+    with open(path, "wb") as fh:
+        pcap = PcapWriter(fh)
+        for stream in range(spec.streams):
+            host_idx = rng.randrange(spec.hosts)
+            h2 = rng.random() < spec.http2_ratio
+            port = H2C_PORT if h2 else H1_PORT
+            host = f"svc{host_idx}.loadtest.local" + ("" if port == 80 else f":{port}")
+            client_ip = bytes([10, 10, (stream >> 8) & 0xFF, stream & 0xFF])
+            conn = TcpConnection(pcap, client_ip, server_ips[host_idx], 20000 + stream % 40000, port, rng)
+            if h2:
+                _http2_connection(conn, rng, spec, host, host_idx)
+            else:
+                _http1_connection(conn, rng, spec, host, host_idx)
+            conn.close()
+            stats["http2" if h2 else "http1"] += 1
+            stats["requests"] += spec.requests_per_stream
+        stats["packets"] = pcap.packets
+
+    stats["bytes"] = os.path.getsize(path)
+    return stats
+
+
+def synthesize(out_dir, spec, count, first_index=0):
+    """
+    Write `count` captures (capture-00000.pcap, ...) plus an empty keylog.
+    Returns (keylog_path, [(pcap_path, stats), ...]).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    keylog_path = os.path.join(out_dir, "sslkeys.log")
+    open(keylog_path, "wb").close()
+    captures = []
+    for index in range(first_index, first_index + count):
+        path = os.path.join(out_dir, f"capture-{index:05d}.pcap")
+        captures.append((path, write_capture(path, spec, index)))
+    return keylog_path, captures
+
+
+def add_spec_arguments(parser):
+    """Traffic-shape options shared with pipeline_load.py."""
+    group = parser.add_argument_group("synthetic traffic")
+    group.add_argument("--streams", type=int, default=10, help="TCP connections per capture (default 10)")
+    group.add_argument("--requests-per-stream", type=int, default=5, help="exchanges per connection (default 5)")
+    group.add_argument("--http2-ratio", type=float, default=0.25, help="fraction of h2c connections (default 0.25)")
+    group.add_argument("--body-min", type=int, default=256, help="min response body bytes (default 256)")
+    group.add_argument("--body-max", type=int, default=4096, help="max response body bytes (default 4096)")
+    group.add_argument("--hosts", type=int, default=4, help="distinct server hosts (default 4)")
+    group.add_argument("--seed", default="ontowebpt", help="same seed, same captures")
+
+
+def spec_from_args(parser, args):
+    if args.streams < 1 or args.requests_per_stream < 1 or args.hosts < 1:
+        parser.error("--streams, --requests-per-stream and --hosts must be >= 1")
+    if not 0 <= args.http2_ratio <= 1:
+        parser.error("--http2-ratio must be in [0, 1]")
+    if not 0 <= args.body_min <= args.body_max:
+        parser.error("need 0 <= --body-min <= --body-max")
+    return CaptureSpec(
+        args.streams, args.requests_per_stream, args.http2_ratio, args.body_min, args.body_max, args.hosts, args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write deterministic synthetic HTTP/1.1 + h2c captures.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--captures", type=int, default=1, help="number of captures (default 1)")
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+    spec = spec_from_args(parser, args)
+
+    keylog, captures = synthesize(args.out_dir, spec, args.captures)
+    for path, stats in captures:
+        print(json.dumps({"pcap": path, "sslkeys": keylog, **stats}))
+    print(f"[DEBUG] wrote {len(captures)} capture(s) to {args.out_dir}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -321,7 +321,7 @@ function pickResponseBodyBase64(res) {
  * {
  *   id?: string,
  *   request: { method: string, url: string, headers?: Array|Object, body?: any, bodyEncoding?: 'base64'|'text' },
- *   response?: { status?: number, statusText?: string, headers?: Array|Object, body?: any, bodyEncoding?: 'base64'|'text' },
+ *   response?: { status?: number, statusText?: string, headers?: Array|Object, body?: any, bodyEncoding?: 'base64'|'text', contentEncoding?: string },
  *   meta?: { pageUrl?: string, ts?: number }
  * }
  *
@@ -376,7 +376,11 @@ export function convertItemsToApiPayload(items, opts = {}) {
     }
 
     const respBodyB64 = pickResponseBodyBase64(res);
-    if (respBodyB64) response.bodyBase64 = respBodyB64;
+    if (respBodyB64) {
+      response.bodyBase64 = respBodyB64;
+      // Body kept compressed (e.g. gzip): the backend decompresses it only when needed.
+      if (res.contentEncoding) response.contentEncoding = String(res.contentEncoding).slice(0, 128);
+    }
 
     const respHeaders = toHeaderArray(res.headers);
     if (respHeaders.length) response.headers = respHeaders;
@@ -271,7 +271,8 @@ function SendPcap() {
 
   /**
    * Normalize PCAP extraction output into raw items compatible with ingestion.
-   * Converts header arrays to name:value objects and preserves base64 bodies if present.
+   * Converts header arrays to name:value objects and preserves base64 bodies if present
+   * (still compressed when the backend keeps the content-encoding, see `contentEncoding`).
    */
   const mapPcapItemsToRawItems = (items) => {
     return (Array.isArray(items) ? items : []).map((r, idx) => {
@@ -311,6 +312,7 @@ function SendPcap() {
               headers: resHeadersObj,
               body: r.response.body,
               bodyEncoding: typeof r.response.body === 'string' ? 'base64' : undefined,
+              contentEncoding: r.response.contentEncoding,
             }
           : {},
         meta: {
@@ -6,6 +6,8 @@
  *
  * Endpoint Summary:
  * - POST /pcap/pcap-http-requests: extracts HTTP requests from a PCAP.
+ * - GET  /pcap/jobs/:jobId: status of a queued conversion.
+ * - GET  /pcap/jobs/:jobId/result: output of a completed conversion.
  *
  * Notes:
  * - Caller is responsible for validating file types and sizes.
@@ -13,18 +15,55 @@
 
 import httpClient from './httpClient';
 
+/** Delay between two status checks of a queued conversion. */
+const JOB_POLL_INTERVAL_MS = 2000;
+/** Give up on a queued conversion that has not finished after this long. */
+const JOB_POLL_TIMEOUT_MS = 30 * 60 * 1000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+/**
+ * Get the status of a queued PCAP conversion.
+ * GET /pcap/jobs/:jobId
+ *
+ * @param {string} jobId - Identifier returned with a 202 response.
+ * @returns {Promise<any>} { status: 'queued' | 'running' | 'completed' | 'failed', cost, queue, ... }
+ */
+export async function getPcapJob(jobId) {
+  const res = await httpClient.get(`/pcap/jobs/${encodeURIComponent(jobId)}`);
+  return res.data;
+}
+
+/**
+ * Get the output of a completed PCAP conversion.
+ * GET /pcap/jobs/:jobId/result
+ *
+ * @param {string} jobId - Identifier returned with a 202 response.
+ * @returns {Promise<any>} Extracted HTTP requests.
+ */
+export async function getPcapJobResult(jobId) {
+  const res = await httpClient.get(`/pcap/jobs/${encodeURIComponent(jobId)}/result`);
+  return res.data;
+}
+
 /**
  * Extract HTTP requests from a PCAP file.
  * POST /pcap/pcap-http-requests
  *
  * @param {File|Blob} pcapFile    - The .pcap/.pcapng capture to process.
  * @param {File|Blob} [sslKeysFile] - NSS/Chromium SSL key log file.
+ * When the backend queues the conversion (202), polls the job until it
+ * completes and then fetches its result; fails if the job is lost (status
+ * 'unknown') or has not finished within JOB_POLL_TIMEOUT_MS.
+ *
  * @returns {Promise<any>} Parsed extraction result as returned by the backend.
  */
 export async function extractHttpRequestsFromPcap(pcapFile, sslKeysFile) {
   const formData = new FormData();
-  formData.append('pcap', pcapFile);
+  // Key log first: with inline conversions the backend can then stream the
+  // capture into the converter while it is still uploading.
   formData.append('sslkeys', sslKeysFile);
+  formData.append('pcap', pcapFile);
 
   const res = await httpClient.post('/pcap/pcap-http-requests', formData, {
     headers: {
@@ -32,5 +71,22 @@ export async function extractHttpRequestsFromPcap(pcapFile, sslKeysFile) {
     },
   });
 
-  return res.data;
+  if (res.status !== 202) return res.data;
+
+  const { jobId } = res.data;
+  const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    await sleep(JOB_POLL_INTERVAL_MS);
+    const job = await getPcapJob(jobId);
+    if (job.status === 'completed') return getPcapJobResult(jobId);
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'PCAP conversion failed.');
+    }
+    if (job.status === 'unknown') {
+      throw new Error(`PCAP conversion job ${jobId} is in an unexpected state (${job.state}).`);
+    }
+  }
+  throw new Error(
+    `PCAP conversion job ${jobId} did not finish within ${JOB_POLL_TIMEOUT_MS / 60000} minutes.`
+  );
 }
@@ -0,0 +1,76 @@
+const zlib = require('zlib');
+
+const {
+  responseContentCodings,
+  decodeContentEncoding,
+} = require('../../../src/utils/http/contentEncoding');
+const { responseBodyText } = require('../../../src/utils/resolvers/http/httpRules');
+
+const TEXT = 'Traceback (most recent call last): something broke';
+
+describe('responseContentCodings', () => {
+  test('prefers the contentEncoding marker and normalizes it', () => {
+    expect(
+      responseContentCodings({
+        contentEncoding: 'GZIP, br',
+        headers: [{ name: 'content-encoding', value: 'deflate' }],
+      })
+    ).toEqual(['gzip', 'br']);
+  });
+
+  test('falls back to the content-encoding header and ignores identity', () => {
+    expect(
+      responseContentCodings({ headers: [{ name: 'Content-Encoding', value: 'identity, gzip' }] })
+    ).toEqual(['gzip']);
+    expect(responseContentCodings({ headers: [] })).toEqual([]);
+    expect(responseContentCodings(undefined)).toEqual([]);
+  });
+});
+
+describe('decodeContentEncoding', () => {
+  test('undoes stacked codings, last applied first', () => {
+    const encoded = zlib.brotliCompressSync(zlib.gzipSync(Buffer.from(TEXT)));
+    expect(decodeContentEncoding(encoded, ['gzip', 'br']).toString('utf8')).toBe(TEXT);
+  });
+
+  test('accepts zlib-wrapped and raw deflate', () => {
+    expect(decodeContentEncoding(zlib.deflateSync(TEXT), ['deflate']).toString()).toBe(TEXT);
+    expect(decodeContentEncoding(zlib.deflateRawSync(TEXT), ['deflate']).toString()).toBe(TEXT);
+  });
+
+  test('rejects unknown codings and oversized output', () => {
+    expect(() => decodeContentEncoding(Buffer.from(TEXT), ['compress'])).toThrow(
+      'Unsupported content-encoding: compress'
+    );
+    expect(() =>
+      decodeContentEncoding(zlib.gzipSync(Buffer.alloc(100000)), ['gzip'], 1000)
+    ).toThrow();
+  });
+});
+
+describe('responseBodyText', () => {
+  test('decompresses a body kept in its wire encoding', () => {
+    const req = {
+      response: {
+        bodyBase64: zlib.gzipSync(TEXT).toString('base64'),
+        contentEncoding: 'gzip',
+      },
+    };
+    expect(responseBodyText(req)).toBe(TEXT);
+  });
+
+  test('reads an already decoded body as-is despite its content-encoding header', () => {
+    const req = {
+      response: {
+        bodyBase64: Buffer.from(TEXT).toString('base64'),
+        headers: [{ name: 'content-encoding', value: 'gzip' }],
+      },
+    };
+    expect(responseBodyText(req)).toBe(TEXT);
+  });
+
+  test('returns an empty string without a body', () => {
+    expect(responseBodyText({ response: {} })).toBe('');
+    expect(responseBodyText({})).toBe('');
+  });
+});
@@ -0,0 +1,146 @@
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+
+const {
+  scanCapture,
+  estimateConversionCost,
+  costPriority,
+  createBudgetLedger,
+} = require('../../../src/utils/pcap/admission');
+
+const MB = 1024 * 1024;
+
+/** Classic little-endian pcap with `n` records of `len` bytes each. */
+function pcapBuffer(n, len) {
+  const header = Buffer.alloc(24);
+  header.writeUInt32LE(0xa1b2c3d4, 0);
+  const records = [];
+  for (let i = 0; i < n; i++) {
+    const rec = Buffer.alloc(16 + len);
+    rec.writeUInt32LE(len, 8);
+    rec.writeUInt32LE(len, 12);
+    records.push(rec);
+  }
+  return Buffer.concat([header, ...records]);
+}
+
+/** pcapng block: type, total length, body padded to 4 bytes, trailing length. */
+function pcapngBlock(type, body) {
+  const padded = Buffer.alloc(Math.ceil(body.length / 4) * 4);
+  body.copy(padded);
+  const total = 12 + padded.length;
+  const block = Buffer.alloc(total);
+  block.writeUInt32LE(type, 0);
+  block.writeUInt32LE(total, 4);
+  padded.copy(block, 8);
+  block.writeUInt32LE(total, total - 4);
+  return block;
+}
+
+function pcapngBuffer(n) {
+  const shbBody = Buffer.alloc(16);
+  shbBody.writeUInt32LE(0x1a2b3c4d, 0);
+  shbBody.writeUInt16LE(1, 4);
+  shbBody.writeBigInt64LE(-1n, 8);
+  const blocks = [pcapngBlock(0x0a0d0d0a, shbBody), pcapngBlock(1, Buffer.alloc(8))];
+  for (let i = 0; i < n; i++) {
+    blocks.push(pcapngBlock(6, Buffer.alloc(20 + 61)));
+  }
+  return Buffer.concat(blocks);
+}
+
+describe('scanCapture', () => {
+  let dir;
+
+  beforeAll(() => {
+    dir = fs.mkdtempSync(path.join(os.tmpdir(), 'pcap-admission-'));
+  });
+
+  afterAll(() => {
+    fs.rmSync(dir, { recursive: true, force: true });
+  });
+
+  function writeTmp(name, buf) {
+    const p = path.join(dir, name);
+    fs.writeFileSync(p, buf);
+    return p;
+  }
+
+  test('counts pcap records from their headers', async () => {
+    const p = writeTmp('a.pcap', pcapBuffer(50, 100));
+    await expect(scanCapture(p)).resolves.toEqual({
+      container: 'pcap',
+      packets: 50,
+      bytes: 24 + 50 * 116,
+      exact: true,
+    });
+  });
+
+  test('counts only packet blocks in pcapng', async () => {
+    const buf = pcapngBuffer(40);
+    const p = writeTmp('a.pcapng', buf);
+    await expect(scanCapture(p)).resolves.toEqual({
+      container: 'pcapng',
+      packets: 40,
+      bytes: buf.length,
+      exact: true,
+    });
+  });
+
+  test('extrapolates the packet count for unknown containers', async () => {
+    const p = writeTmp('a.bin', Buffer.alloc(7000, 1));
+    const scan = await scanCapture(p);
+    expect(scan.container).toBeNull();
+    expect(scan.exact).toBe(false);
+    expect(scan.packets).toBe(10);
+  });
+});
+
+describe('estimateConversionCost / costPriority', () => {
+  test('cost grows with capture size and packet count', () => {
+    const small = estimateConversionCost({ captureBytes: MB, packets: 1000, keylogBytes: 1000 });
+    const bigger = estimateConversionCost({
+      captureBytes: 50 * MB,
+      packets: 1000,
+      keylogBytes: 1000,
+    });
+    const denser = estimateConversionCost({ captureBytes: MB, packets: 100000, keylogBytes: 1000 });
+
+    expect(bigger.memoryBytes).toBeGreaterThan(small.memoryBytes);
+    expect(bigger.cpuSeconds).toBeGreaterThan(small.cpuSeconds);
+    expect(denser.memoryBytes).toBeGreaterThan(small.memoryBytes);
+    expect(denser.cpuSeconds).toBeGreaterThan(small.cpuSeconds);
+  });
+
+  test('smaller jobs get a better (lower) priority', () => {
+    const small = estimateConversionCost({ captureBytes: MB, packets: 1000, keylogBytes: 0 });
+    const big = estimateConversionCost({ captureBytes: 200 * MB, packets: 300000, keylogBytes: 0 });
+
+    expect(costPriority(small)).toBeGreaterThanOrEqual(1);
+    expect(costPriority(small)).toBeLessThan(costPriority(big));
+  });
+});
+
+describe('createBudgetLedger', () => {
+  test('admits jobs while they fit the memory budget', () => {
+    const ledger = createBudgetLedger({ memoryBytes: 100, cpuSlots: 4 });
+
+    expect(ledger.tryReserve('a', 60)).toBe(true);
+    expect(ledger.tryReserve('b', 60)).toBe(false);
+    expect(ledger.tryReserve('c', 40)).toBe(true);
+    expect(ledger.snapshot()).toEqual({ reservedBytes: 100, running: 2, budgetBytes: 100 });
+
+    ledger.release('a');
+    expect(ledger.tryReserve('b', 60)).toBe(true);
+  });
+
+  test('always admits a job when nothing else is running', () => {
+    const ledger = createBudgetLedger({ memoryBytes: 100, cpuSlots: 1 });
+
+    expect(ledger.tryReserve('huge', 1000)).toBe(true);
+    expect(ledger.tryReserve('small', 1)).toBe(false);
+    ledger.release('huge');
+    expect(ledger.snapshot().reservedBytes).toBe(0);
+  });
+});
@@ -0,0 +1,83 @@
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { spawnSync } = require('child_process');
+
+const SCRIPT_PATH = path.join(__dirname, '../../../src/scripts/pcap_to_http_json.py');
+
+/**
+ * Stand-in for tshark: an empty packet list for every capture, except those
+ * whose name contains "bad", which get a record the extractor cannot read.
+ */
+const FAKE_TSHARK = `#!/bin/sh
+case "$*" in
+  *bad*) echo '[{"_source": 1}]';;
+  *"-T json"*) echo '[]';;
+esac
+`;
+
+describe('pcap_to_http_json.py --batch', () => {
+  let dir;
+
+  beforeAll(() => {
+    dir = fs.mkdtempSync(path.join(os.tmpdir(), 'pcap-batch-'));
+    fs.writeFileSync(path.join(dir, 'tshark'), FAKE_TSHARK, { mode: 0o755 });
+    for (const name of ['a.pcap', 'bad.pcap', 'c.pcap', 'keys.log']) {
+      fs.writeFileSync(path.join(dir, name), '');
+    }
+  });
+
+  afterAll(() => {
+    fs.rmSync(dir, { recursive: true, force: true });
+  });
+
+  test('reports a capture that fails extraction and still emits the others', () => {
+    const captures = ['a.pcap', 'bad.pcap', 'c.pcap'].map((name) => path.join(dir, name));
+    const args = [SCRIPT_PATH, ...captures.flatMap((p) => ['--batch', p])];
+    args.push('--keylog', path.join(dir, 'keys.log'), '--jobs', '1');
+
+    const run = spawnSync(process.env.PYTHON_BIN || 'python', args, {
+      env: { ...process.env, TSHARK_BIN: path.join(dir, 'tshark') },
+      encoding: 'utf8',
+    });
+
+    // exit code 2: the batch completed with failed captures
+    expect(run.status).toBe(2);
+    const records = run.stdout
+      .trim()
+      .split('\n')
+      .map((line) => JSON.parse(line))
+      .sort((a, b) => a.index - b.index);
+
+    expect(records.map((r) => r.index)).toEqual([0, 1, 2]);
+    expect(records[0]).toMatchObject({ pcap: captures[0], requests: [] });
+    expect(records[2]).toMatchObject({ pcap: captures[2], requests: [] });
+    expect(records[1].pcap).toBe(captures[1]);
+    expect(typeof records[1].error).toBe('string');
+    expect(records[1]).not.toHaveProperty('requests');
+    expect(records[1]).not.toHaveProperty('rdf');
+  });
+
+  test('reports an RDF write failure as an error of each capture', () => {
+    const captures = ['a.pcap', 'c.pcap'].map((name) => path.join(dir, name));
+    const args = [SCRIPT_PATH, ...captures.flatMap((p) => ['--batch', p])];
+    // a regular file where the output directory should be
+    args.push('--keylog', path.join(dir, 'keys.log'), '--rdf-out', path.join(dir, 'keys.log'));
+
+    const run = spawnSync(process.env.PYTHON_BIN || 'python', args, {
+      env: { ...process.env, TSHARK_BIN: path.join(dir, 'tshark') },
+      encoding: 'utf8',
+    });
+
+    expect(run.status).toBe(2);
+    const records = run.stdout
+      .trim()
+      .split('\n')
+      .map((line) => JSON.parse(line));
+    expect(records).toHaveLength(2);
+    for (const record of records) {
+      expect(record.error).toMatch(/^RDF not written/);
+      expect(record).not.toHaveProperty('rdf');
+    }
+  });
+});
@@ -37,6 +37,7 @@ const queueNameHttpRequestsWrites =
 const queueNameSparqlWrites = process.env.QUEUE_NAME_SPARQL_WRITES || 'sparql-writes';
 const queueNameTechstackWrites = process.env.QUEUE_NAME_TECHSTACK_WRITES || 'techstack-analyze';
 const queueNameAnalyzerWrites = process.env.QUEUE_NAME_ANALYZER_WRITES || 'analyzer-writes';
+const queueNamePcapConvert = process.env.QUEUE_NAME_PCAP_CONVERT || 'pcap-convert';
 
 /* ========================================================================
  * HTTP Requests queue
@@ -137,6 +138,31 @@ const queueAnalyzer = new Queue(queueNameAnalyzerWrites, {
   },
 });
 
+/* ========================================================================
+ * PCAP conversion queue
+ * ====================================================================== */
+
+/**
+ * Queue for PCAP → HttpRequest conversions (tshark + pcap_to_http_json.py).
+ *
+ * Jobs carry the estimated cost of the conversion and are added with a
+ * cost-derived priority (small captures first); the worker admits them
+ * against the per-host memory / CPU budget. A single attempt by default:
+ * conversion failures are deterministic.
+ */
+const queuePcap = new Queue(queueNamePcapConvert, {
+  connection,
+  defaultJobOptions: {
+    attempts: Number(process.env.JOB_PCAP_ATTEMPTS) || 1,
+    backoff: {
+      type: process.env.JOB_PCAP_BACKOFF_TYPE || 'exponential',
+      delay: Number(process.env.JOB_PCAP_BACKOFF_DELAY) || 2000,
+    },
+    removeOnComplete: Number(process.env.JOB_PCAP_REMOVE_ON_COMPLETE) || 200,
+    removeOnFail: Number(process.env.JOB_PCAP_REMOVE_ON_FAIL) || 500,
+  },
+});
+
 /* ========================================================================
  * Shared error handling for queues
  * ====================================================================== */
@@ -150,6 +176,7 @@ for (const [q, name] of [
   [queueSparql, queueNameSparqlWrites],
   [queueTechstack, queueNameTechstackWrites],
   [queueAnalyzer, queueNameAnalyzerWrites],
+  [queuePcap, queueNamePcapConvert],
 ]) {
   q.on('error', (err) => {
     if (
@@ -167,9 +194,11 @@ module.exports = {
   queueSparql,
   queueTechstack,
   queueAnalyzer,
+  queuePcap,
   connection,
   queueNameHttpRequestsWrites,
   queueNameSparqlWrites,
   queueNameTechstackWrites,
   queueNameAnalyzerWrites,
+  queueNamePcapConvert,
 };
@@ -2,32 +2,209 @@ const express = require('express');
 const router = express.Router();
 
 const multer = require('multer');
-const os = require('os');
 const path = require('path');
 const fs = require('fs');
-const { spawn } = require('child_process');
+const { QueueEvents } = require('bullmq');
+const { celebrate, Segments } = require('celebrate');
 
-const { makeLogger } = require('../utils');
+const { queuePcap, connection, queueNamePcapConvert } = require('../queue');
+const {
+  makeLogger,
+  pcap: {
+    spawnConverter,
+    pcapSpoolDir,
+    scanCapture,
+    estimateConversionCost,
+    conversionBudget,
+    costPriority,
+  },
+  validators: {
+    pcap: { pcapJobIdParamSchema },
+    celebrateOptions,
+  },
+} = require('../utils');
 
 const log = makeLogger('api:pcap');
 
+/**
+ * When enabled (default), conversions are scheduled on the "pcap-convert"
+ * BullMQ queue and run by the worker under a per-host memory / CPU budget
+ * (see worker.js). When disabled, they run inline in the API process.
+ */
+const QUEUE_ENABLED = String(process.env.PCAP_QUEUE_ENABLED ?? 'true').toLowerCase() !== 'false';
+
+/**
+ * How long POST /pcap-http-requests waits for a queued conversion before
+ * answering 202 "queued" with a job id to poll.
+ */
+const SYNC_WAIT_MS = Number(process.env.PCAP_SYNC_WAIT_MS ?? 60000);
+
+/**
+ * Inline mode only: a "pcap" part that arrives after the "sslkeys" part is
+ * piped straight into the converter's stdin instead of being written to disk,
+ * so tshark parses the capture while it is still being uploaded. Queued jobs
+ * need the capture on disk for the worker.
+ */
+const STREAM_UPLOADS =
+  !QUEUE_ENABLED && String(process.env.PCAP_STREAM_UPLOADS ?? 'true').toLowerCase() !== 'false';
+
+/** @type {QueueEvents | null} */
+let queueEvents = null;
+
+/**
+ * Lazily created listener for pcap-convert completion events.
+ * @returns {QueueEvents}
+ */
+function pcapQueueEvents() {
+  if (!queueEvents) {
+    queueEvents = new QueueEvents(queueNamePcapConvert, { connection });
+    queueEvents.on('error', (err) => log.warn('queue events error', err?.message || err));
+  }
+  return queueEvents;
+}
+
+/**
+ * Map a BullMQ job state to the status exposed by the API.
+ *
+ * @param {string} state
+ * @returns {'queued'|'running'|'completed'|'failed'|'unknown'}
+ */
+function jobStatus(state) {
+  switch (state) {
+    case 'waiting':
+    case 'prioritized':
+    case 'delayed':
+    case 'waiting-children':
+      return 'queued';
+    case 'active':
+      return 'running';
+    case 'completed':
+      return 'completed';
+    case 'failed':
+      return 'failed';
+    default:
+      return 'unknown';
+  }
+}
+
+/**
+ * Stream a completed job's result file as the JSON response body, then delete it.
+ *
+ * @param {import('express').Response} res
+ * @param {string} resultPath
+ */
+function sendResultFile(res, resultPath) {
+  res.status(200).type('application/json');
+  const stream = fs.createReadStream(resultPath);
+  stream.on('error', (err) => {
+    log.error('Failed to read conversion result', err?.message || err);
+    if (!res.headersSent) {
+      res.status(410).json({ error: 'Conversion result no longer available' });
+    } else {
+      res.destroy(err);
+    }
+  });
+  res.on('finish', () => safeUnlink(resultPath));
+  stream.pipe(res);
+}
+
+const diskStorage = multer.diskStorage({
+  destination: (req, file, cb) => {
+    // Shared with the worker (PCAP_SPOOL_DIR) so that queued jobs can read the files.
+    cb(null, pcapSpoolDir());
+  },
+  filename: (req, file, cb) => {
+    const unique = `${Date.now()}-${Math.round(Math.random() * 1e9)}`;
+    cb(null, `${unique}-${file.originalname}`);
+  },
+});
+
+/**
+ * Multer storage engine for PCAP uploads.
+ *
+ * - "sslkeys" (and any "pcap" that arrives before it) is written to the spool
+ *   directory through the disk storage above.
+ * - A "pcap" part that follows the keylog is streamed, once the keylog is on disk, into
+ *   `pcap_to_http_json.py -` (tshark "-r -"): no temp file, and the conversion
+ *   overlaps with the upload. The running conversion is kept on `req.pcapConversion`.
+ */
+const pcapStorage = {
+  _handleFile(req, file, cb) {
+    if (file.fieldname === 'sslkeys') {
+      // busboy may emit the "pcap" part before this write has finished: expose
+      // its completion so the capture can wait for the keylog instead of hitting disk.
+      req.pcapSslKeysReady = new Promise((resolve) => {
+        diskStorage._handleFile(req, file, (err, info) => {
+          if (!err) req.pcapSslKeysPath = info.path;
+          resolve(!err);
+          cb(err, info);
+        });
+      });
+      return;
+    }
+    if (file.fieldname !== 'pcap' || !STREAM_UPLOADS || !req.pcapSslKeysReady) {
+      return diskStorage._handleFile(req, file, cb);
+    }
+
+    req.pcapSslKeysReady.then((keysOk) => {
+      if (!keysOk) return diskStorage._handleFile(req, file, cb);
+      streamIntoConverter(req, file, cb);
+    });
+  },
+
+  _removeFile(req, file, cb) {
+    if (file.streamed) {
+      if (req.pcapConversion) req.pcapConversion.py.kill();
+      return cb(null);
+    }
+    diskStorage._removeFile(req, file, cb);
+  },
+};
+
+/**
+ * Pipe an uploaded "pcap" part into `pcap_to_http_json.py -`.
+ * Calls `cb` (multer storage callback) once the part has been fully consumed.
+ */
+function streamIntoConverter(req, file, cb) {
+  const conversion = spawnConverter('-', req.pcapSslKeysPath);
+  const { py } = conversion;
+  req.pcapConversion = conversion;
+
+  let size = 0;
+  let settled = false;
+  const done = (err) => {
+    if (settled) return;
+    settled = true;
+    if (err) py.kill();
+    cb(err || null, { size, streamed: true });
+  };
+
+  // The converter may exit early (e.g. unreadable capture): keep draining the
+  // upload so multer can finish, the exit code is reported by `result`.
+  py.stdin.on('error', (err) => {
+    if (err.code !== 'EPIPE') log.warn('Converter stdin error', err.message || err);
+    file.stream.unpipe(py.stdin);
+    file.stream.resume();
+  });
+  file.stream.on('data', (chunk) => {
+    size += chunk.length;
+  });
+  // Truncated by the fileSize limit: multer rejects the request, stop tshark now.
+  file.stream.on('limit', () => py.kill());
+  file.stream.on('error', done);
+  file.stream.on('end', () => done());
+  file.stream.pipe(py.stdin);
+}
+
 /**
  * Multer instance for handling PCAP uploads.
  *
- * - Files are stored in the OS temp directory.
+ * - Files are stored in the spool directory, or streamed (see pcapStorage).
  * - Filenames are prefixed with a unique timestamp-based token to avoid clashes.
  * - Maximum upload size: 200 MB.
  */
 const upload = multer({
-  storage: multer.diskStorage({
-    destination: (req, file, cb) => {
-      cb(null, os.tmpdir());
-    },
-    filename: (req, file, cb) => {
-      const unique = `${Date.now()}-${Math.round(Math.random() * 1e9)}`;
-      cb(null, `${unique}-${file.originalname}`);
-    },
-  }),
+  storage: pcapStorage,
   limits: {
     fileSize: 200 * 1024 * 1024,
   },
@@ -55,17 +232,30 @@ function safeUnlink(filePath) {
  *  - pcap    : .pcap / .pcapng file
  *  - sslkeys : TLS keylog file (e.g. sslkeys.log) for decrypting HTTPS
  *
- * Behaviour:
- *  - Saves both files to a temp directory.
- *  - Spawns a Python script "pcap_to_http_json.py" to parse the capture.
- *  - Expects JSON array on stdout in the /http-requests/ingest-http format.
+ * Behaviour (queue mode, default):
+ *  - Saves both files to the spool directory.
+ *  - Estimates the conversion cost from a header-only scan of the capture
+ *    (size, packet count) and the keylog size.
+ *  - Enqueues a "pcap-convert" job with a small-jobs-first priority; the worker
+ *    runs it when it fits the host's memory / CPU budget.
+ *  - Waits up to PCAP_SYNC_WAIT_MS for the result.
+ *
+ * Behaviour (inline mode, PCAP_QUEUE_ENABLED=false):
+ *  - Streams the capture into the Python script "pcap_to_http_json.py" when the
+ *    "sslkeys" part precedes "pcap" (send it first); otherwise saves it to disk
+ *    and spawns the script once the upload completes.
  *
  * Response:
  *  - 200 with HttpRequest[] on success.
+ *  - 202 { status: 'queued' | 'running', jobId, cost } when the job has not finished
+ *    in time; poll GET /pcap/jobs/:jobId, then GET /pcap/jobs/:jobId/result.
  *  - 400 when mandatory fields are missing.
+ *  - 413 when the estimated cost exceeds the whole per-host budget.
  *  - 500 when processing fails.
  *
- * Temporary files are always cleaned up in the "finally" block.
+ * Temporary files are cleaned up in the "finally" block unless a queued job
+ * took ownership of them, and a streaming conversion is stopped if the
+ * request fails validation.
  */
 router.post(
   '/pcap-http-requests',
@@ -85,6 +275,9 @@ router.post(
       const pcapFile = files.pcap && files.pcap[0];
       const sslKeysFile = files.sslkeys && files.sslkeys[0];
 
+      // Set by pcapStorage even if validation fails below, so it is always removed.
+      sslKeysPath = req.pcapSslKeysPath;
+
       if (!pcapFile) {
         return res.status(400).json({ error: 'Missing PCAP file field "pcap"' });
       }
@@ -94,62 +287,62 @@ router.post(
       }
 
       pcapPath = pcapFile.path;
-      sslKeysPath = sslKeysFile.path;
+      const streamed = Boolean(pcapFile.streamed);
 
       log.info('Received PCAP + SSL keys', {
-        pcapPath,
+        pcapPath: streamed ? '(streamed)' : pcapPath,
         sslKeysPath,
         pcapSize: pcapFile.size,
         sslKeysSize: sslKeysFile.size,
       });
 
-      const scriptPath = path.join(__dirname, '../scripts', 'pcap_to_http_json.py');
-      const pythonBin = process.env.PYTHON_BIN || 'python';
+      if (QUEUE_ENABLED && !streamed) {
+        const scan = await scanCapture(pcapPath);
+        const cost = estimateConversionCost({
+          captureBytes: pcapFile.size,
+          packets: scan.packets,
+          keylogBytes: sslKeysFile.size,
+        });
+        const budget = conversionBudget();
 
-      /**
-       * Spawn the Python converter.
-       * - stdout: JSON array of HTTP requests
-       * - stderr: diagnostics forwarded to logs and included on error
-       */
-      const py = spawn(pythonBin, [scriptPath, pcapPath, sslKeysPath], {
-        stdio: ['ignore', 'pipe', 'pipe'],
-      });
+        if (cost.memoryBytes > budget.memoryBytes) {
+          log.warn('pcap-convert rejected: over budget', { cost, budget });
+          return res.status(413).json({
+            error: 'Capture exceeds the conversion budget',
+            cost,
+            budget,
+          });
+        }
 
-      let stdout = '';
-      let stderr = '';
+        const job = await queuePcap.add(
+          'pcap-convert',
+          { pcapPath, sslKeysPath, cost, scan, originalName: pcapFile.originalname },
+          { priority: costPriority(cost) }
+        );
+        // The worker owns the spooled files from now on.
+        pcapPath = undefined;
+        sslKeysPath = undefined;
 
-      py.stdout.on('data', (chunk) => {
-        stdout += chunk.toString();
-      });
+        log.info('pcap-convert enqueued', { jobId: job.id, priority: costPriority(cost), cost });
 
-      py.stderr.on('data', (chunk) => {
-        const s = chunk.toString();
-        stderr += s;
-      });
+        try {
+          const result = await job.waitUntilFinished(pcapQueueEvents(), SYNC_WAIT_MS);
+          return sendResultFile(res, result.resultPath);
+        } catch (err) {
+          const state = await job.getState();
+          if (state === 'failed') throw err;
+          // Not finished yet: hand out the job id instead of holding the connection.
+          return res.status(202).json({
+            accepted: true,
+            jobId: job.id,
+            status: jobStatus(state),
+            cost,
+          });
+        }
+      }
 
-      /**
-       * Wait for the Python process to complete and parse its output.
-       * Any non-zero exit code or invalid JSON will result in an error.
-       */
-      const httpRequests = await new Promise((resolve, reject) => {
-        py.on('error', (err) => reject(err));
-        py.on('close', (code) => {
-          if (code !== 0) {
-            return reject(
-              new Error(`Python script exited with code ${code}. stderr: ${stderr || 'n/a'}`)
-            );
-          }
-
-          try {
-            const parsed = JSON.parse(stdout || '[]');
-            resolve(parsed);
-          } catch (err) {
-            reject(
-              new Error(`Failed to parse JSON from python stdout: ${(err && err.message) || err}`)
-            );
-          }
-        });
-      });
+      const conversion = streamed ? req.pcapConversion : spawnConverter(pcapPath, sslKeysPath);
+      const httpRequests = await conversion.result;
 
       if (!Array.isArray(httpRequests)) {
         log.warn('Python script did not return an array', { type: typeof httpRequests });
@@ -164,10 +357,106 @@ router.post(
       });
     } finally {
       // Always clean up temporary files, regardless of success/failure.
+      if (req.pcapConversion && req.pcapConversion.py.exitCode === null) {
+        req.pcapConversion.py.kill();
+      }
       safeUnlink(pcapPath);
       safeUnlink(sslKeysPath);
     }
   }
 );
 
+/**
+ * GET /pcap/jobs/:jobId
+ *
+ * Status of a queued PCAP conversion.
+ *
+ * Response:
+ *  - 200 { jobId, status, state, cost, priority, queue, createdAt, startedAt, finishedAt, error }
+ *    where status is 'queued' | 'running' | 'completed' | 'failed' and `queue`
+ *    holds the current job counts of the pcap-convert queue.
+ *  - 404 if the job does not exist.
+ *  - 500 on internal errors.
+ */
+router.get(
+  '/jobs/:jobId',
+  celebrate({ [Segments.PARAMS]: pcapJobIdParamSchema }, celebrateOptions),
+  async (req, res) => {
+    try {
+      const { jobId } = req.params;
+      const job = await queuePcap.getJob(jobId);
+      if (!job) {
+        return res.status(404).json({ error: 'Job not found', jobId });
+      }
+
+      const state = await job.getState();
+      const queue = await queuePcap.getJobCounts('prioritized', 'waiting', 'delayed', 'active');
+
+      res.json({
+        jobId,
+        status: jobStatus(state),
+        state,
+        cost: job.data?.cost || null,
+        priority: job.opts?.priority ?? null,
+        queue,
+        createdAt: job.timestamp,
+        startedAt: job.processedOn || null,
+        finishedAt: job.finishedOn || null,
+        error: state === 'failed' ? job.failedReason || null : null,
+      });
+    } catch (err) {
+      log.error('pcap job lookup failed', err?.message || err);
+      res.status(500).json({
+        error: 'Failed to retrieve job status',
+        detail: String(err?.message || err),
+      });
+    }
+  }
+);
+
+/**
+ * GET /pcap/jobs/:jobId/result
+ *
+ * HttpRequest[] produced by a completed conversion. The spooled result is
+ * deleted once it has been delivered.
+ *
+ * Response:
+ *  - 200 with HttpRequest[].
+ *  - 404 if the job does not exist.
+ *  - 409 { status } if the job has not completed.
+ *  - 410 if the result was already delivered or expired (PCAP_SPOOL_TTL_MS).
+ *  - 500 on internal errors.
+ */
+router.get(
+  '/jobs/:jobId/result',
+  celebrate({ [Segments.PARAMS]: pcapJobIdParamSchema }, celebrateOptions),
+  async (req, res) => {
+    try {
+      const { jobId } = req.params;
+      const job = await queuePcap.getJob(jobId);
+      if (!job) {
+        return res.status(404).json({ error: 'Job not found', jobId });
+      }
+
+      const state = await job.getState();
+      if (state !== 'completed') {
+        return res.status(409).json({
+          error: 'Job has not completed',
+          jobId,
+          status: jobStatus(state),
+          detail: state === 'failed' ? job.failedReason || null : undefined,
+        });
+      }
+
+      return sendResultFile(res, job.returnvalue?.resultPath);
+    } catch (err) {
+      log.error('pcap job result failed', err?.message || err);
+      res.status(500).json({
+        error: 'Failed to retrieve job result',
+        detail: String(err?.message || err),
+      });
+    }
+  }
+);
+
 module.exports = router;
@@ -0,0 +1,494 @@
+#!/usr/bin/env python
+# pcap_index.py
+#
+# Sidecar index for stored captures, written by `pcap_to_http_json.py --index`
+# and queried by this script, so that questions about a capture ("all requests
+# to host X", "the response for stream 42") do not need a full tshark run.
+#
+# Layout: <capture>.owpt-index.sqlite next to the capture, with
+#  - meta         : capture size / mtime (staleness check), container format, ...
+#  - blocks       : byte offset and length of every container block (pcap global
+#                   header and records, pcapng blocks) with its frame number and
+#                   tcp.stream; the "streams" view aggregates frame / byte ranges
+#  - transactions : extracted HttpRequest objects *without bodies*, keyed by id,
+#                   with tcp stream, HTTP/2 stream, authority, path, status and
+#                   the frame range of request + response
+#
+# Lookups are answered from the index alone. With --bodies, the TCP streams of
+# the matching transactions are carved out of the capture by byte offset into a
+# small temporary capture and only that is re-dissected by tshark (the TLS
+# handshake travels with its stream, so the keylog still applies).
+#
+# Usage:
+#   python pcap_index.py <pcap_path> [--host H] [--path-prefix P] [--status N]
+#                        [--stream N] [--id ID] [--limit N] [--bodies --keylog K]
+#
+# Prints a JSON array of HttpRequest objects to stdout (same schema as
+# pcap_to_http_json.py). Exits with 1 on usage errors, 2 when the index is
+# missing / stale or tshark fails.
+
+import sys
+import argparse
+import os
+import sqlite3
+import struct
+import subprocess
+import tempfile
+
+from pcap_to_http_json import (
+    KEEP_CONTENT_ENCODING,
+    UsageArgumentParser,
+    extract_http_from_packets,
+    json_dumps_bytes,
+    json_loads,
+    run_tshark,
+)
+
+INDEX_SUFFIX = ".owpt-index.sqlite"
+INDEX_VERSION = 1
+
+# pcap: magic -> struct byte order (micro- and nanosecond variants)
+PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": "<",
+    b"\xa1\xb2\xc3\xd4": ">",
+    b"\x4d\x3c\xb2\xa1": "<",
+    b"\xa1\xb2\x3c\x4d": ">",
+}
+PCAP_GLOBAL_HEADER_LEN = 24
+PCAP_RECORD_HEADER_LEN = 16
+
+PCAPNG_SHB = b"\x0a\x0d\x0d\x0a"
+PCAPNG_BYTE_ORDER_LE = b"\x4d\x3c\x2b\x1a"
+# Enhanced / Simple / obsolete Packet Blocks: one frame each
+PCAPNG_PACKET_BLOCKS = {6, 3, 2}
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE blocks (
+    offset INTEGER PRIMARY KEY,
+    length INTEGER NOT NULL,
+    frame INTEGER,
+    tcp_stream INTEGER
+);
+CREATE INDEX blocks_stream ON blocks (tcp_stream);
+CREATE VIEW streams AS
+    SELECT tcp_stream,
+           MIN(frame) AS first_frame, MAX(frame) AS last_frame, COUNT(*) AS frames,
+           MIN(offset) AS first_offset, MAX(offset + length) AS end_offset
+    FROM blocks WHERE tcp_stream IS NOT NULL GROUP BY tcp_stream;
+CREATE TABLE transactions (
+    id TEXT PRIMARY KEY,
+    protocol TEXT,
+    tcp_stream INTEGER,
+    h2_stream INTEGER,
+    first_frame INTEGER,
+    last_frame INTEGER,
+    method TEXT,
+    authority TEXT,
+    path TEXT,
+    status INTEGER,
+    has_body INTEGER NOT NULL,
+    doc BLOB NOT NULL
+);
+CREATE INDEX tx_authority ON transactions (authority);
+CREATE INDEX tx_path ON transactions (path);
+CREATE INDEX tx_status ON transactions (status);
+CREATE INDEX tx_stream ON transactions (tcp_stream);
+"""
+
+
+def index_path_for(pcap_path):
+    return pcap_path + INDEX_SUFFIX
+
+
+# ---------------------------------------------------------------------------
+# Container scanning
+# ---------------------------------------------------------------------------
+
+def scan_capture_blocks(pcap_path):
+    """
+    Walk the container structure of a pcap / pcapng file without dissecting it.
+    Returns (format, blocks) where blocks is a list of (offset, length, is_frame).
+    format is None (and blocks empty) for unsupported inputs, e.g. compressed captures.
+    """
+    size = os.path.getsize(pcap_path)
+    blocks = []
+    with open(pcap_path, "rb") as f:
+        head = f.read(4)
+
+        if head in PCAP_MAGICS:
+            endian = PCAP_MAGICS[head]
+            blocks.append((0, PCAP_GLOBAL_HEADER_LEN, False))
+            offset = PCAP_GLOBAL_HEADER_LEN
+            while offset + PCAP_RECORD_HEADER_LEN <= size:
+                f.seek(offset + 8)
+                (incl_len,) = struct.unpack(endian + "I", f.read(4))
+                length = PCAP_RECORD_HEADER_LEN + incl_len
+                if offset + length > size:
+                    break  # truncated last record (capture still being written)
+                blocks.append((offset, length, True))
+                offset += length
+            return "pcap", blocks
+
+        if head == PCAPNG_SHB:
+            endian = "<"
+            offset = 0
+            while offset + 12 <= size:
+                f.seek(offset)
+                header = f.read(12)
+                if header[:4] == PCAPNG_SHB:
+                    # each section header carries its own byte order
+                    endian = "<" if header[8:12] == PCAPNG_BYTE_ORDER_LE else ">"
+                block_type, length = struct.unpack(endian + "II", header[:8])
+                if length < 12 or length % 4:
+                    raise ValueError(f"corrupt pcapng block at offset {offset}")
+                if offset + length > size:
+                    break
+                blocks.append((offset, length, block_type in PCAPNG_PACKET_BLOCKS))
+                offset += length
+            return "pcapng", blocks
+
+    return None, []
+
+
+def tshark_stream_map(pcap_path):
+    """
+    Return {frame.number: tcp.stream} for every frame of the capture (tcp.stream
+    is None for non-TCP frames). Light pass: no decryption, no reassembly output.
+    """
+    tshark_bin = os.getenv("TSHARK_BIN", "tshark")
+    cmd = [tshark_bin, "-r", pcap_path, "-T", "fields", "-e", "frame.number", "-e", "tcp.stream"]
+    print(f"[DEBUG] Running: {' '.join(cmd)}", file=sys.stderr)
+    try:
+        result = subprocess.run(cmd, capture_output=True)
+    except FileNotFoundError as e:
+        raise RuntimeError(f"Cannot find tshark binary '{tshark_bin}': {e}")
+    if result.returncode != 0:
+        stderr = result.stderr.decode("utf-8", errors="replace")
+        raise RuntimeError(f"tshark (stream map pass) failed with code {result.returncode}: {stderr}")
+
+    streams = {}
+    for line in result.stdout.decode("ascii", errors="ignore").splitlines():
+        fields = line.split("\t")
+        if not fields[0].strip():
+            continue
+        stream = fields[1].strip() if len(fields) > 1 else ""
+        streams[int(fields[0])] = int(stream) if stream else None
+    return streams
+
+
+# ---------------------------------------------------------------------------
+# Index writing
+# ---------------------------------------------------------------------------
+
+def _without_bodies(http_request):
+    """Return (doc, has_body): a shallow copy of the request with bodies removed."""
+    doc = dict(http_request)
+    has_body = doc.pop("body", None) is not None
+    if "response" in doc:
+        response = dict(doc["response"])
+        has_body = (response.pop("body", None) is not None) or has_body
+        doc["response"] = response
+    return doc, has_body
+
+
+def write_index(pcap_path, http_requests, provenance, capture_sha=None, id_mode="run", index_path=None):
+    """
+    Build the sidecar index of `pcap_path` from the converter output
+    (`http_requests` and the `provenance` filled by extract_http_from_packets).
+    The file is written under a temporary name and moved into place.
+    Returns the index path.
+    """
+    index_path = index_path or index_path_for(pcap_path)
+    st = os.stat(pcap_path)
+
+    try:
+        container, blocks = scan_capture_blocks(pcap_path)
+    except (OSError, ValueError, struct.error) as e:
+        print(f"[DEBUG] Capture not scannable ({e}), index without byte offsets", file=sys.stderr)
+        container, blocks = None, []
+    streams = tshark_stream_map(pcap_path)
+
+    block_rows = []
+    frame = 0
+    for offset, length, is_frame in blocks:
+        if is_frame:
+            frame += 1
+            block_rows.append((offset, length, frame, streams.get(frame)))
+        else:
+            block_rows.append((offset, length, None, None))
+    # carving by byte offset is only sound if our frame numbering matches tshark's
+    carvable = container is not None and frame == len(streams)
+
+    tx_rows = []
+    for req in http_requests:
+        origin = provenance.get(req["id"], {})
+        uri = req.get("uri") or {}
+        response = req.get("response") or {}
+        doc, has_body = _without_bodies(req)
+        tx_rows.append(
+            (
+                req["id"],
+                origin.get("protocol"),
+                origin.get("tcp_stream"),
+                origin.get("h2_stream"),
+                origin.get("frame"),
+                origin.get("last_frame"),
+                req.get("method"),
+                (uri.get("authority") or "").lower() or None,
+                uri.get("path"),
+                response.get("statusCode"),
+                int(has_body),
+                json_dumps_bytes(doc),
+            )
+        )
+
+    meta = {
+        "version": INDEX_VERSION,
+        "capture_path": os.path.abspath(pcap_path),
+        "capture_size": st.st_size,
+        "capture_mtime_ns": st.st_mtime_ns,
+        "capture_sha256": capture_sha or "",
+        "container": container or "",
+        "carvable": int(carvable),
+        "frames": len(streams),
+        "id_mode": id_mode,
+    }
+
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        conn.executemany("INSERT INTO blocks VALUES (?, ?, ?, ?)", block_rows)
+        conn.executemany("INSERT OR IGNORE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", tx_rows)
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [(k, str(v)) for k, v in meta.items()])
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, index_path)
+
+    print(
+        f"[DEBUG] Index written: {index_path} ({len(tx_rows)} transactions, {len(streams)} frames, "
+        f"container={container or 'n/a'}, carvable={carvable})",
+        file=sys.stderr,
+    )
+    return index_path
+
+
+# ---------------------------------------------------------------------------
+# Index reading
+# ---------------------------------------------------------------------------
+
+def open_index(pcap_path, index_path=None):
+    """
+    Open the sidecar index of `pcap_path` read-only and check it still describes
+    the capture (size + mtime). Returns (connection, meta dict).
+    """
+    index_path = index_path or index_path_for(pcap_path)
+    if not os.path.exists(index_path):
+        raise RuntimeError(f"No index for {pcap_path} (run pcap_to_http_json.py --index)")
+    conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    meta = {row["key"]: row["value"] for row in conn.execute("SELECT key, value FROM meta")}
+
+    if meta.get("version") != str(INDEX_VERSION):
+        conn.close()
+        raise RuntimeError(f"Index {index_path} has version {meta.get('version')}, expected {INDEX_VERSION}")
+    st = os.stat(pcap_path)
+    if meta.get("capture_size") != str(st.st_size) or meta.get("capture_mtime_ns") != str(st.st_mtime_ns):
+        conn.close()
+        raise RuntimeError(f"Index {index_path} is stale (capture changed since it was built)")
+    return conn, meta
+
+
+def query_index(conn, host=None, path_prefix=None, status=None, stream=None, request_id=None, limit=None):
+    """
+    Select transactions by authority (host, with or without port), path prefix,
+    response status, tcp stream and/or id. Returns a list of dicts:
+    {"id", "tcp_stream", "h2_stream", "first_frame", "last_frame", "has_body", "doc"}.
+    """
+    def like_escape(s):
+        return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    where, params = [], []
+    if host:
+        host = host.lower()
+        where.append("(authority = ? OR authority LIKE ? ESCAPE '\\')")
+        params += [host, like_escape(host) + ":%"]
+    if path_prefix:
+        where.append("path LIKE ? ESCAPE '\\'")
+        params.append(like_escape(path_prefix) + "%")
+    if status is not None:
+        where.append("status = ?")
+        params.append(status)
+    if stream is not None:
+        where.append("tcp_stream = ?")
+        params.append(stream)
+    if request_id:
+        where.append("id = ?")
+        params.append(request_id)
+
+    sql = "SELECT id, tcp_stream, h2_stream, first_frame, last_frame, has_body, doc FROM transactions"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY first_frame"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    return [
+        {
+            "id": row["id"],
+            "tcp_stream": row["tcp_stream"],
+            "h2_stream": row["h2_stream"],
+            "first_frame": row["first_frame"],
+            "last_frame": row["last_frame"],
+            "has_body": bool(row["has_body"]),
+            "doc": json_loads(row["doc"]),
+        }
+        for row in conn.execute(sql, params)
+    ]
+
+
+def carve_streams(pcap_path, conn, tcp_streams, out_path):
+    """
+    Copy the container header blocks and the frames of `tcp_streams` into a new
+    capture at `out_path`. Returns the original frame numbers, in carved order
+    (carved frame k is original frame result[k - 1]).
+    """
+    marks = ",".join("?" * len(tcp_streams))
+    rows = conn.execute(
+        f"SELECT offset, length, frame FROM blocks WHERE frame IS NULL OR tcp_stream IN ({marks}) ORDER BY offset",
+        list(tcp_streams),
+    ).fetchall()
+    frames = []
+    with open(pcap_path, "rb") as src, open(out_path, "wb") as dst:
+        for row in rows:
+            src.seek(row["offset"])
+            dst.write(src.read(row["length"]))
+            if row["frame"] is not None:
+                frames.append(row["frame"])
+    return frames
+
+
+def fetch_bodies(pcap_path, sslkeys_path, conn, meta, records, keep_encoding=KEEP_CONTENT_ENCODING):
+    """
+    Re-dissect only the TCP streams of `records` and put the response bodies
+    back into their docs (in place), with the contentEncoding marker of the
+    re-dissection. Falls back to a full tshark run when the capture cannot be
+    carved (e.g. compressed) or a record has no tcp stream.
+    """
+    wanted = [r for r in records if r["has_body"]]
+    if not wanted:
+        return records
+    streams = {r["tcp_stream"] for r in wanted}
+
+    tmp_path = None
+    try:
+        if meta.get("carvable") == "1" and None not in streams:
+            fd, tmp_path = tempfile.mkstemp(suffix="." + meta["container"])
+            os.close(fd)
+            frame_map = carve_streams(pcap_path, conn, sorted(streams), tmp_path)
+            print(
+                f"[DEBUG] Carved {len(frame_map)} frames of {len(streams)} stream(s) into {tmp_path}",
+                file=sys.stderr,
+            )
+            tshark_data = run_tshark(tmp_path, sslkeys_path, keep_encoding=keep_encoding)
+        else:
+            print("[DEBUG] Capture not carvable, re-dissecting the whole file", file=sys.stderr)
+            frame_map = None
+            tshark_data = run_tshark(pcap_path, sslkeys_path, keep_encoding=keep_encoding)
+    finally:
+        if tmp_path:
+            os.remove(tmp_path)
+
+    provenance = {}
+    by_origin = {}
+    for req in extract_http_from_packets(tshark_data, provenance=provenance):
+        origin = provenance.get(req["id"], {})
+        frame = origin.get("frame")
+        if frame is not None and frame_map is not None:
+            frame = frame_map[frame - 1] if 0 < frame <= len(frame_map) else None
+        by_origin[(frame, origin.get("h2_stream"))] = req
+
+    for record in wanted:
+        match = by_origin.get((record["first_frame"], record["h2_stream"]))
+        response = (match or {}).get("response") or {}
+        if response.get("body") and "response" in record["doc"]:
+            record["doc"]["response"]["body"] = response["body"]
+            record["doc"]["response"].pop("contentEncoding", None)
+            if "contentEncoding" in response:
+                record["doc"]["response"]["contentEncoding"] = response["contentEncoding"]
+    return records
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def parse_args(argv=None):
+    parser = UsageArgumentParser(
+        prog="pcap_index.py",
+        description="Query the sidecar index of a capture written by pcap_to_http_json.py --index.",
+    )
+    parser.add_argument("pcap_path", help="path to the indexed .pcap / .pcapng file")
+    parser.add_argument("--host", help="authority, with or without port")
+    parser.add_argument("--path-prefix", help="request path (with query) prefix")
+    parser.add_argument("--status", type=int, help="response status code")
+    parser.add_argument("--stream", type=int, help="tcp.stream")
+    parser.add_argument("--id", dest="request_id", help="request id")
+    parser.add_argument("--limit", type=int, help="max number of transactions")
+    parser.add_argument("--bodies", action="store_true", help="re-dissect the matching streams to add response bodies")
+    parser.add_argument("--keylog", help="TLS key log file, required with --bodies")
+    parser.add_argument(
+        "--keep-encoding",
+        action=argparse.BooleanOptionalAction,
+        default=KEEP_CONTENT_ENCODING,
+        help="with --bodies: keep bodies in their Content-Encoding (default from env PCAP_KEEP_CONTENT_ENCODING)",
+    )
+    parser.add_argument("--index-path", help="index file (default: <pcap_path>" + INDEX_SUFFIX + ")")
+    args = parser.parse_args(argv)
+    if args.bodies and not args.keylog:
+        parser.error("--bodies requires --keylog")
+    return args
+
+
+def main():
+    """
+    CLI entry point: print the matching transactions as a JSON array.
+
+    Exits with:
+      - 0 on success
+      - 1 on usage errors
+      - 2 on missing / stale index or tshark errors
+    """
+    args = parse_args()
+    try:
+        conn, meta = open_index(args.pcap_path, args.index_path)
+        try:
+            records = query_index(
+                conn,
+                host=args.host,
+                path_prefix=args.path_prefix,
+                status=args.status,
+                stream=args.stream,
+                request_id=args.request_id,
+                limit=args.limit,
+            )
+            print(f"[DEBUG] {len(records)} transaction(s) matched", file=sys.stderr)
+            if args.bodies:
+                fetch_bodies(args.pcap_path, args.keylog, conn, meta, records, args.keep_encoding)
+        finally:
+            conn.close()
+    except (RuntimeError, sqlite3.Error) as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        sys.exit(2)
+
+    sys.stdout.buffer.write(json_dumps_bytes([r["doc"] for r in records]) + b"\n")
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# pcap_inventory.py
+#
+# Inventory mode of pcap_to_http_json.py (--inventory): the attack surface of a
+# capture (endpoints, parameter names, status codes, counts) without building
+# and printing the HttpRequest array.
+#
+#  1. tshark exports only request / response metadata as tab-separated fields,
+#     one line per packet (no bodies, no decompression, no JSON tree).
+#  2. Lines are consumed while tshark is still writing them; each one becomes a
+#     `layers` dict, so requests are parsed by the converter itself
+#     (http_request_from_layers / build_uri_struct).
+#  3. Requests are folded into one entry per (authority, method, path template),
+#     where numeric and UUID path segments are collapsed ("/users/{int}").
+#
+# Memory grows with the number of distinct endpoints, not with the capture:
+# only requests still waiting for their response are remembered, at most
+# MAX_PENDING_REQUESTS (the oldest are counted as unanswered).
+#
+# Used as a module by pcap_to_http_json.py.
+
+import sys
+import re
+import subprocess
+import tempfile
+import time
+from collections import OrderedDict
+
+from pcap_to_http_json import (
+    file_sha256,
+    first_or_none,
+    discard_keylog,
+    http_request_from_layers,
+    prepare_keylog,
+    tshark_dissect_options,
+)
+
+# Fields needed by http_request_from_layers plus the response join keys.
+INVENTORY_FIELDS = (
+    "frame.number",
+    "ip.dst",
+    "tcp.dstport",
+    "tcp.stream",
+    "http.request.method",
+    "http.request.full_uri",
+    "http.request.version",
+    "http.host",
+    "http.request.uri",
+    "http.response.code",
+    "http.request_in",
+    "http2.streamid",
+    "http2.headers.method",
+    "http2.headers.scheme",
+    "http2.headers.authority",
+    "http2.headers.path",
+    "http2.headers.status",
+)
+
+MAX_PENDING_REQUESTS = 100_000
+MAX_PARAMS_PER_ENDPOINT = 200
+
+INT_SEGMENT_RE = re.compile(r"[0-9]+")
+UUID_SEGMENT_RE = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.IGNORECASE
+)
+
+
+def path_template(path):
+    """
+    Collapse variable path segments: "/users/42/files/<uuid>?x=1" -> "/users/{int}/files/{uuid}".
+    The query string is dropped (parameter names are collected separately).
+    """
+    path = (path or "/").split("?", 1)[0].split("#", 1)[0] or "/"
+    segments = []
+    for seg in path.split("/"):
+        if INT_SEGMENT_RE.fullmatch(seg):
+            seg = "{int}"
+        elif UUID_SEGMENT_RE.fullmatch(seg):
+            seg = "{uuid}"
+        segments.append(seg)
+    return "/".join(segments)
+
+
+def iter_tshark_layers(pcap_path, sslkeys_path, fields=INVENTORY_FIELDS):
+    """
+    Run tshark with `-T fields` and yield one `layers` dict per packet
+    ({field: [first occurrence]}, empty fields omitted), as tshark emits them.
+    With pcap_path "-" tshark reads the capture from our stdin.
+    Raises RuntimeError if tshark cannot be started or fails.
+    """
+    # keep_encoding: bodies are not exported, so do not spend time inflating them
+    cmd = tshark_dissect_options(pcap_path, sslkeys_path, keep_encoding=True) + [
+        "-T", "fields",
+        "-E", "separator=/t",
+        "-E", "occurrence=f",
+    ]
+    for field in fields:
+        cmd += ["-e", field]
+
+    print(f"[DEBUG] Running: {' '.join(cmd)}", file=sys.stderr)
+
+    # stderr goes to a spill file: a pipe nobody reads could fill up and stall tshark.
+    with tempfile.TemporaryFile() as err:
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err)
+        except FileNotFoundError as e:
+            raise RuntimeError(f"Cannot find tshark binary '{cmd[0]}': {e}")
+
+        try:
+            for line in proc.stdout:
+                values = line.rstrip(b"\r\n").decode("utf-8", errors="replace").split("\t")
+                yield {name: [value] for name, value in zip(fields, values) if value}
+        finally:
+            proc.stdout.close()
+            returncode = proc.wait()
+
+        if returncode != 0:
+            err.seek(0)
+            stderr = err.read().decode("utf-8", errors="replace")
+            raise RuntimeError(f"tshark failed with code {returncode}: {stderr}")
+
+
+class EndpointInventory:
+    """Constant-memory aggregation of HttpRequest objects into endpoint entries."""
+
+    def __init__(self, max_pending=MAX_PENDING_REQUESTS):
+        self.max_pending = max_pending
+        self.endpoints = {}  # (authority, method, template) -> entry
+        self.pending = OrderedDict()  # request join key -> endpoint key
+        self.packets = 0
+        self.requests = 0
+        self.responses = 0
+        self.evicted = 0
+
+    def add_packet(self, layers):
+        """Same request / response recognition as extract_http_from_packets, without bodies."""
+        self.packets += 1
+
+        key, req = http_request_from_layers(layers)
+        if key and req and key not in self.pending:
+            self.pending[key] = self.add_request(req)
+            if len(self.pending) > self.max_pending:
+                self.pending.popitem(last=False)
+                self.evicted += 1
+
+        req_frame = first_or_none(layers.get("http.request_in"))
+        status = first_or_none(layers.get("http.response.code"))
+        if req_frame and status:
+            self.add_response(("http1", req_frame), status)
+
+        tcp_stream = first_or_none(layers.get("tcp.stream"))
+        status = first_or_none(layers.get("http2.headers.status"))
+        if status and tcp_stream is not None:
+            streamid = first_or_none(layers.get("http2.streamid")) or "0"
+            self.add_response(("http2", tcp_stream, streamid), status)
+
+    def add_request(self, req):
+        uri = req.get("uri") or {}
+        authority = (uri.get("authority") or "").lower()
+        template = path_template(uri.get("path"))
+        ep_key = (authority, req["method"], template)
+
+        entry = self.endpoints.get(ep_key)
+        if entry is None:
+            entry = self.endpoints[ep_key] = {
+                "authority": authority or None,
+                "method": req["method"],
+                "pathTemplate": template,
+                "example": uri.get("full") or None,
+                "schemes": set(),
+                "params": set(),
+                "paramsTruncated": False,
+                "requests": 0,
+                "responses": 0,
+                "statusCodes": {},
+            }
+        entry["requests"] += 1
+        if uri.get("scheme"):
+            entry["schemes"].add(uri["scheme"].lower())
+        for param in uri.get("params") or []:
+            if param["name"] in entry["params"]:
+                continue
+            if len(entry["params"]) >= MAX_PARAMS_PER_ENDPOINT:
+                entry["paramsTruncated"] = True
+                break
+            entry["params"].add(param["name"])
+
+        self.requests += 1
+        return ep_key
+
+    def add_response(self, join_key, status):
+        ep_key = self.pending.pop(join_key, None)
+        if ep_key is None:
+            return
+        entry = self.endpoints[ep_key]
+        entry["responses"] += 1
+        entry["statusCodes"][status] = entry["statusCodes"].get(status, 0) + 1
+        self.responses += 1
+
+    def summary(self):
+        """JSON-ready result, endpoints sorted by authority, path template and method."""
+        by_host, by_status, endpoints = {}, {}, []
+        for ep_key in sorted(self.endpoints, key=lambda k: (k[0], k[2], k[1])):
+            entry = dict(self.endpoints[ep_key])
+            entry["schemes"] = sorted(entry["schemes"])
+            entry["params"] = sorted(entry["params"])
+            entry["statusCodes"] = dict(sorted(entry["statusCodes"].items()))
+            if not entry["paramsTruncated"]:
+                del entry["paramsTruncated"]
+            endpoints.append(entry)
+
+            host = entry["authority"] or ""
+            by_host[host] = by_host.get(host, 0) + entry["requests"]
+            for status, n in entry["statusCodes"].items():
+                by_status[status] = by_status.get(status, 0) + n
+
+        return {
+            "totals": {
+                "packets": self.packets,
+                "requests": self.requests,
+                "responses": self.responses,
+                "unanswered": self.requests - self.responses,
+                "endpoints": len(endpoints),
+                "authorities": len(by_host),
+            },
+            "byHost": by_host,
+            "byStatus": dict(sorted(by_status.items())),
+            "endpoints": endpoints,
+        }
+
+
+def endpoint_inventory(pcap_path, sslkeys_path, prune_keylog=True):
+    """
+    Build the endpoint inventory of a capture.
+
+    Returns a dict:
+      {
+        "totals":    { packets, requests, responses, unanswered, endpoints, authorities, elapsedMs },
+        "byHost":    { authority: requests },
+        "byStatus":  { status: responses },
+        "endpoints": [
+          { authority, method, pathTemplate, example, schemes, params,
+            requests, responses, statusCodes: { status: n } }, ...
+        ]
+      }
+    Unlike the conversion, requests without a response are counted too.
+    """
+    t0 = time.perf_counter()
+    keylog = sslkeys_path
+    if prune_keylog and pcap_path != "-":
+        keylog = prepare_keylog(pcap_path, sslkeys_path, file_sha256(pcap_path))
+
+    inventory = EndpointInventory()
+    try:
+        for layers in iter_tshark_layers(pcap_path, keylog):
+            inventory.add_packet(layers)
+    finally:
+        discard_keylog(keylog, sslkeys_path)
+    if inventory.evicted:
+        print(
+            f"[DEBUG] Inventory: {inventory.evicted} request(s) dropped from the response join "
+            f"(more than {inventory.max_pending} pending)",
+            file=sys.stderr,
+        )
+
+    result = inventory.summary()
+    result["totals"]["elapsedMs"] = round((time.perf_counter() - t0) * 1000)
+    print(
+        f"[DEBUG] Inventory: {result['totals']['requests']} requests, "
+        f"{result['totals']['endpoints']} endpoints from {result['totals']['packets']} packets "
+        f"in {time.perf_counter() - t0:.3f}s",
+        file=sys.stderr,
+    )
+    return result
@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+# pcap_rdf.py
+#
+# Bulk RDF output of pcap_to_http_json.py (--rdf-out DIR): the converted
+# requests are written as the same ontology triples that the API ingest path
+# inserts (utils/http/builders/extractTriples.js), as gzip-compressed
+# N-Quads (default) or N-Triples files, ready for GraphDB's bulk loaders:
+#
+#   importrdf preload -f -i <repository> DIR/*.nq.gz
+#
+#  - Requests are serialized one at a time while the files are written;
+#    a file is closed after about --rdf-chunk-triples statements (a request
+#    never spans two files) and renamed from *.part, so a partial file is never
+#    picked up by a loader.
+#  - N-Quads carry the named graph (--rdf-graph, default HTTP_REQUESTS_NAME_GRAPH);
+#    N-Triples files have to be loaded into that graph explicitly.
+#  - IRIs and literals follow utils/iri/http.js, utils/http/headers.js,
+#    utils/strings/escape.js and utils/sparql/format.js; the ontology bases
+#    come from the same env vars (ONT_EX, ONT_CONTENT). Keep them in sync.
+#
+# Used as a module by pcap_to_http_json.py.
+
+import os
+import re
+import gzip
+from urllib.parse import quote
+
+EX = os.getenv("ONT_EX", "http://localhost/onto/ontowebpt") + "#"
+CONTENT = (os.getenv("ONT_CONTENT") or "http://www.w3.org/2008/content") + "#"
+G_HTTP = os.getenv("HTTP_REQUESTS_NAME_GRAPH", "http://localhost/graphs/http-requests")
+
+RDF_TYPE = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>"
+RDFS_SEE_ALSO = "<http://www.w3.org/2000/01/rdf-schema#seeAlso>"
+XSD_STRING = "<http://www.w3.org/2001/XMLSchema#string>"
+XSD_INT = "<http://www.w3.org/2001/XMLSchema#int>"
+RDF_XML_LITERAL = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#XMLLiteral>"
+
+RDF_FORMATS = ("nq", "nt")
+DEFAULT_CHUNK_TRIPLES = 1_000_000
+
+PAYLOAD_HEADERS = {
+    "content-type",
+    "content-length",
+    "content-encoding",
+    "content-language",
+    "content-location",
+    "content-md5",
+    "content-range",
+}
+REPRESENTATION_REQUEST_HEADERS = {
+    "accept",
+    "accept-language",
+    "accept-encoding",
+    "accept-charset",
+    "accept-datetime",
+}
+REPRESENTATION_RESPONSE_HEADERS = {
+    "vary",
+    "accept-ranges",
+    "etag",
+    "last-modified",
+    "cache-control",
+    "expires",
+}
+
+_LITERAL_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\r": "\\r", "\n": "\\n", "\t": "\\t"})
+
+
+def escape_string_literal(s):
+    """escapeStringLiteral (utils/strings/escape.js)."""
+    return str(s).translate(_LITERAL_ESCAPES)
+
+
+def escape_xml(s):
+    """escapeXml (utils/strings/escape.js)."""
+    return (
+        str(s)
+        .replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace('"', "&quot;")
+        .replace("'", "&apos;")
+    )
+
+
+def iri_fragment_safe(s):
+    """iriFragmentSafe (utils/iri/http.js): same character set as encodeURIComponent."""
+    return quote(str(s), safe="!'()*")
+
+
+def _or_empty(value):
+    return "" if value is None else value
+
+
+def literal(value, datatype=None):
+    lit = f'"{escape_string_literal(value)}"'
+    return f"{lit}^^{datatype}" if datatype else lit
+
+
+def classify_request_header(name):
+    """classifyRequestHeader (utils/http/headers.js) -> (class, property)."""
+    n = str(name).lower()
+    if n == "cookie":
+        return "Cookie", "reqHeader"
+    if n in PAYLOAD_HEADERS:
+        return "PayloadHeaders", "payHeader"
+    if n in REPRESENTATION_REQUEST_HEADERS:
+        return "RepresentationHeaders", "repHeader"
+    return "RequestHeader", "reqHeader"
+
+
+def classify_response_header(name):
+    """classifyResponseHeader (utils/http/headers.js) -> (class, property)."""
+    n = str(name).lower()
+    if n == "set-cookie":
+        return "Set-Cookie", "resHeader"
+    if n in PAYLOAD_HEADERS:
+        return "PayloadHeaders", "payHeader"
+    if n in REPRESENTATION_RESPONSE_HEADERS:
+        return "RepresentationHeaders", "repHeader"
+    return "ResponseHeader", "resHeader"
+
+
+def expand_set_cookie_headers(headers):
+    """One Set-Cookie header per cookie (values aggregated with newlines are split)."""
+    out = []
+    for h in headers or []:
+        if not h or not isinstance(h.get("name"), str):
+            continue
+        if h["name"].lower() == "set-cookie" and isinstance(h.get("value"), str):
+            for line in re.split(r"\r?\n", h["value"]):
+                if line.strip():
+                    out.append({"name": h["name"], "value": line.strip()})
+        else:
+            out.append(h)
+    return out
+
+
+def parse_set_cookie_attributes(raw_value):
+    """Cookie name and Domain attribute of a Set-Cookie value (not a full RFC 6265 parser)."""
+    parts = str(raw_value).split(";")
+    name = domain = None
+    first = parts[0].strip()
+    if first.find("=") > 0:
+        name = first[: first.index("=")].strip()
+    for seg in parts[1:]:
+        seg = seg.strip()
+        if seg.lower().startswith("domain=") and seg[len("domain="):].strip():
+            domain = seg[len("domain="):].strip()
+            break
+    return name, domain
+
+
+def request_triples(req):
+    """
+    (subject, predicate, object) terms for one converter HttpRequest, as
+    extractTriplesForSingleRequest would build them after ingestion
+    (response.statusCode / reasonPhrase / responseHeaders / body map to
+    status / reason / headers / bodyBase64).
+    """
+    rid = iri_fragment_safe(req["id"])
+    base = f"urn:req:{rid}"
+    req_iri = f"<{base}>"
+    uri_iri = f"<{base}:uri>"
+
+    t = [
+        (req_iri, RDF_TYPE, f"<{EX}Request>"),
+        (uri_iri, RDF_TYPE, f"<{EX}URI>"),
+        (req_iri, f"<{EX}id>", literal(req["id"])),
+        (req_iri, f"<{EX}uriRequest>", uri_iri),
+        (req_iri, f"<{EX}mthd>", f"<{EX}{str(req['method']).upper()}>"),
+    ]
+    if req.get("httpVersion"):
+        t.append((req_iri, f"<{EX}httpVersion>", literal(req["httpVersion"])))
+
+    conn_authority = (req.get("connection") or {}).get("authority")
+    if conn_authority not in (None, ""):
+        conn_iri = f"<{base}:conn>"
+        t += [
+            (conn_iri, RDF_TYPE, f"<{EX}Connection>"),
+            (conn_iri, f"<{EX}connectionAuthority>", literal(conn_authority)),
+            (req_iri, RDFS_SEE_ALSO, conn_iri),
+        ]
+
+    uri = req.get("uri") or {}
+    for key in ("scheme", "authority", "path", "fragment"):
+        if uri.get(key):
+            t.append((uri_iri, f"<{EX}{key}>", literal(uri[key])))
+    if uri.get("full"):
+        t.append((uri_iri, f"<{EX}uri>", literal(uri["full"])))
+
+    params = uri.get("params") or []
+    if str(uri.get("queryRaw") or "").strip():
+        xml = f"<query>{escape_xml(uri['queryRaw'])}</query>"
+        t.append((uri_iri, f"<{EX}query>", literal(xml, RDF_XML_LITERAL)))
+    elif params:
+        items = "\n".join(
+            f'  <param name="{escape_xml(p.get("name") or "")}">{escape_xml(_or_empty(p.get("value")))}</param>'
+            for p in params
+        )
+        t.append((uri_iri, f"<{EX}query>", literal(f"<query>\n{items}\n</query>", RDF_XML_LITERAL)))
+
+    for i, prm in enumerate(params):
+        param_iri = f"<{base}:param:{i}>"
+        t += [
+            (param_iri, RDF_TYPE, f"<{EX}Parameter>"),
+            (param_iri, f"<{EX}nameParameter>", literal(prm.get("name") or "", XSD_STRING)),
+        ]
+        if prm.get("value") is not None:
+            t.append((param_iri, f"<{EX}valueParameter>", literal(prm["value"])))
+        t.append((uri_iri, f"<{EX}param>", param_iri))
+
+    for i, h in enumerate(req.get("requestHeaders") or []):
+        hdr_iri = f"<{base}:hdr:{i}>"
+        cls, prop = classify_request_header(h.get("name") or "")
+        t += [
+            (hdr_iri, RDF_TYPE, f"<{EX}{cls}>"),
+            (hdr_iri, f"<{EX}fieldName>", literal(h.get("name") or "", XSD_STRING)),
+        ]
+        if h.get("value") is not None:
+            t.append((hdr_iri, f"<{EX}fieldValue>", literal(h["value"])))
+        t.append((req_iri, f"<{EX}{prop}>", hdr_iri))
+
+    resp = req.get("response")
+    if resp:
+        t += _response_triples(base, req_iri, resp)
+    return t
+
+
+def _response_triples(base, req_iri, resp):
+    res_iri = f"<{base}:res>"
+    sc_iri = f"<{base}:sc>"
+    t = [(res_iri, RDF_TYPE, f"<{EX}Response>"), (req_iri, f"<{EX}resp>", res_iri)]
+    if resp.get("httpVersion"):
+        t.append((res_iri, f"<{EX}httpVersion>", literal(resp["httpVersion"])))
+    if resp.get("body"):
+        t.append((res_iri, f"<{EX}body>", literal(resp["body"], f"<{CONTENT}ContentAsBase64>")))
+
+    status = resp.get("statusCode")
+    reason = resp.get("reasonPhrase")
+    if isinstance(status, int) or reason:
+        t += [(sc_iri, RDF_TYPE, f"<{EX}StatusCodes>"), (res_iri, f"<{EX}sc>", sc_iri)]
+        if isinstance(status, int):
+            t.append((sc_iri, f"<{EX}statusCodeNumber>", literal(status, XSD_INT)))
+        if reason:
+            t.append((sc_iri, f"<{EX}reasonPhrase>", literal(reason)))
+
+    headers = list(resp.get("responseHeaders") or [])
+    if resp.get("contentEncoding") and not any(
+        str(h.get("name") or "").lower() == "content-encoding" for h in headers
+    ):
+        headers.append({"name": "content-encoding", "value": resp["contentEncoding"]})
+
+    for i, h in enumerate(expand_set_cookie_headers(headers)):
+        hdr_iri = f"<{base}:resh:{i}>"
+        cls, prop = classify_response_header(h.get("name") or "")
+        t += [
+            (hdr_iri, RDF_TYPE, f"<{EX}{cls}>"),
+            (hdr_iri, f"<{EX}fieldName>", literal(h.get("name") or "", XSD_STRING)),
+        ]
+        if h.get("value") is not None:
+            t.append((hdr_iri, f"<{EX}fieldValue>", literal(h["value"])))
+            if str(h.get("name")).lower() == "set-cookie":
+                cookie_name, cookie_domain = parse_set_cookie_attributes(h["value"])
+                if cookie_name:
+                    t.append((hdr_iri, f"<{EX}cookieName>", literal(cookie_name)))
+                if cookie_domain:
+                    t.append((hdr_iri, f"<{EX}cookieDomain>", literal(cookie_domain)))
+        t.append((res_iri, f"<{EX}{prop}>", hdr_iri))
+    return t
+
+
+class RdfChunkWriter:
+    """
+    Write requests as gzip-compressed N-Quads / N-Triples files
+    <out_dir>/<prefix>-00001.<fmt>.gz, ... of about `chunk_triples` statements each.
+    """
+
+    def __init__(self, out_dir, prefix, fmt="nq", graph=G_HTTP, chunk_triples=DEFAULT_CHUNK_TRIPLES):
+        if fmt not in RDF_FORMATS:
+            raise ValueError(f"unsupported RDF format {fmt!r}")
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.fmt = fmt
+        self.terminator = f" <{graph}> .\n" if fmt == "nq" else " .\n"
+        self.graph = graph
+        self.chunk_triples = chunk_triples
+        self.files = []
+        self.requests = 0
+        self.triples = 0
+        self._fh = None
+        self._part_path = None
+
+    def write_request(self, req):
+        if self._fh is None:
+            self._open_chunk()
+        lines = "".join(f"{s} {p} {o}{self.terminator}" for s, p, o in request_triples(req))
+        count = lines.count("\n")
+        self._fh.write(lines.encode("utf-8", errors="replace"))
+
+        current = self.files[-1]
+        current["requests"] += 1
+        current["triples"] += count
+        self.requests += 1
+        self.triples += count
+        if current["triples"] >= self.chunk_triples:
+            self._close_chunk()
+
+    def _open_chunk(self):
+        path = os.path.join(self.out_dir, f"{self.prefix}-{len(self.files) + 1:05d}.{self.fmt}.gz")
+        self._part_path = path + ".part"
+        self._fh = gzip.open(self._part_path, "wb")
+        self.files.append({"path": path, "requests": 0, "triples": 0})
+
+    def _close_chunk(self):
+        self._fh.close()
+        os.replace(self._part_path, self.files[-1]["path"])
+        self._fh = self._part_path = None
+
+    def close(self):
+        """Finish the last file; returns the manifest of what was written."""
+        if self._fh is not None:
+            self._close_chunk()
+        return {
+            "format": self.fmt,
+            "graph": self.graph,
+            "requests": self.requests,
+            "triples": self.triples,
+            "files": self.files,
+        }
+
+    def abort(self):
+        """Drop the file being written (the finished chunks are kept)."""
+        if self._fh is not None:
+            self._fh.close()
+            os.remove(self._part_path)
+            self._fh = self._part_path = None
+
+
+def write_rdf(http_requests, out_dir, prefix, fmt="nq", graph=G_HTTP, chunk_triples=DEFAULT_CHUNK_TRIPLES):
+    """Serialize `http_requests` into chunk files; returns the manifest (see RdfChunkWriter.close)."""
+    writer = RdfChunkWriter(out_dir, prefix, fmt, graph, chunk_triples)
+    try:
+        for req in http_requests:
+            writer.write_request(req)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+def rdf_file_prefix(pcap_path, scope):
+    """Chunk file prefix: capture file name (without extensions) plus the ID scope of the run."""
+    stem = "stdin" if pcap_path == "-" else os.path.basename(pcap_path).split(".", 1)[0]
+    stem = re.sub(r"[^A-Za-z0-9_-]+", "_", stem) or "capture"
+    return f"{stem}-{scope}"
@@ -0,0 +1,428 @@
+#!/usr/bin/env python
+# pcap_sample.py
+#
+# Preview mode of pcap_to_http_json.py (--sample): a quick look at a large
+# capture without a full conversion.
+#
+#  1. One sequential read of the capture in Python, without dissection: every
+#     packet is keyed by its TCP connection (direction-independent 4-tuple,
+#     decoded from the link / IP / TCP headers) and a deterministic hash of the
+#     key selects a fraction of the connections. Their packets, and all
+#     non-packet container blocks (interfaces, TLS secrets, ...), are copied
+#     into a small temporary capture; non-TCP packets are dropped.
+#  2. tshark only dissects the sample, so the keylog, reassembly and HTTP/2 work
+#     the same as in a full run for the sampled connections.
+#  3. Totals (requests, requests per host, status distribution) are extrapolated
+#     from the fraction of connections kept.
+#
+# The same seed selects the same connections in every run. Frame numbers in the
+# output refer to the original capture; request IDs are preview-only (not meant
+# for ingestion).
+#
+# Used as a module by pcap_to_http_json.py; it reads from a file object, so a
+# capture arriving on stdin can be sampled too.
+
+import sys
+import math
+import os
+import struct
+import tempfile
+import time
+from hashlib import blake2b
+
+from pcap_to_http_json import (
+    KEEP_CONTENT_ENCODING,
+    RUN_TIMESTAMP_MS,
+    discard_keylog,
+    extract_http_from_packets,
+    file_sha256,
+    prepare_keylog,
+    run_tshark,
+)
+
+DEFAULT_SAMPLE_SEED = "ontowebpt"
+
+# pcap: magic -> struct byte order (micro- and nanosecond variants)
+PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": "<",
+    b"\xa1\xb2\xc3\xd4": ">",
+    b"\x4d\x3c\xb2\xa1": "<",
+    b"\xa1\xb2\x3c\x4d": ">",
+}
+PCAPNG_SHB = b"\x0a\x0d\x0d\x0a"
+PCAPNG_BYTE_ORDER_LE = b"\x4d\x3c\x2b\x1a"
+PCAPNG_IDB = 1
+PCAPNG_EPB = 6
+PCAPNG_SPB = 3
+PCAPNG_OPB = 2
+
+# Link-layer types (https://www.tcpdump.org/linktypes.html)
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+# DLT_RAW values used by some BSDs before LINKTYPE_RAW existed
+LINKTYPES_RAW_IP = {LINKTYPE_RAW, 12, 14, LINKTYPE_IPV4, LINKTYPE_IPV6}
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPES_VLAN = {0x8100, 0x88A8, 0x9100}
+IPPROTO_TCP = 6
+
+
+# ---------------------------------------------------------------------------
+# Connection keys
+# ---------------------------------------------------------------------------
+
+def _ip_offset(linktype, data):
+    """Offset of the IP header in a frame of the given link type, or None."""
+    if linktype == LINKTYPE_ETHERNET:
+        offset = 14
+        ethertype = int.from_bytes(data[12:14], "big")
+        while ethertype in ETHERTYPES_VLAN:
+            ethertype = int.from_bytes(data[offset + 2:offset + 4], "big")
+            offset += 4
+        return offset if ethertype in (ETHERTYPE_IPV4, ETHERTYPE_IPV6) else None
+    if linktype in LINKTYPES_RAW_IP:
+        return 0
+    if linktype == LINKTYPE_LINUX_SLL:
+        return 16 if int.from_bytes(data[14:16], "big") in (ETHERTYPE_IPV4, ETHERTYPE_IPV6) else None
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return 20 if int.from_bytes(data[0:2], "big") in (ETHERTYPE_IPV4, ETHERTYPE_IPV6) else None
+    if linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        # 4-byte address family (host or network order): the IP version nibble tells
+        return 4
+    return None
+
+
+def tcp_connection_key(linktype, data):
+    """
+    Direction-independent key of the TCP connection a frame belongs to
+    (addresses and ports of both ends), or None for non-TCP / undecodable frames.
+    """
+    offset = _ip_offset(linktype, data)
+    if offset is None or len(data) < offset + 20:
+        return None
+
+    version = data[offset] >> 4
+    if version == 4:
+        ihl = (data[offset] & 0x0F) * 4
+        if data[offset + 9] != IPPROTO_TCP or int.from_bytes(data[offset + 6:offset + 8], "big") & 0x1FFF:
+            return None  # not TCP, or a non-first fragment (no ports)
+        src, dst = data[offset + 12:offset + 16], data[offset + 16:offset + 20]
+        l4 = offset + ihl
+    elif version == 6:
+        if len(data) < offset + 40 or data[offset + 6] != IPPROTO_TCP:
+            return None  # not TCP (or behind extension headers)
+        src, dst = data[offset + 8:offset + 24], data[offset + 24:offset + 40]
+        l4 = offset + 40
+    else:
+        return None
+
+    if len(data) < l4 + 4:
+        return None
+    a = src + data[l4:l4 + 2]
+    b = dst + data[l4 + 2:l4 + 4]
+    return a + b if a <= b else b + a
+
+
+def connection_selected(key, rate, seed):
+    """Deterministic, uniform selection of `rate` of the connection keys."""
+    digest = blake2b(key, digest_size=8, key=seed.encode("utf-8")[:64]).digest()
+    return int.from_bytes(digest, "big") < rate * 2**64
+
+
+# ---------------------------------------------------------------------------
+# Container filtering
+# ---------------------------------------------------------------------------
+
+class _SampleFilter:
+    """Per-connection keep / drop decisions and sampling counters."""
+
+    def __init__(self, rate, seed):
+        self.rate = rate
+        self.seed = seed
+        self.decisions = {}
+        self.packets_total = 0
+        self.packets_sampled = 0
+        self.frame_map = []  # sampled frame k -> original frame number frame_map[k - 1]
+
+    def keep(self, linktype, data):
+        self.packets_total += 1
+        key = tcp_connection_key(linktype, data) if linktype is not None else None
+        if key is None:
+            return False
+        keep = self.decisions.get(key)
+        if keep is None:
+            keep = self.decisions[key] = connection_selected(key, self.rate, self.seed)
+        if keep:
+            self.packets_sampled += 1
+            self.frame_map.append(self.packets_total)
+        return keep
+
+    def stats(self):
+        sampled = sum(self.decisions.values())
+        return {
+            "connections": {"total": len(self.decisions), "sampled": sampled},
+            "packets": {"total": self.packets_total, "sampled": self.packets_sampled},
+        }
+
+
+def _read_exact(src, n):
+    data = src.read(n)
+    return data if len(data) == n else None
+
+
+def _filter_pcap(src, dst, head, flt):
+    endian = PCAP_MAGICS[head]
+    header = head + (_read_exact(src, 20) or b"")
+    if len(header) < 24:
+        raise ValueError("truncated pcap header")
+    dst.write(header)
+    (linktype,) = struct.unpack(endian + "I", header[20:24])
+    linktype &= 0xFFFF  # upper bits: FCS length flags
+    while True:
+        record = _read_exact(src, 16)
+        if record is None:
+            return  # end of file, or truncated last record (capture still being written)
+        (incl_len,) = struct.unpack(endian + "I", record[8:12])
+        data = _read_exact(src, incl_len)
+        if data is None:
+            return
+        if flt.keep(linktype, data):
+            dst.write(record)
+            dst.write(data)
+
+
+def _filter_pcapng(src, dst, head, flt):
+    endian = "<"
+    linktypes = []  # interface id -> link type, per section
+    header = head + src.read(8)
+    while len(header) == 12:
+        if header[:4] == PCAPNG_SHB:
+            # each section header carries its own byte order and interface list
+            endian = "<" if header[8:12] == PCAPNG_BYTE_ORDER_LE else ">"
+            linktypes = []
+        block_type, length = struct.unpack(endian + "II", header[:8])
+        if length < 12 or length % 4:
+            raise ValueError("corrupt pcapng block")
+        rest = _read_exact(src, length - 12)
+        if rest is None:
+            return  # truncated last block (capture still being written)
+        body = header[8:] + rest
+
+        if block_type == PCAPNG_IDB:
+            (linktype,) = struct.unpack(endian + "H", body[:2])
+            linktypes.append(linktype)
+        elif block_type in (PCAPNG_EPB, PCAPNG_SPB, PCAPNG_OPB):
+            if block_type == PCAPNG_SPB:
+                interface, data = 0, body[4:-4]
+            else:
+                if block_type == PCAPNG_EPB:
+                    (interface,) = struct.unpack(endian + "I", body[:4])
+                else:
+                    (interface,) = struct.unpack(endian + "H", body[:2])
+                (caplen,) = struct.unpack(endian + "I", body[12:16])
+                data = body[20:20 + caplen]
+            linktype = linktypes[interface] if interface < len(linktypes) else None
+            if not flt.keep(linktype, data):
+                header = src.read(12)
+                continue
+        dst.write(header)
+        dst.write(rest)
+        header = src.read(12)
+
+
+def sample_capture(src, dst, rate, seed=DEFAULT_SAMPLE_SEED):
+    """
+    Copy the selected TCP connections of the capture read from `src` into `dst`
+    (same container format). Returns (stats, frame_map) where frame_map[k - 1]
+    is the original number of sampled frame k, or (None, None) when the
+    container is not pcap / pcapng (e.g. compressed).
+    """
+    head = src.read(4)
+    flt = _SampleFilter(rate, seed)
+    if head in PCAP_MAGICS:
+        container = "pcap"
+        _filter_pcap(src, dst, head, flt)
+    elif head == PCAPNG_SHB:
+        container = "pcapng"
+        _filter_pcapng(src, dst, head, flt)
+    else:
+        return None, None
+    stats = flt.stats()
+    stats["container"] = container
+    return stats, flt.frame_map
+
+
+# ---------------------------------------------------------------------------
+# Extrapolation
+# ---------------------------------------------------------------------------
+
+def _host_of(req):
+    uri = req.get("uri") or {}
+    return uri.get("authority") or (req.get("connection") or {}).get("authority") or "(unknown)"
+
+
+def _count(requests, key):
+    counts = {}
+    for req in requests:
+        k = key(req)
+        counts[k] = counts.get(k, 0) + 1
+    return dict(sorted(counts.items(), key=lambda kv: (-kv[1], kv[0])))
+
+
+def extrapolate(requests, provenance, connections_total, connections_sampled):
+    """
+    Observed and extrapolated totals for the sampled requests.
+
+    Connections are the sampling unit, so every count is scaled by
+    total / sampled connections. The standard error of the total request count
+    treats the sample as a simple random sample of connections (cluster sampling).
+    """
+    observed = {
+        "requests": len(requests),
+        "byHost": _count(requests, _host_of),
+        "byStatus": _count(requests, lambda r: str(r["response"].get("statusCode"))),
+    }
+    if not connections_sampled:
+        return observed, {"requests": None, "requestsStdErr": None, "byHost": {}, "byStatus": {}}
+
+    scale = connections_total / connections_sampled
+    per_connection = {}
+    for req in requests:
+        stream = (provenance.get(req["id"]) or {}).get("tcp_stream")
+        per_connection[stream] = per_connection.get(stream, 0) + 1
+    counts = list(per_connection.values())
+    counts += [0] * max(0, connections_sampled - len(counts))
+    n = len(counts)
+    mean = sum(counts) / n
+    variance = sum((c - mean) ** 2 for c in counts) / (n - 1) if n > 1 else 0.0
+    fpc = max(0.0, 1 - n / connections_total)
+    std_err = connections_total * math.sqrt(fpc * variance / n)
+
+    estimate = {
+        "requests": round(len(requests) * scale),
+        "requestsStdErr": round(std_err, 1),
+        "byHost": {k: round(v * scale) for k, v in observed["byHost"].items()},
+        "byStatus": {k: round(v * scale) for k, v in observed["byStatus"].items()},
+        "statusShare": {k: round(v / len(requests), 4) for k, v in observed["byStatus"].items()} if requests else {},
+    }
+    return observed, estimate
+
+
+def cap_per_host(requests, per_host):
+    """Keep the first `per_host` requests (capture order) of every authority."""
+    seen = {}
+    kept = []
+    for req in requests:
+        host = _host_of(req)
+        if seen.get(host, 0) < per_host:
+            seen[host] = seen.get(host, 0) + 1
+            kept.append(req)
+    return kept
+
+
+def _restore_frame_numbers(tshark_data, frame_map):
+    """Rewrite frame numbers of the sample to those of the original capture."""
+    def original(value):
+        try:
+            k = int(value)
+        except (TypeError, ValueError):
+            return value
+        return str(frame_map[k - 1]) if 0 < k <= len(frame_map) else value
+
+    for pkt in tshark_data:
+        layers = pkt.get("_source", {}).get("layers", {})
+        for field in ("frame.number", "http.request_in"):
+            if field in layers:
+                layers[field] = [original(v) for v in layers[field]]
+
+
+# ---------------------------------------------------------------------------
+# Preview
+# ---------------------------------------------------------------------------
+
+def sample_conversion(
+    pcap_path,
+    sslkeys_path,
+    rate,
+    seed=DEFAULT_SAMPLE_SEED,
+    per_host=None,
+    prune_keylog=True,
+    keep_encoding=KEEP_CONTENT_ENCODING,
+):
+    """
+    Convert a deterministic sample of the TCP connections of a capture.
+
+    Returns a dict:
+      {
+        "sample":   { rate, seed, container, connections, packets, elapsedMs },
+        "observed": { requests, byHost, byStatus },
+        "estimate": { requests, requestsStdErr, byHost, byStatus, statusShare },
+        "requests": [HttpRequest, ...]   # requests with a response, optionally capped per host
+      }
+    Containers that cannot be filtered (e.g. compressed) are converted in full;
+    the totals are then exact (rate 1.0).
+    """
+    t0 = time.perf_counter()
+    fd, tmp_path = tempfile.mkstemp(suffix=".pcap-sample")
+    keylog = sslkeys_path
+    try:
+        with os.fdopen(fd, "wb") as dst:
+            if pcap_path == "-":
+                stats, frame_map = sample_capture(sys.stdin.buffer, dst, rate, seed)
+            else:
+                with open(pcap_path, "rb", buffering=1024 * 1024) as src:
+                    stats, frame_map = sample_capture(src, dst, rate, seed)
+
+        if stats is None:
+            if pcap_path == "-":
+                raise RuntimeError("--sample on stdin needs a pcap / pcapng capture")
+            print("[DEBUG] Capture cannot be sampled (not pcap / pcapng), converting it in full", file=sys.stderr)
+            rate, source = 1.0, pcap_path
+        else:
+            conns, pkts = stats["connections"], stats["packets"]
+            print(
+                f"[DEBUG] Sampled {conns['sampled']}/{conns['total']} TCP connections, "
+                f"{pkts['sampled']}/{pkts['total']} packets in {time.perf_counter() - t0:.3f}s",
+                file=sys.stderr,
+            )
+            source = tmp_path
+
+        if prune_keylog and stats is not None:
+            keylog = prepare_keylog(source, sslkeys_path, file_sha256(source))
+        tshark_data = []
+        if stats is None or stats["packets"]["sampled"]:
+            tshark_data = run_tshark(source, keylog, keep_encoding=keep_encoding)
+    finally:
+        discard_keylog(keylog, sslkeys_path)
+        os.remove(tmp_path)
+
+    if frame_map:
+        _restore_frame_numbers(tshark_data, frame_map)
+
+    provenance = {}
+    http_requests = extract_http_from_packets(
+        tshark_data, run_scope=f"{RUN_TIMESTAMP_MS}-sample", provenance=provenance
+    )
+    with_response = [req for req in http_requests if "response" in req]
+
+    if stats is None:
+        streams = {p.get("tcp_stream") for p in provenance.values()}
+        stats = {"container": None, "connections": {"total": len(streams), "sampled": len(streams)}}
+    observed, estimate = extrapolate(
+        with_response, provenance, stats["connections"]["total"], stats["connections"]["sampled"]
+    )
+
+    stats.update({"rate": rate, "seed": seed, "elapsedMs": round((time.perf_counter() - t0) * 1000)})
+    return {
+        "sample": stats,
+        "observed": observed,
+        "estimate": estimate,
+        "requests": cap_per_host(with_response, per_host) if per_host else with_response,
+    }
@@ -11,18 +11,106 @@
 #     - build HttpRequest objects from request packets
 #     - attach response metadata/body when a matching response packet is found
 #  4. Print a JSON array of HttpRequest objects to stdout.
+#
+# Request IDs:
+#  - "run" mode (default): derived from a per-run timestamp, so converting the
+#    same capture twice yields new IDs.
+#  - "content" mode (--id-mode content or PCAP_ID_MODE=content): derived from a
+#    digest of the capture file plus tcp.stream / frame.number / HTTP/2 stream id,
+#    so re-converting the same capture yields the same IDs (and the same IRIs
+#    once ingested, which makes re-ingestion idempotent).
+#
+# Streaming input:
+#  - pcap_path "-" reads the capture from stdin and hands it to tshark as
+#    "-r -", so conversion starts while the upload is still arriving
+#    (routes/pcap.js pipes the multipart stream straight in). The keylog is
+#    still a (small) file. Keylog pruning needs a second pass over the capture
+#    and is skipped in this mode.
+#
+# Batch mode (--batch / --manifest):
+#  - many captures (globs, directories, manifest entries) in one interpreter;
+#    their tshark processes run concurrently as asyncio subprocesses, at most
+#    --jobs at a time (default: usable CPUs).
+#  - output is JSON Lines, one record per capture, written as soon as that
+#    capture is done: {"index", "pcap", "sslkeys", "requests"} or {..., "error"}.
+#
+# Sidecar index (--index):
+#  - also writes <capture>.owpt-index.sqlite (see pcap_index.py), so later
+#    lookups by host / path / status / tcp stream do not re-run tshark.
+#
+# Content encoding (--keep-encoding or PCAP_KEEP_CONTENT_ENCODING=true):
+#  - HTTP/1.x bodies are exported as sent (e.g. still gzip / br compressed)
+#    instead of being inflated by tshark, hex-dumped and base64-expanded; the
+#    response then carries "contentEncoding" (e.g. "gzip", "gzip, br") and a
+#    content-encoding header, and consumers decompress only if they need to.
+#  - HTTP/2 bodies (http2.body.reassembled.data) are the reassembled DATA
+#    payload, so a response with a Content-Encoding is marked in both modes.
+#
+# Preview (--sample [RATE], --sample-per-host N):
+#  - converts only a deterministic sample of the TCP connections (see
+#    pcap_sample.py) and prints one JSON object instead of the array:
+#    {"sample", "observed", "estimate", "requests"}, with totals per host and
+#    per status extrapolated to the whole capture.
+#
+# Inventory (--inventory):
+#  - streams tshark field output through an aggregator (see pcap_inventory.py)
+#    and prints one JSON object with the endpoints (authority, method, path
+#    template with numeric / UUID segments collapsed), their parameter names,
+#    status codes and counts, instead of the request array.
+#
+# Bulk RDF (--rdf-out DIR [--rdf-format nq|nt]):
+#  - writes the ontology triples of the converted requests (the same ones the
+#    /http-requests/ingest-http path inserts) as gzip-compressed N-Quads /
+#    N-Triples chunk files for GraphDB bulk loading, see pcap_rdf.py; stdout
+#    then carries a manifest of the files instead of the request array.
 
 import sys
 import json
 import subprocess
 from urllib.parse import urlparse, parse_qsl
 import os
+import argparse
+import asyncio
 import base64
+import glob
+import hashlib
+import re
+import shlex
+import tempfile
+import threading
 import time
 
+# Optional fast JSON codec: orjson when installed, stdlib json otherwise.
+# Both produce the same JSON document (orjson is compact and emits UTF-8
+# instead of \u escapes; the consumer parses it with JSON.parse either way).
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
 # Single timestamp used to generate stable-ish IDs for all requests in this run.
 RUN_TIMESTAMP_MS = int(time.time() * 1000)
 
+ID_MODES = ("run", "content")
+
+
+def json_codec_name():
+    return "orjson" if orjson is not None else "json"
+
+
+def json_loads(data):
+    """Decode JSON from bytes or str with the fastest available codec."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps_bytes(obj):
+    """Encode `obj` as UTF-8 JSON bytes with the fastest available codec."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
 
 def first_or_none(value):
     """
@@ -142,6 +230,16 @@ def build_uri_struct(full_url, scheme_hint=None, authority_hint=None, path_hint=
     return uri_obj
 
 
+def content_encoding_marker(value):
+    """
+    Normalize a Content-Encoding header value ("GZIP, br" -> "gzip, br").
+    Returns None when the body is not encoded (missing / identity).
+    """
+    codings = [c.strip().lower() for c in str(value or "").split(",")]
+    codings = [c for c in codings if c and c != "identity"]
+    return ", ".join(codings) or None
+
+
 def normalize_headers(headers):
     """
     Normalize an iterable of header dicts into the canonical format:
@@ -164,16 +262,222 @@ def normalize_headers(headers):
     return out
 
 
-def run_tshark(pcap_path, sslkeys_path):
+def file_sha256(path):
     """
-    Run tshark on the provided PCAP file, using the TLS key log file
-    to decrypt HTTP/1.1 and HTTP/2 traffic, and export selected fields as JSON.
+    Return the sha256 (hex) of a file's contents.
+    The capture digest scopes IDs in "content" mode (first 16 chars: the same capture
+    always maps to the same IDs) and keys the keylog pruning cache.
     """
-    tshark_bin = os.getenv("TSHARK_BIN", "tshark")
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
 
+
+# ---------------------------------------------------------------------------
+# Keylog pruning
+#
+# Browser SSLKEYLOGFILEs accumulate every TLS session ever opened. Before the
+# decrypting tshark run, keep only the NSS keylog lines whose client random
+# matches a ClientHello in this capture. Only the randoms found in a capture
+# (public handshake values) are cached on disk, keyed by the capture digest;
+# the pruned keylog holds TLS secrets and lives in a private per-run temp file.
+# ---------------------------------------------------------------------------
+
+KEYLOG_CACHE_DIR = os.getenv("PCAP_KEYLOG_CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), "ontowebpt-keylog-cache"
+)
+KEYLOG_CACHE_TTL_S = float(os.getenv("PCAP_KEYLOG_CACHE_TTL_HOURS") or 24 * 7) * 3600
+
+
+def _private_cache_dir(cache_dir):
+    """Create `cache_dir` as 0700 (or tighten it if it already exists and is ours)."""
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    st = os.stat(cache_dir)
+    if hasattr(os, "getuid") and st.st_uid != os.getuid():
+        raise RuntimeError(f"keylog cache {cache_dir} is owned by another user")
+    if st.st_mode & 0o077:
+        os.chmod(cache_dir, 0o700)
+
+
+def _write_private(path, text):
+    """Atomically write `text` to `path` as a 0600 file."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="ascii") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def evict_keylog_cache(cache_dir, ttl_s=KEYLOG_CACHE_TTL_S):
+    """
+    Drop cache entries not used for `ttl_s` seconds, plus any pruned keylog
+    left there by earlier versions (they held TLS secrets).
+    """
+    now = time.time()
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            if name.endswith(".keylog") or now - os.stat(path).st_mtime > ttl_s:
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+def extract_client_randoms(pcap_path):
+    """
+    Run a lightweight tshark pass (no decryption, no HTTP reassembly) that lists
+    the `tls.handshake.random` of every ClientHello in the capture.
+    Returns a set of lower-case hex strings.
+    """
+    tshark_bin = os.getenv("TSHARK_BIN", "tshark")
     cmd = [
         tshark_bin,
         "-r", pcap_path,
+        "-Y", "tls.handshake.type == 1",
+        "-T", "fields",
+        "-e", "tls.handshake.random",
+    ]
+    print(f"[DEBUG] Running: {' '.join(cmd)}", file=sys.stderr)
+    try:
+        result = subprocess.run(cmd, capture_output=True)
+    except FileNotFoundError as e:
+        raise RuntimeError(f"Cannot find tshark binary '{tshark_bin}': {e}")
+    if result.returncode != 0:
+        stderr = result.stderr.decode("utf-8", errors="replace")
+        raise RuntimeError(f"tshark (ClientHello pass) failed with code {result.returncode}: {stderr}")
+
+    randoms = set()
+    for line in result.stdout.decode("ascii", errors="ignore").splitlines():
+        # several ClientHellos in one frame are comma-separated; bytes may be ':'-separated
+        for value in line.split(","):
+            value = value.strip().replace(":", "").lower()
+            if value:
+                randoms.add(value)
+    return randoms
+
+
+def prune_keylog(sslkeys_path, randoms, out_path):
+    """
+    Write to `out_path` the keylog lines whose client random (2nd field) is in `randoms`.
+    Lines not keyed by a client random (e.g. "RSA ...") are kept as-is; comments are dropped.
+    Returns (kept, total) line counts.
+    """
+    kept = total = 0
+    fd = os.open(out_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with open(sslkeys_path, "r", encoding="ascii", errors="ignore") as src, os.fdopen(fd, "w", encoding="ascii") as dst:
+        for line in src:
+            stripped = line.strip()
+            if not stripped or stripped.startswith("#"):
+                continue
+            total += 1
+            parts = stripped.split()
+            if parts[0] == "RSA" or len(parts) != 3 or parts[1].lower() in randoms:
+                dst.write(stripped + "\n")
+                kept += 1
+    return kept, total
+
+
+def prepare_keylog(pcap_path, sslkeys_path, capture_sha, cache_dir=KEYLOG_CACHE_DIR):
+    """
+    Return the path of a keylog pruned to the TLS sessions of the capture: a
+    private (0600) temp file the caller removes with discard_keylog(). The
+    ClientHello randoms are cached per capture digest, so re-converting a
+    capture skips the pre-pass. Falls back to the original keylog on any error.
+    """
+    try:
+        randoms = None
+        randoms_path = None
+        try:
+            _private_cache_dir(cache_dir)
+            evict_keylog_cache(cache_dir)
+            randoms_path = os.path.join(cache_dir, f"{capture_sha}.randoms")
+            with open(randoms_path, "r", encoding="ascii") as f:
+                randoms = {line.strip() for line in f if line.strip()}
+            os.utime(randoms_path)  # keep entries in use away from the TTL
+            print(f"[DEBUG] ClientHello randoms cache hit: {randoms_path}", file=sys.stderr)
+        except FileNotFoundError:
+            pass
+        except (OSError, RuntimeError) as e:
+            print(f"[DEBUG] Keylog cache unavailable ({e})", file=sys.stderr)
+            randoms_path = None
+        if randoms is None:
+            randoms = extract_client_randoms(pcap_path)
+            if randoms_path:
+                _write_private(randoms_path, "".join(f"{r}\n" for r in sorted(randoms)))
+
+        fd, pruned_path = tempfile.mkstemp(prefix="ontowebpt-keylog-", suffix=".keylog")
+        os.close(fd)
+        try:
+            kept, total = prune_keylog(sslkeys_path, randoms, pruned_path)
+        except Exception:
+            os.unlink(pruned_path)
+            raise
+        print(
+            f"[DEBUG] Pruned keylog: kept {kept}/{total} lines for {len(randoms)} ClientHello(s) -> {pruned_path}",
+            file=sys.stderr,
+        )
+        return pruned_path
+    except Exception as e:
+        print(f"[DEBUG] Keylog pruning skipped ({e}), using the full keylog", file=sys.stderr)
+        return sslkeys_path
+
+
+def discard_keylog(keylog_path, sslkeys_path):
+    """Remove the pruned keylog returned by prepare_keylog (never the original)."""
+    if keylog_path and keylog_path != sslkeys_path:
+        try:
+            os.unlink(keylog_path)
+        except OSError:
+            pass
+
+
+def _run_teeing_stdin(cmd, sink, chunk_size=1024 * 1024):
+    """
+    Run `cmd` feeding it our stdin, while passing every chunk to `sink.update`
+    (e.g. a hashlib object). Returns (returncode, stdout_bytes, stderr_bytes).
+    """
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = [], []
+    readers = [
+        threading.Thread(target=lambda: out.append(proc.stdout.read()), daemon=True),
+        threading.Thread(target=lambda: err.append(proc.stderr.read()), daemon=True),
+    ]
+    for r in readers:
+        r.start()
+    try:
+        for chunk in iter(lambda: sys.stdin.buffer.read(chunk_size), b""):
+            sink.update(chunk)
+            proc.stdin.write(chunk)
+    except BrokenPipeError:
+        # tshark stopped reading (bad capture): its exit code / stderr explain why
+        pass
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+    for r in readers:
+        r.join()
+    proc.wait()
+    return proc.returncode, b"".join(out), b"".join(err)
+
+
+KEEP_CONTENT_ENCODING = os.getenv("PCAP_KEEP_CONTENT_ENCODING", "false").lower() == "true"
+
+
+def tshark_dissect_options(pcap_path, sslkeys_path, keep_encoding=False):
+    """
+    Common part of the tshark command lines: input, TLS decryption with the
+    key log file, reassembly preferences and the HTTP display filter.
+    The caller appends the output format (-T) and the exported fields (-e).
+    """
+    tshark_bin = os.getenv("TSHARK_BIN", "tshark")
+
+    return [
+        tshark_bin,
+        "-r", pcap_path,
 
         # TLS decryption
         "-o", f"tls.keylog_file:{sslkeys_path}",
@@ -188,12 +492,25 @@ def run_tshark(pcap_path, sslkeys_path):
         "-o", "http.desegment_headers:TRUE",
         "-o", "http.desegment_body:TRUE",
         "-o", "http.dechunk_body:TRUE",
-        "-o", "http.decompress_body:TRUE",
+        "-o", f"http.decompress_body:{'FALSE' if keep_encoding else 'TRUE'}",
 
         "-o", "tcp.reassemble_out_of_order:TRUE",
 
         # Broad display filter: capture every packet with http or http2.
         "-Y", "http || http2",
+    ]
+
+
+def tshark_command(pcap_path, sslkeys_path, keep_encoding=False):
+    """
+    Build the tshark command line that decrypts HTTP/1.1 and HTTP/2 traffic
+    with the TLS key log file and exports selected fields as JSON.
+
+    With `keep_encoding`, HTTP/1.x bodies are not decompressed and
+    http.content_encoding is exported: its presence is what marks a body as
+    still encoded (see attach_http1_response).
+    """
+    cmd = tshark_dissect_options(pcap_path, sslkeys_path, keep_encoding) + [
         "-T", "json",
 
         # Common fields
@@ -244,43 +561,104 @@ def run_tshark(pcap_path, sslkeys_path):
         "-e", "http2.headers.set_cookie",
         "-e", "http2.headers.location",
         "-e", "http2.headers.content_length",
+        "-e", "http2.headers.content_encoding",
 
         # HTTP/2 body (if available)
         "-e", "http2.body.reassembled.data",
     ]
+    if keep_encoding:
+        cmd += ["-e", "http.content_encoding"]
+    return cmd
+
+
+def decode_tshark_output(returncode, stdout, stderr, label=""):
+    """
+    Check the tshark exit status and decode its JSON stdout into a list of packets.
+    Raises RuntimeError on failure.
+    """
+    if returncode != 0:
+        stderr = stderr.decode("utf-8", errors="replace")
+        raise RuntimeError(f"tshark failed with code {returncode}: {stderr}")
+
+    if not stdout.strip():
+        print(f"[DEBUG] {label}tshark returned empty stdout", file=sys.stderr)
+        return []
+
+    t0 = time.perf_counter()
+    try:
+        data = json_loads(stdout)
+    except ValueError as e:
+        # json.JSONDecodeError and orjson.JSONDecodeError are both ValueError subclasses
+        raise RuntimeError(f"Failed to decode JSON from tshark: {e}")
+
+    print(
+        f"[DEBUG] {label}tshark returned {len(data)} packets "
+        f"({len(stdout)} bytes decoded in {time.perf_counter() - t0:.3f}s with {json_codec_name()})",
+        file=sys.stderr,
+    )
+    return data
+
+
+def run_tshark(pcap_path, sslkeys_path, stdin_hash=None, keep_encoding=KEEP_CONTENT_ENCODING):
+    """
+    Run tshark on the provided PCAP file, using the TLS key log file
+    to decrypt HTTP/1.1 and HTTP/2 traffic, and export selected fields as JSON.
+
+    With pcap_path "-" tshark reads the capture from our stdin. If `stdin_hash`
+    is given, the stream is copied through it (digest for content-derived IDs);
+    otherwise tshark inherits stdin directly.
+    """
+    cmd = tshark_command(pcap_path, sslkeys_path, keep_encoding)
+    tshark_bin = cmd[0]
 
     print(f"[DEBUG] Running: {' '.join(cmd)}", file=sys.stderr)
 
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        # Raw bytes: orjson parses them directly, without an intermediate str.
+        if pcap_path == "-" and stdin_hash is not None:
+            returncode, stdout, stderr = _run_teeing_stdin(cmd, stdin_hash)
+        else:
+            result = subprocess.run(cmd, capture_output=True)
+            returncode, stdout, stderr = result.returncode, result.stdout, result.stderr
     except FileNotFoundError as e:
         raise RuntimeError(f"Cannot find tshark binary '{tshark_bin}': {e}")
     except Exception as e:
         raise RuntimeError(f"Error executing tshark: {e}")
 
-    if result.returncode != 0:
-        raise RuntimeError(f"tshark failed with code {result.returncode}: {result.stderr}")
+    return decode_tshark_output(returncode, stdout, stderr)
 
-    if not result.stdout.strip():
-        print("[DEBUG] tshark returned empty stdout", file=sys.stderr)
-        return []
 
+async def run_tshark_async(pcap_path, sslkeys_path, label="", keep_encoding=KEEP_CONTENT_ENCODING):
+    """Asyncio variant of run_tshark (file input only), used by batch mode."""
+    cmd = tshark_command(pcap_path, sslkeys_path, keep_encoding)
+    print(f"[DEBUG] {label}Running: {' '.join(cmd)}", file=sys.stderr)
     try:
-        data = json.loads(result.stdout)
-    except json.JSONDecodeError as e:
-        raise RuntimeError(f"Failed to decode JSON from tshark: {e}")
-
-    print(f"[DEBUG] tshark returned {len(data)} packets", file=sys.stderr)
-    return data
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except FileNotFoundError as e:
+        raise RuntimeError(f"Cannot find tshark binary '{cmd[0]}': {e}")
+    stdout, stderr = await proc.communicate()
+    # parsing the JSON off the event loop keeps the other captures' pipes draining
+    return await asyncio.to_thread(decode_tshark_output, proc.returncode, stdout, stderr, label)
 
 
-def http_request_from_layers(layers):
+def http_request_from_layers(layers, capture_id=None, run_scope=None):
     """
     Convert a single tshark JSON record (`layers` section) into an HttpRequest dict
     compatible with the Node schema.
 
     If the packet does not represent an HTTP request, return (None, None).
 
+    `capture_id` selects the ID scheme:
+      - None   : pcap-<proto>-<RUN_TIMESTAMP_MS>-<frame>[-s<streamid>]
+                 (`run_scope`, when given, replaces RUN_TIMESTAMP_MS: batch mode
+                 scopes it per capture so frame numbers of different files do not collide)
+      - digest : pcap-<proto>-<digest>-<tcp.stream>-<frame>[-s<streamid>] (content-derived)
+
     Returns:
       (key, http_request) where:
         - key is used to match the corresponding response:
@@ -398,8 +776,11 @@ def http_request_from_layers(layers):
         # Not an HTTP request of interest.
         return None, None
 
-    # Build a stable-ish ID for the request.
-    base_id = f"pcap-{protocol}-{RUN_TIMESTAMP_MS}-{frame_no}"
+    # Build a stable-ish ID for the request (stable across runs with a capture_id).
+    if capture_id:
+        base_id = f"pcap-{protocol}-{capture_id}-{tcp_stream if tcp_stream is not None else 'x'}-{frame_no}"
+    else:
+        base_id = f"pcap-{protocol}-{run_scope or RUN_TIMESTAMP_MS}-{frame_no}"
     if protocol == "http2" and h2_streamid:
         base_id += f"-s{h2_streamid}"
 
@@ -430,7 +811,8 @@ def attach_http1_response(req, layers):
         "httpVersion": ...,
         "reasonPhrase": ...,
         "responseHeaders": [...],
-        "body": "<base64-encoded payload>"
+        "body": "<base64-encoded payload>",
+        "contentEncoding": "gzip"   # only when the body is still encoded
       }
     """
     status_code = first_or_none(layers.get("http.response.code"))
@@ -443,6 +825,8 @@ def attach_http1_response(req, layers):
     content_type = first_or_none(layers.get("http.content_type"))
     location = first_or_none(layers.get("http.location"))
     content_length = first_or_none(layers.get("http.content_length_header"))
+    # only exported when tshark keeps bodies encoded (tshark_command keep_encoding)
+    content_encoding = first_or_none(layers.get("http.content_encoding"))
     set_cookie_all = as_list(layers.get("http.set_cookie"))
 
     headers = []
@@ -454,6 +838,8 @@ def attach_http1_response(req, layers):
         headers.append({"name": "location", "value": location})
     if content_length:
         headers.append({"name": "content-length", "value": content_length})
+    if content_encoding:
+        headers.append({"name": "content-encoding", "value": content_encoding})
     for sc in set_cookie_all:
         if sc:
             headers.append({"name": "set-cookie", "value": sc})
@@ -464,6 +850,9 @@ def attach_http1_response(req, layers):
     }
     if reason:
         resp_obj["reasonPhrase"] = reason
+    marker = content_encoding_marker(content_encoding)
+    if marker:
+        resp_obj["contentEncoding"] = marker
 
     norm_headers = normalize_headers(headers)
     if norm_headers:
@@ -486,7 +875,8 @@ def attach_http2_response(req, layers):
         "statusCode": ...,
         "httpVersion": "HTTP/2",
         "responseHeaders": [...],
-        "body": "<base64-encoded payload>"
+        "body": "<base64-encoded payload>",
+        "contentEncoding": "br"     # when the response declares a Content-Encoding
       }
     """
     status_code = first_or_none(layers.get("http2.headers.status"))
@@ -497,6 +887,7 @@ def attach_http2_response(req, layers):
     content_type = first_or_none(layers.get("http2.headers.content_type"))
     location = first_or_none(layers.get("http2.headers.location"))
     content_length = first_or_none(layers.get("http2.headers.content_length"))
+    content_encoding = first_or_none(layers.get("http2.headers.content_encoding"))
     set_cookie_all = as_list(layers.get("http2.headers.set_cookie"))
 
     headers = []
@@ -508,6 +899,8 @@ def attach_http2_response(req, layers):
         headers.append({"name": "location", "value": location})
     if content_length:
         headers.append({"name": "content-length", "value": content_length})
+    if content_encoding:
+        headers.append({"name": "content-encoding", "value": content_encoding})
     for sc in set_cookie_all:
         if sc:
             headers.append({"name": "set-cookie", "value": sc})
@@ -516,6 +909,9 @@ def attach_http2_response(req, layers):
         "statusCode": int(status_code),
         "httpVersion": "HTTP/2",
     }
+    marker = content_encoding_marker(content_encoding)
+    if marker:
+        resp_obj["contentEncoding"] = marker
 
     norm_headers = normalize_headers(headers)
     if norm_headers:
@@ -529,13 +925,31 @@ def attach_http2_response(req, layers):
     req["response"] = resp_obj
 
 
-def extract_http_from_packets(tshark_data):
+def extract_http_from_packets(tshark_data, capture_id=None, run_scope=None, provenance=None):
     """
     Single pass over the list of tshark packets to build HttpRequest objects.
+    `capture_id` / `run_scope` are forwarded to http_request_from_layers (ID scheme).
+    If `provenance` is a dict, it is filled with request id -> {"protocol", "frame",
+    "last_frame", "tcp_stream", "h2_stream"} (frames of the request and of its
+    response), used by the sidecar index (pcap_index.py).
     Returns: List of HttpRequest dicts (some may have a "response" field, some may not).
     """
     requests_map = {}
 
+    def as_int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def touch(req, layers):
+        if provenance is None:
+            return
+        frame = as_int(first_or_none(layers.get("frame.number")))
+        entry = provenance.get(req["id"])
+        if entry is not None and frame is not None:
+            entry["last_frame"] = max(entry["last_frame"] or frame, frame)
+
     pending_http1_body = {}  # key ("http1", req_frame) -> body_b64
     pending_http2_body = {}  # key ("http2", tcp_stream, streamid) -> body_b64
 
@@ -548,9 +962,18 @@ def extract_http_from_packets(tshark_data):
         layers = pkt.get("_source", {}).get("layers", {})
 
         # 1) If it is a request, create it.
-        key, req_obj = http_request_from_layers(layers)
+        key, req_obj = http_request_from_layers(layers, capture_id, run_scope)
         if key and req_obj and key not in requests_map:
             requests_map[key] = req_obj
+            if provenance is not None:
+                frame = as_int(first_or_none(layers.get("frame.number")))
+                provenance[req_obj["id"]] = {
+                    "protocol": key[0],
+                    "frame": frame,
+                    "last_frame": frame,
+                    "tcp_stream": as_int(first_or_none(layers.get("tcp.stream"))),
+                    "h2_stream": as_int(first_or_none(layers.get("http2.streamid"))) if key[0] == "http2" else None,
+                }
 
         # ---------------------------
         # HTTP/1.x response handling
@@ -563,6 +986,8 @@ def extract_http_from_packets(tshark_data):
             # body might appear even when http.response.code is missing on that frame
             body_b64 = byte_sequence_field_to_base64(layers.get("http.file_data"))
             if body_b64:
+                if req is not None:
+                    touch(req, layers)
                 if req is not None and "response" in req:
                     # attach immediately if response already exists
                     if "body" not in req["response"]:
@@ -578,6 +1003,7 @@ def extract_http_from_packets(tshark_data):
                 k = ("http1", req_frame)
                 req = requests_map.get(k)
                 if req is not None:
+                    touch(req, layers)
                     attach_http1_response(req, layers)
                     # if we collected a pending body on other frames, attach it now
                     pending = pending_http1_body.get(k)
@@ -595,6 +1021,8 @@ def extract_http_from_packets(tshark_data):
         if body2_b64 and tcp_stream is not None:
             k2 = ("http2", tcp_stream, streamid)
             req2 = requests_map.get(k2)
+            if req2 is not None:
+                touch(req2, layers)
             if req2 is not None and "response" in req2:
                 if "body" not in req2["response"]:
                     req2["response"]["body"] = body2_b64
@@ -606,6 +1034,7 @@ def extract_http_from_packets(tshark_data):
             k2 = ("http2", tcp_stream, streamid)
             req2 = requests_map.get(k2)
             if req2 is not None:
+                touch(req2, layers)
                 attach_http2_response(req2, layers)
                 pending = pending_http2_body.get(k2)
                 if pending and "body" not in req2.get("response", {}):
@@ -614,39 +1043,451 @@ def extract_http_from_packets(tshark_data):
     return list(requests_map.values())
 
 
+# ---------------------------------------------------------------------------
+# Batch mode
+# ---------------------------------------------------------------------------
+
+# Rotated captures: capture.pcap, capture.pcap1 (tcpdump -C), ring_00001_....pcapng, *.pcap.gz
+CAPTURE_FILE_RE = re.compile(r"\.(pcap|pcapng|cap)\d*(\.gz)?$", re.IGNORECASE)
+
+
+def default_jobs():
+    """Number of CPUs this process may run on (tshark is mostly single-threaded)."""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def read_manifest(manifest_path):
+    """
+    Parse a batch manifest: one capture per line, `<pcap_path> [<sslkeys_path>]`
+    (shell-style quoting allowed, '#' starts a comment). Relative paths are
+    resolved against the manifest's directory.
+    Returns a list of (pcap_path, sslkeys_path or None).
+    """
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    entries = []
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            fields = shlex.split(line, comments=True)
+            if not fields:
+                continue
+            if len(fields) > 2:
+                raise ValueError(f"{manifest_path}:{lineno}: expected '<pcap_path> [<sslkeys_path>]'")
+            paths = [os.path.join(base, p) for p in fields]
+            entries.append((paths[0], paths[1] if len(paths) > 1 else None))
+    return entries
+
+
+def expand_batch_inputs(patterns, manifests, shared_keylog):
+    """
+    Resolve --batch patterns (file, directory or glob) and --manifest files into
+    an ordered, de-duplicated list of (pcap_path, sslkeys_path).
+    Entries without a per-file keylog use `shared_keylog`.
+    """
+    entries = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            names = sorted(n for n in os.listdir(pattern) if CAPTURE_FILE_RE.search(n))
+            entries.extend((os.path.join(pattern, n), None) for n in names)
+        elif glob.has_magic(pattern):
+            entries.extend((p, None) for p in sorted(glob.glob(pattern, recursive=True)) if os.path.isfile(p))
+        else:
+            entries.append((pattern, None))
+    for manifest_path in manifests:
+        entries.extend(read_manifest(manifest_path))
+
+    seen = set()
+    resolved = []
+    for pcap_path, sslkeys_path in entries:
+        real = os.path.realpath(pcap_path)
+        if real in seen:
+            continue
+        seen.add(real)
+        resolved.append((pcap_path, sslkeys_path or shared_keylog))
+    return resolved
+
+
+async def convert_capture_async(index, pcap_path, sslkeys_path, args, limit):
+    """
+    Convert one capture of a batch. Returns its output record; failures are
+    reported in the record ("error") instead of aborting the batch.
+    Every step runs under `limit` and the CPU-bound ones in worker threads, so
+    --jobs bounds both the parallel tshark runs and the packet trees in memory.
+    """
+    label = f"[{index}] "
+    record = {"index": index, "pcap": pcap_path, "sslkeys": sslkeys_path}
+    if not sslkeys_path:
+        record["error"] = "no keylog (use --keylog or a second manifest column)"
+        print(f"[ERROR] {label}{pcap_path}: {record['error']}", file=sys.stderr)
+        return record
+    async with limit:
+        try:
+            capture_sha = None
+            if args.id_mode == "content" or args.prune_keylog:
+                capture_sha = await asyncio.to_thread(file_sha256, pcap_path)
+            keylog = sslkeys_path
+            if args.prune_keylog:
+                keylog = await asyncio.to_thread(prepare_keylog, pcap_path, sslkeys_path, capture_sha)
+            try:
+                tshark_data = await run_tshark_async(pcap_path, keylog, label, args.keep_encoding)
+            finally:
+                discard_keylog(keylog, sslkeys_path)
+
+            capture_id = capture_sha[:16] if args.id_mode == "content" else None
+            provenance = {} if args.index else None
+            http_requests = await asyncio.to_thread(
+                extract_http_from_packets,
+                tshark_data,
+                capture_id,
+                run_scope=f"{RUN_TIMESTAMP_MS}-f{index}",
+                provenance=provenance,
+            )
+            del tshark_data
+            record["requests"] = [req for req in http_requests if "response" in req]
+            if args.rdf_out:
+                scope = capture_id or f"{RUN_TIMESTAMP_MS}-f{index}"
+                try:
+                    record["rdf"] = await asyncio.to_thread(
+                        write_capture_rdf, pcap_path, record.pop("requests"), scope, args
+                    )
+                except (OSError, ValueError) as e:
+                    # e.g. ENOSPC / EACCES: the capture fails, the .part file is already gone
+                    raise RuntimeError(f"RDF not written to {args.rdf_out}: {e}") from e
+            if args.index:
+                await asyncio.to_thread(write_capture_index, pcap_path, http_requests, provenance, capture_sha, args)
+        except Exception as e:
+            print(f"[ERROR] {label}{pcap_path}: {e}", file=sys.stderr)
+            # no partial output: a failed capture carries only its error
+            record.pop("requests", None)
+            record.pop("rdf", None)
+            record["error"] = str(e)
+            return record
+    print(
+        f"[DEBUG] {label}{pcap_path}: {len(http_requests)} HttpRequest objects, "
+        f"{sum('response' in req for req in http_requests)} with response",
+        file=sys.stderr,
+    )
+    return record
+
+
+def write_capture_rdf(pcap_path, http_requests, scope, args):
+    """Write the bulk RDF chunk files of one capture; returns their manifest (pcap_rdf.py)."""
+    from pcap_rdf import rdf_file_prefix, write_rdf
+
+    t0 = time.perf_counter()
+    manifest = write_rdf(
+        http_requests,
+        args.rdf_out,
+        rdf_file_prefix(pcap_path, scope),
+        args.rdf_format,
+        args.rdf_graph,
+        args.rdf_chunk_triples,
+    )
+    print(
+        f"[DEBUG] Wrote {manifest['triples']} triples for {manifest['requests']} requests "
+        f"in {len(manifest['files'])} {args.rdf_format} file(s) in {time.perf_counter() - t0:.3f}s",
+        file=sys.stderr,
+    )
+    return manifest
+
+
+def write_capture_index(pcap_path, http_requests, provenance, capture_sha, args):
+    """Write the sidecar index; failures are logged, the conversion output stays valid."""
+    try:
+        from pcap_index import write_index
+
+        write_index(pcap_path, http_requests, provenance, capture_sha, args.id_mode)
+    except Exception as e:
+        print(f"[ERROR] Index not written for {pcap_path}: {e}", file=sys.stderr)
+
+
+async def run_batch(entries, args):
+    """
+    Convert all `entries` concurrently (at most args.jobs tshark processes) and
+    write one JSON line per capture to stdout as soon as it completes.
+    Returns the number of failed captures.
+    """
+    limit = asyncio.Semaphore(args.jobs)
+    tasks = [
+        asyncio.create_task(convert_capture_async(i, pcap_path, sslkeys_path, args, limit))
+        for i, (pcap_path, sslkeys_path) in enumerate(entries)
+    ]
+    failed = 0
+    for next_done in asyncio.as_completed(tasks):
+        record = await next_done
+        failed += "error" in record
+        sys.stdout.buffer.write(json_dumps_bytes(record) + b"\n")
+        sys.stdout.flush()
+    return failed
+
+
+class UsageArgumentParser(argparse.ArgumentParser):
+    """ArgumentParser that keeps the historical exit code 1 for usage errors."""
+
+    def error(self, message):
+        self.print_usage(sys.stderr)
+        print(f"{self.prog}: error: {message}", file=sys.stderr)
+        sys.exit(1)
+
+
+def parse_args(argv=None):
+    """
+    Parse the CLI arguments.
+
+    Positional arguments are unchanged (<pcap_path> <sslkeys_path>), so existing
+    callers such as routes/pcap.js keep working; options are additive.
+    In batch mode (--batch / --manifest) the positionals are not used.
+    """
+    parser = UsageArgumentParser(
+        prog="pcap_to_http_json.py",
+        description="Convert a PCAP capture into HttpRequest JSON for /http-requests/ingest-http.",
+    )
+    parser.add_argument(
+        "pcap_path", nargs="?", help='path to .pcap / .pcapng file, or "-" to read the capture from stdin'
+    )
+    parser.add_argument("sslkeys_path", nargs="?", help="path to TLS key log file (e.g. sslkeys.log)")
+    parser.add_argument(
+        "--id-mode",
+        choices=ID_MODES,
+        default=os.getenv("PCAP_ID_MODE", "run"),
+        help="run: per-run timestamp IDs (default); content: IDs derived from the capture digest "
+        "(default from env PCAP_ID_MODE)",
+    )
+    parser.add_argument(
+        "--no-prune-keylog",
+        dest="prune_keylog",
+        action="store_false",
+        help="pass the keylog to tshark as-is instead of pruning it to the capture's TLS sessions",
+    )
+    parser.add_argument(
+        "--keep-encoding",
+        action=argparse.BooleanOptionalAction,
+        default=KEEP_CONTENT_ENCODING,
+        help="keep HTTP/1.x bodies in their Content-Encoding and mark them with 'contentEncoding' "
+        "(default from env PCAP_KEEP_CONTENT_ENCODING)",
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="also write a sidecar index <pcap_path>.owpt-index.sqlite for pcap_index.py lookups",
+    )
+    rdf = parser.add_argument_group("bulk RDF output")
+    rdf.add_argument(
+        "--rdf-out",
+        metavar="DIR",
+        help="write the requests as gzip-compressed RDF chunk files into DIR for GraphDB bulk loading",
+    )
+    rdf.add_argument(
+        "--rdf-format",
+        choices=("nq", "nt"),
+        default="nq",
+        help="nq: N-Quads in the --rdf-graph named graph (default); nt: N-Triples",
+    )
+    rdf.add_argument(
+        "--rdf-graph",
+        default=os.getenv("HTTP_REQUESTS_NAME_GRAPH", "http://localhost/graphs/http-requests"),
+        metavar="IRI",
+        help="named graph of the N-Quads (default from env HTTP_REQUESTS_NAME_GRAPH)",
+    )
+    rdf.add_argument(
+        "--rdf-chunk-triples",
+        type=int,
+        default=1_000_000,
+        metavar="N",
+        help="start a new file after about N triples (default 1000000)",
+    )
+    preview = parser.add_argument_group("preview mode")
+    preview.add_argument(
+        "--sample",
+        type=float,
+        nargs="?",
+        const=0.1,
+        metavar="RATE",
+        help="convert only this fraction of the TCP connections (default 0.1) and extrapolate totals",
+    )
+    preview.add_argument(
+        "--sample-per-host",
+        type=int,
+        metavar="N",
+        help="return at most the first N sampled requests per authority (caps the output only, requires --sample)",
+    )
+    preview.add_argument(
+        "--sample-seed",
+        default="ontowebpt",
+        help="seed of the connection selection (same seed, same sample)",
+    )
+    preview.add_argument(
+        "--inventory",
+        action="store_true",
+        help="print only an endpoint inventory (hosts, path templates, parameter names, status codes)",
+    )
+    batch = parser.add_argument_group("batch mode")
+    batch.add_argument(
+        "--batch",
+        action="append",
+        default=[],
+        metavar="PATH",
+        help="capture file, directory or glob to convert (repeatable)",
+    )
+    batch.add_argument(
+        "--manifest",
+        action="append",
+        default=[],
+        help="file listing '<pcap_path> [<sslkeys_path>]' per line (repeatable)",
+    )
+    batch.add_argument("--keylog", help="keylog shared by captures without a per-file one")
+    batch.add_argument(
+        "--jobs",
+        type=int,
+        default=default_jobs(),
+        help="max concurrent tshark processes (default: usable CPUs)",
+    )
+    args = parser.parse_args(argv)
+    args.batch_mode = bool(args.batch or args.manifest)
+    if args.sample_per_host is not None and args.sample is None:
+        # A per-host cap does not shorten the decode: without a rate it would be a
+        # full conversion with a smaller output, slower than a plain one.
+        parser.error("--sample-per-host requires --sample RATE (it only caps the output)")
+    if args.sample is not None:
+        if not 0 < args.sample <= 1:
+            parser.error("--sample RATE must be in (0, 1]")
+        if args.sample_per_host is not None and args.sample_per_host < 1:
+            parser.error("--sample-per-host must be >= 1")
+        if args.batch_mode or args.index:
+            parser.error("--sample cannot be combined with --batch/--manifest or --index")
+    if args.inventory and (args.sample is not None or args.batch_mode or args.index):
+        parser.error("--inventory cannot be combined with --sample, --batch/--manifest or --index")
+    if args.rdf_out is not None:
+        if args.sample is not None or args.inventory:
+            parser.error("--rdf-out cannot be combined with --sample or --inventory")
+        if args.rdf_chunk_triples < 1:
+            parser.error("--rdf-chunk-triples must be >= 1")
+    if args.batch_mode:
+        if args.pcap_path or args.sslkeys_path:
+            parser.error("positional <pcap_path> <sslkeys_path> cannot be combined with --batch/--manifest")
+        if args.jobs < 1:
+            parser.error("--jobs must be >= 1")
+    elif not (args.pcap_path and args.sslkeys_path):
+        parser.error("the following arguments are required: pcap_path, sslkeys_path")
+    if args.id_mode not in ID_MODES:
+        parser.error(f"invalid id mode {args.id_mode!r} (choose from {', '.join(ID_MODES)})")
+    return args
+
+
 def main():
     """
     CLI entry point.
 
     Expected arguments:
-      1) pcap_path    : path to .pcap / .pcapng file
+      1) pcap_path    : path to .pcap / .pcapng file ("-" for stdin)
       2) sslkeys_path : path to TLS key log file (e.g. sslkeys.log)
 
+    Options:
+      --id-mode run|content : request ID scheme (see the header of this file)
+      --no-prune-keylog     : skip the keylog pruning pre-pass
+      --keep-encoding       : keep bodies compressed, with a contentEncoding marker
+      --index               : write the sidecar index (pcap_index.py)
+      --sample / --sample-per-host / --sample-seed : preview mode (see the header of this file)
+      --inventory           : endpoint inventory instead of the request array
+      --rdf-out DIR / --rdf-format / --rdf-graph / --rdf-chunk-triples : bulk RDF files (pcap_rdf.py)
+      --batch / --manifest / --keylog / --jobs : batch mode (see the header of this file)
+
     Exits with:
       - 0 on success
       - 1 on missing arguments
-      - 2 on tshark / parsing errors
+      - 2 on tshark / parsing errors (in batch mode: if any capture failed)
     """
-    if len(sys.argv) < 3:
-        print(
-            "Usage: python pcap_to_http_json.py <pcap_path> <sslkeys_path>",
-            file=sys.stderr,
-        )
-        sys.exit(1)
+    args = parse_args()
+
+    if args.batch_mode:
+        try:
+            entries = expand_batch_inputs(args.batch, args.manifest, args.keylog)
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] {e}", file=sys.stderr)
+            sys.exit(1)
+        if not entries:
+            print("[ERROR] batch mode: no capture matched", file=sys.stderr)
+            sys.exit(1)
+        print(f"[DEBUG] batch: {len(entries)} capture(s), jobs={args.jobs}", file=sys.stderr)
+        failed = asyncio.run(run_batch(entries, args))
+        if failed:
+            print(f"[ERROR] batch: {failed}/{len(entries)} capture(s) failed", file=sys.stderr)
+            sys.exit(2)
+        return
 
-    pcap_path = sys.argv[1]
-    sslkeys_path = sys.argv[2]
+    pcap_path = args.pcap_path
+    sslkeys_path = args.sslkeys_path
 
     print(f"[DEBUG] pcap_path={pcap_path}", file=sys.stderr)
     print(f"[DEBUG] sslkeys_path={sslkeys_path}", file=sys.stderr)
 
+    if args.inventory:
+        from pcap_inventory import endpoint_inventory
+
+        try:
+            inventory = endpoint_inventory(pcap_path, sslkeys_path, args.prune_keylog)
+        except Exception as e:
+            print(f"[ERROR] {e}", file=sys.stderr)
+            sys.exit(2)
+        sys.stdout.buffer.write(json_dumps_bytes(inventory) + b"\n")
+        sys.stdout.flush()
+        return
+
+    if args.sample is not None:
+        from pcap_sample import sample_conversion
+
+        if args.id_mode == "content":
+            print("[DEBUG] Preview: request IDs are per-run, --id-mode content ignored", file=sys.stderr)
+        try:
+            preview = sample_conversion(
+                pcap_path,
+                sslkeys_path,
+                args.sample,
+                args.sample_seed,
+                args.sample_per_host,
+                args.prune_keylog,
+                args.keep_encoding,
+            )
+        except Exception as e:
+            print(f"[ERROR] {e}", file=sys.stderr)
+            sys.exit(2)
+        sys.stdout.buffer.write(json_dumps_bytes(preview) + b"\n")
+        sys.stdout.flush()
+        return
+
     try:
-        tshark_data = run_tshark(pcap_path, sslkeys_path)
+        if pcap_path == "-":
+            if args.prune_keylog:
+                print("[DEBUG] Keylog pruning skipped: capture read from stdin", file=sys.stderr)
+            # the digest is only known once tshark has consumed the whole stream
+            stdin_hash = hashlib.sha256() if args.id_mode == "content" else None
+            tshark_data = run_tshark(pcap_path, sslkeys_path, stdin_hash, args.keep_encoding)
+            capture_id = stdin_hash.hexdigest()[:16] if stdin_hash is not None else None
+            capture_sha = None
+        else:
+            capture_sha = file_sha256(pcap_path) if (args.id_mode == "content" or args.prune_keylog) else None
+            capture_id = capture_sha[:16] if args.id_mode == "content" else None
+            keylog = prepare_keylog(pcap_path, sslkeys_path, capture_sha) if args.prune_keylog else sslkeys_path
+            try:
+                tshark_data = run_tshark(pcap_path, keylog, keep_encoding=args.keep_encoding)
+            finally:
+                discard_keylog(keylog, sslkeys_path)
     except Exception as e:
         print(f"[ERROR] {e}", file=sys.stderr)
         sys.exit(2)
 
-    http_requests = extract_http_from_packets(tshark_data)
+    if capture_id:
+        print(f"[DEBUG] content-derived IDs, capture digest={capture_id}", file=sys.stderr)
+
+    provenance = {} if args.index else None
+    http_requests = extract_http_from_packets(tshark_data, capture_id, provenance=provenance)
+    if args.index:
+        if pcap_path == "-":
+            print("[DEBUG] Index skipped: capture read from stdin is not stored", file=sys.stderr)
+        else:
+            write_capture_index(pcap_path, http_requests, provenance, capture_sha, args)
 
     # 🔹 KEEP ONLY REQUESTS THAT HAVE A RESPONSE
     http_requests_with_response = [
@@ -659,8 +1500,25 @@ def main():
         file=sys.stderr,
     )
 
+    if args.rdf_out:
+        try:
+            manifest = write_capture_rdf(pcap_path, http_requests_with_response, capture_id or RUN_TIMESTAMP_MS, args)
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] {e}", file=sys.stderr)
+            sys.exit(2)
+        sys.stdout.buffer.write(json_dumps_bytes(manifest) + b"\n")
+        sys.stdout.flush()
+        return
+
     # Output: only HttpRequest objects that include a response
-    print(json.dumps(http_requests_with_response))
+    t0 = time.perf_counter()
+    payload = json_dumps_bytes(http_requests_with_response)
+    print(
+        f"[DEBUG] Encoded {len(payload)} bytes in {time.perf_counter() - t0:.3f}s with {json_codec_name()}",
+        file=sys.stderr,
+    )
+    sys.stdout.buffer.write(payload + b"\n")
+    sys.stdout.flush()
 
 
 
@@ -26,6 +26,8 @@
  * @property {number} [status] - Numeric status code (e.g. 200, 404).
  * @property {string} [reason] - Reason phrase (e.g. "OK", "Not Found").
  * @property {string} [bodyBase64] - Optional response body encoded as Base64.
+ * @property {string} [contentEncoding] - Content codings still applied to `bodyBase64`
+ *   (e.g. "gzip", "gzip, br"); absent when the body is plain.
  * @property {HttpHeader[]} [headers] - Normalized response headers.
  */
 
@@ -0,0 +1,45 @@
+/**
+ * Result of a header-only scan of a capture file.
+ *
+ * - `container` → 'pcap' | 'pcapng', or null when the format is not recognised
+ *                 (e.g. compressed captures): `packets` is then extrapolated
+ * - `packets`   → number of packet records / packet blocks
+ * - `bytes`     → file size in bytes
+ * - `exact`     → false when `packets` is an estimate
+ *
+ * @typedef {{ container: 'pcap'|'pcapng'|null, packets: number, bytes: number, exact: boolean }} CaptureScan
+ */
+
+/**
+ * Estimated resources needed by one PCAP → HttpRequest conversion
+ * (tshark + pcap_to_http_json.py).
+ *
+ * @typedef {Object} ConversionCost
+ * @property {number} captureBytes - Capture file size.
+ * @property {number} keylogBytes  - TLS keylog file size.
+ * @property {number} packets      - Packet count (from the header scan).
+ * @property {number} memoryBytes  - Estimated peak resident memory.
+ * @property {number} cpuSeconds   - Estimated CPU time.
+ */
+
+/**
+ * Per-host budget for concurrent conversions.
+ *
+ * - `memoryBytes` → memory that running conversions may reserve in total
+ * - `cpuSlots`    → conversions allowed to run at the same time
+ *
+ * @typedef {{ memoryBytes: number, cpuSlots: number }} ConversionBudget
+ */
+
+/**
+ * Status of a PCAP conversion job as exposed by the API.
+ *
+ * - 'queued'    → waiting for budget (BullMQ waiting / prioritized / delayed)
+ * - 'running'   → being converted
+ * - 'completed' → result available
+ * - 'failed'    → conversion failed
+ *
+ * @typedef {'queued'|'running'|'completed'|'failed'} PcapJobStatus
+ */
+
+module.exports = {};
@@ -142,6 +142,8 @@ function parseSetCookieAttributes(rawValue) {
  * - Emits each query parameter as a separate `ex:Parameter` resource linked by `ex:param`.
  * - Classifies and emits request headers via `classifyRequestHeader` and links them with the appropriate property.
  * - Optionally emits a `Response` node with status, reason, httpVersion, bodyBase64 and classified response headers.
+ *   A `response.contentEncoding` marker (body kept compressed) is stored as a `content-encoding`
+ *   header when the headers do not already carry one.
  * - For **Set-Cookie** response headers, splits multi-line values into distinct header resources
  *   (one per cookie) and, when possible, enriches them with `ex:cookieName` and `ex:cookieDomain`.
  *
@@ -319,8 +321,16 @@ function extractTriplesForSingleRequest(p = {}) {
       }
     }
 
-    // Response headers (with Set-Cookie expansion)
-    const expandedHeaders = expandSetCookieHeaders(r.headers || []);
+    // Response headers (with Set-Cookie expansion). A contentEncoding marker
+    // without the matching header is kept as a content-encoding header.
+    const resHeaders = [...(r.headers || [])];
+    if (
+      r.contentEncoding &&
+      !resHeaders.some((h) => String(h?.name || '').toLowerCase() === 'content-encoding')
+    ) {
+      resHeaders.push({ name: 'content-encoding', value: r.contentEncoding });
+    }
+    const expandedHeaders = expandSetCookieHeaders(resHeaders);
     expandedHeaders.forEach((h, i) => {
       const hdrIri = `<${iriResHeader(p.id, i)}>`;
       const { cls, prop } = classifyResponseHeader(h?.name || '');
@@ -0,0 +1,93 @@
+// @ts-check
+/** @typedef {import('../_types/http/builders/types').RequestResponse} RequestResponse */
+
+const zlib = require('zlib');
+
+/**
+ * Upper bound for a decoded body. Rules only scan text; the cap also protects
+ * the worker against decompression bombs.
+ */
+const MAX_DECODED_BODY_BYTES = Number(process.env.HTTP_MAX_DECODED_BODY_BYTES) || 20 * 1024 * 1024;
+
+/**
+ * Content codings still applied to a response body, in the order they were
+ * applied by the server.
+ *
+ * Sources:
+ * - `response.contentEncoding` marker (set by the PCAP converter when it keeps
+ *   bodies in their wire encoding),
+ * - otherwise the `content-encoding` response header.
+ *
+ * `identity` is ignored.
+ *
+ * @param {Partial<RequestResponse> | null | undefined} response
+ * @returns {string[]} e.g. `['gzip']`, `['gzip', 'br']`, or `[]` for a plain body.
+ */
+function responseContentCodings(response) {
+  if (!response) return [];
+  let raw = response.contentEncoding;
+  if (!raw && Array.isArray(response.headers)) {
+    const h = response.headers.find(
+      (x) => String(x?.name || '').toLowerCase() === 'content-encoding'
+    );
+    raw = h?.value;
+  }
+  return String(raw || '')
+    .split(',')
+    .map((c) => c.trim().toLowerCase())
+    .filter((c) => c && c !== 'identity');
+}
+
+/**
+ * Undo the given content codings (last applied first).
+ *
+ * Supported: gzip / x-gzip, deflate (zlib or raw), br, and zstd when the
+ * Node.js runtime provides it.
+ *
+ * @param {Buffer} buf
+ * @param {string[]} codings
+ * @param {number} [maxBytes=MAX_DECODED_BODY_BYTES]
+ * @returns {Buffer}
+ * @throws {Error} on unsupported codings, corrupt data or output above `maxBytes`.
+ */
+function decodeContentEncoding(buf, codings, maxBytes = MAX_DECODED_BODY_BYTES) {
+  const opts = { maxOutputLength: maxBytes };
+  let out = buf;
+
+  for (const coding of [...codings].reverse()) {
+    switch (coding) {
+      case 'gzip':
+      case 'x-gzip':
+        out = zlib.gunzipSync(out, opts);
+        break;
+      case 'deflate':
+        // "deflate" is meant to be zlib-wrapped, but some servers send raw deflate.
+        try {
+          out = zlib.inflateSync(out, opts);
+        } catch {
+          out = zlib.inflateRawSync(out, opts);
+        }
+        break;
+      case 'br':
+        out = zlib.brotliDecompressSync(out, opts);
+        break;
+      case 'zstd': {
+        // @ts-ignore - available from Node.js 23.8 / 22.15
+        const zstd = zlib.zstdDecompressSync;
+        if (typeof zstd !== 'function')
+          throw new Error('zstd is not supported by this Node.js runtime');
+        out = zstd(out, opts);
+        break;
+      }
+      default:
+        throw new Error(`Unsupported content-encoding: ${coding}`);
+    }
+  }
+  return out;
+}
+
+module.exports = {
+  MAX_DECODED_BODY_BYTES,
+  responseContentCodings,
+  decodeContentEncoding,
+};
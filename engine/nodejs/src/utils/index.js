@@ -17,6 +17,7 @@ module.exports = {
 
   // HTTP ontology helpers
   ...require('./http/headers'),
+  ...require('./http/contentEncoding'),
 
   // Logger
   makeLogger: require('./logs/logger').makeLogger,
@@ -69,9 +70,17 @@ module.exports = {
     sparql: require('./validators/sparql'),
     techstack: require('./validators/techstack'),
     analyzer: require('./validators/analyzer'),
+    pcap: require('./validators/pcap'),
     ...require('./validators/options'),
   },
 
+  // PCAP conversion (cost estimation / admission + converter process + spool cleanup)
+  pcap: {
+    ...require('./pcap/admission'),
+    ...require('./pcap/converter'),
+    ...require('./pcap/spool'),
+  },
+
   // GraphDB (Select/Update)
   graphdb: require('./graphdb/client'),
 
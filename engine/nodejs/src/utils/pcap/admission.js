@@ -0,0 +1,262 @@
+// @ts-check
+
+const fs = require('fs');
+const os = require('os');
+
+/** @typedef {import('../_types/pcap/types').CaptureScan} CaptureScan */
+/** @typedef {import('../_types/pcap/types').ConversionCost} ConversionCost */
+/** @typedef {import('../_types/pcap/types').ConversionBudget} ConversionBudget */
+
+const MB = 1024 * 1024;
+
+/** First 4 bytes of a pcap file (hex, file order) → whether fields are little-endian. */
+const PCAP_MAGICS = {
+  d4c3b2a1: true,
+  a1b2c3d4: false,
+  '4d3cb2a1': true,
+  a1b23c4d: false,
+};
+const PCAPNG_SHB = '0a0d0d0a';
+const PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d;
+/** Enhanced / Simple / obsolete Packet Blocks. */
+const PCAPNG_PACKET_BLOCKS = new Set([6, 3, 2]);
+
+/** Average on-disk packet size used when the container cannot be scanned. */
+const FALLBACK_PACKET_BYTES = 700;
+
+/** BullMQ accepts priorities in [1, 2^21]; lower runs first. */
+const MAX_PRIORITY = 2 ** 21;
+
+/**
+ * Read a positive number from the environment, or return the fallback.
+ *
+ * @param {string} name
+ * @param {number} fallback
+ * @returns {number}
+ */
+function envNumber(name, fallback) {
+  const v = Number(process.env[name]);
+  return Number.isFinite(v) && v > 0 ? v : fallback;
+}
+
+/**
+ * Walk consecutive container blocks reading only their headers, through a
+ * sliding window so that small records cost one read per window, not per record.
+ *
+ * @param {import('fs').promises.FileHandle} fh
+ * @param {number} size        - File size.
+ * @param {number} start       - Offset of the first block.
+ * @param {number} headerLen   - Bytes needed to decode a block header.
+ * @param {(buf: Buffer, at: number) => number} visit - Returns the block length (0 stops the walk).
+ * @returns {Promise<boolean>} true when the walk reached the end of the file cleanly.
+ */
+async function walkBlocks(fh, size, start, headerLen, visit) {
+  const buf = Buffer.alloc(MB);
+  let winStart = 0;
+  let winLen = 0;
+  let offset = start;
+
+  while (offset + headerLen <= size) {
+    if (offset < winStart || offset + headerLen > winStart + winLen) {
+      const { bytesRead } = await fh.read(buf, 0, buf.length, offset);
+      winStart = offset;
+      winLen = bytesRead;
+      if (bytesRead < headerLen) return false;
+    }
+    const length = visit(buf, offset - winStart);
+    if (!length) return false;
+    // A truncated last block (capture still being written) is simply not counted by tshark either.
+    if (offset + length > size) return true;
+    offset += length;
+  }
+  return true;
+}
+
+/**
+ * Count the packets of a capture from its container headers only (no dissection).
+ *
+ * - pcap   → 16-byte record headers
+ * - pcapng → block headers; only packet blocks are counted
+ * - other (e.g. gzip-compressed) → packet count extrapolated from the file size
+ *
+ * @param {string} filePath
+ * @returns {Promise<CaptureScan>}
+ */
+async function scanCapture(filePath) {
+  const fh = await fs.promises.open(filePath, 'r');
+  try {
+    const { size } = await fh.stat();
+    const head = Buffer.alloc(4);
+    await fh.read(head, 0, 4, 0);
+    const magic = head.toString('hex');
+
+    if (magic in PCAP_MAGICS) {
+      const le = PCAP_MAGICS[/** @type {keyof typeof PCAP_MAGICS} */ (magic)];
+      let packets = 0;
+      const exact = await walkBlocks(fh, size, 24, 16, (buf, at) => {
+        packets += 1;
+        return 16 + (le ? buf.readUInt32LE(at + 8) : buf.readUInt32BE(at + 8));
+      });
+      return { container: 'pcap', packets, bytes: size, exact };
+    }
+
+    if (magic === PCAPNG_SHB) {
+      let le = true;
+      let packets = 0;
+      const exact = await walkBlocks(fh, size, 0, 12, (buf, at) => {
+        if (buf.toString('hex', at, at + 4) === PCAPNG_SHB) {
+          // every section header declares its own byte order
+          le = buf.readUInt32LE(at + 8) === PCAPNG_BYTE_ORDER_MAGIC;
+        }
+        const type = le ? buf.readUInt32LE(at) : buf.readUInt32BE(at);
+        const length = le ? buf.readUInt32LE(at + 4) : buf.readUInt32BE(at + 4);
+        if (length < 12 || length % 4) return 0;
+        if (PCAPNG_PACKET_BLOCKS.has(type)) packets += 1;
+        return length;
+      });
+      return { container: 'pcapng', packets, bytes: size, exact };
+    }
+
+    return {
+      container: null,
+      packets: Math.ceil(size / FALLBACK_PACKET_BYTES),
+      bytes: size,
+      exact: false,
+    };
+  } finally {
+    await fh.close();
+  }
+}
+
+/**
+ * Estimate peak memory and CPU time of one conversion.
+ *
+ * Linear model, calibrated on tshark + pcap_to_http_json.py: the JSON exported
+ * by tshark is buffered and parsed in full, so memory grows with capture size
+ * (hex-encoded bodies, parsed objects, output) and with the packet count
+ * (per-frame dissector state, per-packet JSON overhead). Coefficients can be
+ * tuned per deployment through PCAP_COST_* variables.
+ *
+ * @param {{ captureBytes: number, packets: number, keylogBytes: number }} input
+ * @returns {ConversionCost}
+ */
+function estimateConversionCost({ captureBytes, packets, keylogBytes }) {
+  const memoryBytes = Math.round(
+    envNumber('PCAP_COST_MEM_BASE_MB', 150) * MB +
+      captureBytes * envNumber('PCAP_COST_MEM_PER_CAPTURE_BYTE', 10) +
+      packets * envNumber('PCAP_COST_MEM_PER_PACKET', 2048) +
+      keylogBytes * envNumber('PCAP_COST_MEM_PER_KEYLOG_BYTE', 4)
+  );
+  const cpuSeconds =
+    envNumber('PCAP_COST_CPU_BASE_S', 0.5) +
+    captureBytes / (envNumber('PCAP_COST_CPU_MB_PER_S', 20) * MB) +
+    (packets * envNumber('PCAP_COST_CPU_US_PER_PACKET', 25)) / 1e6;
+
+  return {
+    captureBytes,
+    keylogBytes,
+    packets,
+    memoryBytes,
+    cpuSeconds: Math.round(cpuSeconds * 100) / 100,
+  };
+}
+
+/**
+ * Memory available to this process: the cgroup limit when running in a
+ * container with one (os.totalmem() reports the whole host), else total RAM.
+ *
+ * @returns {number}
+ */
+function hostMemoryBytes() {
+  const total = os.totalmem();
+  for (const file of ['/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes']) {
+    try {
+      const limit = Number(fs.readFileSync(file, 'utf8').trim());
+      if (Number.isFinite(limit) && limit > 0 && limit < total) return limit;
+    } catch {
+      // not available on this host
+    }
+  }
+  return total;
+}
+
+/**
+ * Per-host conversion budget.
+ *
+ * - PCAP_HOST_MEMORY_BUDGET_MB (default: 50% of the memory available to the process)
+ * - PCAP_HOST_CPU_SLOTS        (default: half of the CPUs, at least 1)
+ *
+ * @returns {ConversionBudget}
+ */
+function conversionBudget() {
+  const memoryMb = envNumber('PCAP_HOST_MEMORY_BUDGET_MB', 0);
+  return {
+    memoryBytes: memoryMb ? memoryMb * MB : Math.floor(hostMemoryBytes() / 2),
+    cpuSlots: Math.floor(
+      envNumber('PCAP_HOST_CPU_SLOTS', Math.max(1, Math.floor(os.cpus().length / 2)))
+    ),
+  };
+}
+
+/**
+ * BullMQ priority for a conversion: small jobs first, FIFO among jobs of
+ * similar cost (one priority level per estimated CPU second).
+ *
+ * @param {ConversionCost} cost
+ * @returns {number}
+ */
+function costPriority(cost) {
+  return Math.min(MAX_PRIORITY, 1 + Math.round(cost.cpuSeconds));
+}
+
+/**
+ * In-process ledger of memory reserved by running conversions.
+ *
+ * A reservation is granted when it fits the remaining budget, or when nothing
+ * else is running (so that a job larger than the budget still makes progress
+ * instead of waiting forever).
+ *
+ * @param {ConversionBudget} budget
+ */
+function createBudgetLedger(budget) {
+  /** @type {Map<string, number>} */
+  const reservations = new Map();
+  let reserved = 0;
+
+  return {
+    /**
+     * @param {string} id
+     * @param {number} bytes
+     * @returns {boolean}
+     */
+    tryReserve(id, bytes) {
+      if (reservations.has(id)) return true;
+      if (reservations.size > 0 && reserved + bytes > budget.memoryBytes) return false;
+      reservations.set(id, bytes);
+      reserved += bytes;
+      return true;
+    },
+    /** @param {string} id */
+    release(id) {
+      const bytes = reservations.get(id);
+      if (bytes === undefined) return;
+      reservations.delete(id);
+      reserved -= bytes;
+    },
+    snapshot() {
+      return {
+        reservedBytes: reserved,
+        running: reservations.size,
+        budgetBytes: budget.memoryBytes,
+      };
+    },
+  };
+}
+
+module.exports = {
+  scanCapture,
+  estimateConversionCost,
+  conversionBudget,
+  costPriority,
+  createBudgetLedger,
+};
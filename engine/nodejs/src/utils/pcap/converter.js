@@ -0,0 +1,135 @@
+// @ts-check
+
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { spawn } = require('child_process');
+
+const SCRIPT_PATH = path.join(__dirname, '../../scripts', 'pcap_to_http_json.py');
+
+/** Keep only the tail of stderr: the converter logs one line per step, errors come last. */
+const STDERR_TAIL_CHARS = 64 * 1024;
+
+/**
+ * Spawn the Python converter.
+ * - stdout: JSON array of HTTP requests
+ * - stderr: diagnostics forwarded to logs and included on error
+ *
+ * @param {string} pcapArg      capture path, or "-" to read it from stdin
+ * @param {string} sslKeysPath  TLS keylog path
+ * @param {import('stream').Writable} [stdoutSink] write stdout there instead of buffering it
+ * @returns {{ py: import('child_process').ChildProcess, result: Promise<any> }}
+ *   `result` resolves with the parsed array, or with the number of bytes written to `stdoutSink`.
+ */
+function spawnConverter(pcapArg, sslKeysPath, stdoutSink) {
+  const pythonBin = process.env.PYTHON_BIN || 'python';
+
+  const py = spawn(pythonBin, [SCRIPT_PATH, pcapArg, sslKeysPath], {
+    stdio: [pcapArg === '-' ? 'pipe' : 'ignore', 'pipe', 'pipe'],
+  });
+  const stdoutStream = /** @type {import('stream').Readable} */ (py.stdout);
+  const stderrStream = /** @type {import('stream').Readable} */ (py.stderr);
+
+  let stdout = '';
+  let stdoutBytes = 0;
+  let stderr = '';
+
+  if (stdoutSink) {
+    stdoutStream.on('data', (chunk) => {
+      stdoutBytes += chunk.length;
+    });
+    stdoutStream.pipe(stdoutSink);
+  } else {
+    // Decode as UTF-8 streams: the converter may emit raw UTF-8 (orjson), and a
+    // multi-byte character can be split across two chunks.
+    stdoutStream.setEncoding('utf8');
+    stdoutStream.on('data', (chunk) => {
+      stdout += chunk.toString();
+    });
+  }
+
+  stderrStream.setEncoding('utf8');
+  stderrStream.on('data', (chunk) => {
+    stderr = (stderr + chunk.toString()).slice(-STDERR_TAIL_CHARS);
+  });
+
+  /**
+   * Wait for the Python process to complete and parse its output.
+   * Any non-zero exit code or invalid JSON will result in an error.
+   */
+  const processDone = new Promise((resolve, reject) => {
+    py.on('error', (err) => reject(err));
+    py.on('close', (code) => {
+      if (code !== 0) {
+        return reject(
+          new Error(`Python script exited with code ${code}. stderr: ${stderr || 'n/a'}`)
+        );
+      }
+      resolve(undefined);
+    });
+  });
+
+  const result = (async () => {
+    if (stdoutSink) {
+      const sinkDone = new Promise((resolve, reject) => {
+        stdoutSink.on('finish', resolve);
+        stdoutSink.on('error', reject);
+      });
+      await Promise.all([processDone, sinkDone]);
+      return stdoutBytes;
+    }
+
+    await processDone;
+    try {
+      return JSON.parse(stdout || '[]');
+    } catch (err) {
+      throw new Error(
+        `Failed to parse JSON from python stdout: ${(err instanceof Error && err.message) || err}`
+      );
+    }
+  })();
+  // Observed by the caller; avoid an unhandled rejection if it bails out first.
+  result.catch(() => {});
+
+  return { py, result };
+}
+
+/**
+ * Directory holding uploaded captures / keylogs and conversion results while
+ * a job is queued. Must be shared by the API and worker processes
+ * (PCAP_SPOOL_DIR, a shared volume in docker-compose).
+ *
+ * @returns {string}
+ */
+function pcapSpoolDir() {
+  const dir = process.env.PCAP_SPOOL_DIR || path.join(os.tmpdir(), 'ontowebpt-pcap-spool');
+  fs.mkdirSync(dir, { recursive: true });
+  return dir;
+}
+
+/**
+ * Convert a stored capture, streaming the JSON output to `outPath` (nothing is
+ * buffered in this process). Resolves with the number of bytes written.
+ *
+ * @param {string} pcapPath
+ * @param {string} sslKeysPath
+ * @param {string} outPath
+ * @returns {Promise<number>}
+ */
+async function convertCaptureToFile(pcapPath, sslKeysPath, outPath) {
+  const out = fs.createWriteStream(outPath);
+  const { result } = spawnConverter(pcapPath, sslKeysPath, out);
+  try {
+    return await result;
+  } catch (err) {
+    out.destroy();
+    await fs.promises.rm(outPath, { force: true });
+    throw err;
+  }
+}
+
+module.exports = {
+  spawnConverter,
+  convertCaptureToFile,
+  pcapSpoolDir,
+};
@@ -0,0 +1,129 @@
+// @ts-check
+
+const fs = require('fs');
+const path = require('path');
+
+const { makeLogger } = require('../logs/logger');
+const { pcapSpoolDir } = require('./converter');
+
+/** Suffix of the conversion results written by the pcap-convert worker. */
+const RESULT_SUFFIX = '.result.json';
+
+/** Job states whose spooled inputs may still be read by the worker. */
+const LIVE_STATES = ['prioritized', 'waiting', 'delayed', 'active', 'paused'];
+
+/**
+ * Read a positive number from the environment, or return the fallback.
+ *
+ * @param {string} name
+ * @param {number} fallback
+ * @returns {number}
+ */
+function envNumber(name, fallback) {
+  const v = Number(process.env[name]);
+  return Number.isFinite(v) && v > 0 ? v : fallback;
+}
+
+/**
+ * Remove from the spool directory what no job can hand out any more.
+ *
+ * - `<jobId>.result.json`: removed when the job no longer exists (e.g. dropped
+ *   by `removeOnComplete`, so GET /pcap/jobs/:jobId/result answers 404 anyway)
+ *   or when it is older than `ttlMs` (a 202 that was never polled).
+ * - any other file (uploaded captures and keylogs): removed when older than
+ *   `ttlMs` and not referenced by a job that may still run.
+ *
+ * The age check also protects uploads that the API is still writing or
+ * converting synchronously.
+ *
+ * @param {import('bullmq').Queue} queue  the pcap-convert queue
+ * @param {number} ttlMs
+ * @returns {Promise<{ removed: number, bytes: number }>}
+ */
+async function sweepPcapSpool(queue, ttlMs) {
+  const dir = pcapSpoolDir();
+  const now = Date.now();
+
+  const live = new Set();
+  for (const job of await queue.getJobs(LIVE_STATES)) {
+    if (!job?.data) continue;
+    if (job.data.pcapPath) live.add(path.resolve(job.data.pcapPath));
+    if (job.data.sslKeysPath) live.add(path.resolve(job.data.sslKeysPath));
+  }
+
+  let removed = 0;
+  let bytes = 0;
+  for (const entry of await fs.promises.readdir(dir, { withFileTypes: true })) {
+    if (!entry.isFile()) continue;
+    const file = path.join(dir, entry.name);
+
+    let stat;
+    try {
+      stat = await fs.promises.stat(file);
+    } catch {
+      continue; // removed concurrently
+    }
+    const expired = now - stat.mtimeMs > ttlMs;
+
+    let stale;
+    if (entry.name.endsWith(RESULT_SUFFIX)) {
+      stale = expired || !(await queue.getJob(entry.name.slice(0, -RESULT_SUFFIX.length)));
+    } else {
+      stale = expired && !live.has(path.resolve(file));
+    }
+    if (!stale) continue;
+
+    try {
+      await fs.promises.rm(file, { force: true });
+      removed += 1;
+      bytes += stat.size;
+    } catch {
+      // best effort: retried on the next sweep
+    }
+  }
+  return { removed, bytes };
+}
+
+/**
+ * Periodically sweep the PCAP spool directory (see `sweepPcapSpool`).
+ *
+ * - PCAP_SPOOL_TTL_MS: age after which results and unreferenced uploads are
+ *   removed (default: 24 h).
+ * - PCAP_SPOOL_SWEEP_INTERVAL_MS: sweep period (default: 10 min).
+ *
+ * @param {import('bullmq').Queue} queue  the pcap-convert queue
+ * @param {string} [ns='pcap:spool'] - Logger namespace.
+ * @returns {{ stop: () => void }}
+ */
+function startPcapSpoolSweeper(queue, ns = 'pcap:spool') {
+  const log = makeLogger(ns);
+  const ttlMs = envNumber('PCAP_SPOOL_TTL_MS', 24 * 60 * 60 * 1000);
+  const intervalMs = envNumber('PCAP_SPOOL_SWEEP_INTERVAL_MS', 10 * 60 * 1000);
+
+  let running = false;
+  async function sweep() {
+    if (running) return;
+    running = true;
+    try {
+      const { removed, bytes } = await sweepPcapSpool(queue, ttlMs);
+      if (removed > 0) log.info('Removed stale spooled files', { removed, bytes });
+    } catch (err) {
+      log.warn('Spool sweep failed', String(/** @type {any} */ (err)?.message || err));
+    } finally {
+      running = false;
+    }
+  }
+
+  void sweep();
+  const timer = setInterval(sweep, intervalMs);
+  timer.unref();
+
+  return {
+    stop: () => clearInterval(timer),
+  };
+}
+
+module.exports = {
+  sweepPcapSpool,
+  startPcapSpoolSweeper,
+};
@@ -29,16 +29,55 @@
  */
 
 const Buffer = require('buffer').Buffer;
+const { responseContentCodings, decodeContentEncoding } = require('../../http/contentEncoding');
 
-function decodeBody(base64) {
+/**
+ * Decode a Base64 body to text, undoing its content codings (gzip, br, ...)
+ * when given. A body that cannot be decoded with them is read as-is: it may
+ * already have been decompressed upstream.
+ *
+ * @param {string | undefined} base64
+ * @param {string[]} [codings=[]]
+ * @returns {string}
+ */
+function decodeBody(base64, codings = []) {
   if (!base64) return '';
   try {
-    return Buffer.from(base64, 'base64').toString('utf8');
+    let buf = Buffer.from(base64, 'base64');
+    if (codings.length) {
+      try {
+        buf = decodeContentEncoding(buf, codings);
+      } catch {
+        // keep the raw bytes
+      }
+    }
+    return buf.toString('utf8');
   } catch {
     return '';
   }
 }
 
+/** Decoded response bodies, computed on first use by a rule and shared by the others. */
+const decodedBodies = new WeakMap();
+
+/**
+ * Response body of a request as text. Compressed bodies are only inflated
+ * here, i.e. when a body rule actually runs, and at most once per response.
+ *
+ * @param {any} req
+ * @returns {string}
+ */
+function responseBodyText(req) {
+  const response = req?.response;
+  if (!response?.bodyBase64) return '';
+  let text = decodedBodies.get(response);
+  if (text === undefined) {
+    text = decodeBody(response.bodyBase64, responseContentCodings(response));
+    decodedBodies.set(response, text);
+  }
+  return text;
+}
+
 /**
  * Parsifica il valore di un header Set-Cookie (che può contenere più cookie
  * separati da newline) in una lista strutturata.
@@ -184,7 +223,7 @@ const httpRules = [
       const origin = req?.uri?.full || '';
       if (!origin.startsWith('https://')) return false;
 
-      const body = decodeBody(req?.response?.bodyBase64);
+      const body = responseBodyText(req);
       if (!body) return false;
 
       const regex = /http:\/\/[^"']+\.(js|css|png|jpg|gif)/gi;
@@ -334,7 +373,7 @@ const httpRules = [
     owasp: 'A02:2021 – Cryptographic Failures',
     severity: 'high',
     check: (req) => {
-      const body = decodeBody(req?.response?.bodyBase64);
+      const body = responseBodyText(req);
       if (!body) return false;
 
       const regex = /(ReferenceError|TypeError|Exception|Traceback|at\s+\w+\s+\()/i;
@@ -550,4 +589,4 @@ const httpRules = [
   },
 ];
 
-module.exports = { httpRules, decodeBody };
+module.exports = { httpRules, decodeBody, responseBodyText };
@@ -105,6 +105,7 @@ const requestSchema = Joi.object({
       .custom((v) => base64Sanitizer(v), 'strip whitespace')
       .max(20 * 1024 * 1024)
       .optional(),
+    contentEncoding: Joi.string().trim().lowercase().max(128).optional(),
     headers: Joi.array().items(headerSchema).max(200).optional(),
   })
     .unknown(false)
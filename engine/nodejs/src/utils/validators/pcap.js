@@ -0,0 +1,23 @@
+// @ts-check
+/**
+ * PCAP validators (Celebrate/Joi)
+ * -------------------------------
+ * Schemas used by /routes/pcap.js for the conversion job endpoints.
+ * The upload itself is multipart and validated in the route.
+ */
+
+const { Joi } = require('celebrate');
+
+/** @typedef {import('../_types/validators/types').JoiObjectSchema} JoiObjectSchema */
+
+/**
+ * Params schema for GET /pcap/jobs/:jobId and GET /pcap/jobs/:jobId/result
+ * @type {JoiObjectSchema}
+ */
+const pcapJobIdParamSchema = Joi.object({
+  jobId: Joi.string().required(),
+}).unknown(false);
+
+module.exports = {
+  pcapJobIdParamSchema,
+};
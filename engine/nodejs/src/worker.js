@@ -1,4 +1,6 @@
-const { Worker } = require('bullmq');
+const { Worker, DelayedError } = require('bullmq');
+const fs = require('fs');
+const path = require('path');
 require('dotenv').config();
 
 const {
@@ -7,6 +9,8 @@ const {
   queueNameSparqlWrites,
   queueNameTechstackWrites,
   queueNameAnalyzerWrites,
+  queueNamePcapConvert,
+  queuePcap,
 } = require('./queue');
 
 const { io } = require('socket.io-client');
@@ -26,6 +30,13 @@ const {
     http: { analyzeHttpRequests },
   },
   monitors: { startRedisMonitor, startGraphDBHealthProbe },
+  pcap: {
+    convertCaptureToFile,
+    conversionBudget,
+    createBudgetLedger,
+    pcapSpoolDir,
+    startPcapSpoolSweeper,
+  },
   makeLogger,
 } = require('./utils');
 
@@ -33,6 +44,7 @@ const logHttp = makeLogger('worker:http');
 const logSp = makeLogger('worker:sparql');
 const logTech = makeLogger('worker:techstack');
 const logAnalyzer = makeLogger('worker:analyzer');
+const logPcap = makeLogger('worker:pcap');
 
 const logForward = makeLogger('logs-forwarder');
 
@@ -381,6 +393,106 @@ workerAnalyzer.on('error', (err) => {
   logAnalyzer.warn('worker error', err?.message || err);
 });
 
+/* ========================================================================
+ * PCAP conversion worker
+ * ====================================================================== */
+
+/**
+ * Per-host budget for PCAP conversions:
+ * - CPU: worker concurrency (PCAP_HOST_CPU_SLOTS)
+ * - memory: in-process ledger of the estimated peak memory of running jobs
+ *   (PCAP_HOST_MEMORY_BUDGET_MB)
+ */
+const pcapBudget = conversionBudget();
+const pcapLedger = createBudgetLedger(pcapBudget);
+const PCAP_REQUEUE_DELAY_MS = Number(process.env.PCAP_REQUEUE_DELAY_MS) || 2000;
+
+/**
+ * Best-effort removal of spooled files.
+ * @param {string[]} files
+ */
+function removeSpooled(files) {
+  for (const f of files) {
+    if (!f) continue;
+    fs.rm(f, { force: true }, (err) => {
+      if (err) logPcap.warn('Failed to remove spooled file', { file: f, err: err.message || err });
+    });
+  }
+}
+
+/**
+ * Worker that converts spooled captures into HttpRequest JSON.
+ *
+ * A job that does not fit the remaining memory budget is moved back to the
+ * queue (delayed, reported as "queued" by the API) instead of being started;
+ * the result is streamed to a file in the spool directory and its path is
+ * returned, so large outputs never transit through Redis.
+ */
+const workerPcap = new Worker(
+  queueNamePcapConvert,
+  async (job, token) => {
+    if (job.name !== 'pcap-convert') throw new Error(`Unknown job: ${job.name}`);
+
+    const { pcapPath, sslKeysPath, cost } = job.data || {};
+    if (!pcapPath || !sslKeysPath) throw new Error('Missing pcapPath or sslKeysPath');
+
+    const jobKey = String(job.id);
+    if (!pcapLedger.tryReserve(jobKey, Number(cost?.memoryBytes) || 0)) {
+      await job.moveToDelayed(Date.now() + PCAP_REQUEUE_DELAY_MS, token);
+      throw new DelayedError();
+    }
+
+    logPcap.info(`pcap-convert start id=${job.id}`, { cost, budget: pcapLedger.snapshot() });
+    const startedAt = Date.now();
+    const resultPath = path.join(pcapSpoolDir(), `${job.id}.result.json`);
+    let done = false;
+    try {
+      const bytes = await convertCaptureToFile(pcapPath, sslKeysPath, resultPath);
+      done = true;
+      return { resultPath, bytes, cost, durationMs: Date.now() - startedAt };
+    } finally {
+      pcapLedger.release(jobKey);
+      // Keep the inputs only while a retry is still possible.
+      if (done || job.attemptsMade + 1 >= (job.opts.attempts || 1)) {
+        removeSpooled([pcapPath, sslKeysPath]);
+      }
+    }
+  },
+  {
+    connection,
+    concurrency: pcapBudget.cpuSlots,
+    stalledInterval: Number(process.env.STALLED_INTERVAL_WORKER_PCAP) || 30000,
+  }
+);
+
+logPcap.info('pcap-convert budget', {
+  memoryMb: Math.round(pcapBudget.memoryBytes / (1024 * 1024)),
+  cpuSlots: pcapBudget.cpuSlots,
+});
+
+workerPcap.on('completed', (job, result) => {
+  logPcap.info(`completed job=${job.name} id=${job.id}`, {
+    bytes: result?.bytes,
+    durationMs: result?.durationMs,
+    estimatedCpuSeconds: result?.cost?.cpuSeconds,
+  });
+});
+
+workerPcap.on('failed', (job, err) => {
+  logPcap.warn(`failed job=${job?.name} id=${job?.id}`, err?.message || err);
+});
+
+workerPcap.on('error', (err) => {
+  logPcap.warn('worker error', err?.message || err);
+});
+
+/**
+ * Results are deleted once delivered, but a 202 that is never polled (or a
+ * job dropped by removeOnComplete) would leave its decrypted output in the
+ * spool directory: sweep it periodically.
+ */
+startPcapSpoolSweeper(queuePcap, 'worker:pcap:spool');
+
 /* ========================================================================
  * Monitors (worker process)
  * ====================================================================== */